@@ -0,0 +1,298 @@
+"""
+Escritor asíncrono por lotes para la bitácora de auditoría.
+
+registrar_accion ya no inserta la fila dentro de la petición: arma un registro
+compacto (dict) y lo encola. Un hilo en segundo plano vacía la cola cuando
+junta AUDIT_BATCH_SIZE registros o pasan AUDIT_FLUSH_INTERVAL segundos, agrupa
+los registros por schema y hace un bulk_create por clínica. En la misma
+transacción se actualizan los conteos diarios (resumen.acumular).
+
+Garantías:
+- La cola está acotada (AUDIT_QUEUE_MAX). Si está llena, el registro se
+  escribe en disco en lugar de bloquear la petición.
+- Cada clínica se inserta en su propia transacción. Si la de una clínica
+  falla, solo sus registros se escriben en disco: los grupos ya confirmados
+  no se vuelven a insertar (ni a sumar en los resúmenes) al reprocesar.
+- Los archivos pendientes (AUDIT_SPILL_DIR, JSON por línea) se reintentan
+  después de cada vaciado exitoso.
+- Al terminar el proceso (atexit) se vacía lo que quede en la cola.
+
+Con AUDIT_ASYNC_ENABLED=False se escribe de forma síncrona como antes.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django_tenants.utils import schema_context
+
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_estado = {'pid': None, 'hilo': None, 'cola': None}
+_vaciar_ahora = threading.Event()
+
+
+def async_habilitado():
+    return getattr(settings, 'AUDIT_ASYNC_ENABLED', True)
+
+
+def _tamano_lote():
+    return getattr(settings, 'AUDIT_BATCH_SIZE', 200)
+
+
+def _intervalo():
+    return getattr(settings, 'AUDIT_FLUSH_INTERVAL', 2.0)
+
+
+def _directorio_pendientes():
+    return getattr(
+        settings, 'AUDIT_SPILL_DIR',
+        os.path.join(settings.BASE_DIR, 'logs', 'auditoria_pendiente')
+    )
+
+
+# ============================================================================
+# ESCRITURA
+# ============================================================================
+
+def escribir_registros(registros):
+    """
+    Inserta registros en la bitácora agrupados por schema (un bulk_create
+    por clínica, cada uno en su transacción).
+
+    Args:
+        registros: Lista de dicts armados por crear_registro()
+
+    Returns:
+        Lista de registros que no se insertaron (los de las clínicas cuya
+        transacción falló)
+    """
+    from .models import Bitacora
+    from .resumen import acumular
+
+    por_schema = {}
+    for registro in registros:
+        por_schema.setdefault(registro['schema'], []).append(registro)
+
+    fallidos = []
+    for schema_name, grupo in por_schema.items():
+        try:
+            with schema_context(schema_name), transaction.atomic():
+                Bitacora.objects.bulk_create([
+                    Bitacora(
+                        usuario_id=r['usuario_id'],
+                        accion=r['accion'],
+                        tabla_afectada=r['tabla_afectada'],
+                        registro_id=r['registro_id'],
+                        detalles=r['detalles'],
+                        ip_address=r['ip_address'],
+                        user_agent=r['user_agent'],
+                        fecha=datetime.fromisoformat(r['fecha']),
+                    )
+                    for r in grupo
+                ], batch_size=_tamano_lote())
+                # Conteos diarios para los resúmenes (misma transacción)
+                acumular(grupo)
+        except Exception as e:
+            logger.warning(f"Fallo al insertar {len(grupo)} registros de auditoría en {schema_name}: {e}")
+            fallidos.extend(grupo)
+
+    return fallidos
+
+
+def _escribir_archivo(ruta, registros):
+    """Escribe registros (JSON por línea) reemplazando `ruta` de forma atómica"""
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        for registro in registros:
+            archivo.write(json.dumps(registro, default=str) + '\n')
+    os.replace(temporal, ruta)
+
+
+def _guardar_en_disco(registros):
+    """Escribe registros no insertados en un archivo pendiente (JSON por línea)"""
+    directorio = _directorio_pendientes()
+    try:
+        os.makedirs(directorio, exist_ok=True)
+        _escribir_archivo(os.path.join(directorio, f"{os.getpid()}-{uuid.uuid4().hex}.jsonl"), registros)
+    except Exception as e:
+        logger.error(f"Se perdieron {len(registros)} registros de auditoría: {e}")
+
+
+def reprocesar_pendientes():
+    """
+    Reintenta insertar los archivos pendientes en disco.
+    Cada archivo se elimina si todos sus registros se insertaron; si no, se
+    reescribe solo con los de las clínicas que fallaron y se sigue con el
+    siguiente (una clínica que falla siempre no frena a las demás).
+
+    Returns:
+        Cantidad de registros insertados
+    """
+    insertados = 0
+    for ruta in sorted(glob.glob(os.path.join(_directorio_pendientes(), '*.jsonl'))):
+        # Renombrar antes de leer para que otro proceso no tome el mismo archivo
+        tomado = f"{ruta}.{os.getpid()}"
+        try:
+            os.rename(ruta, tomado)
+        except OSError:
+            continue
+
+        try:
+            with open(tomado, encoding='utf-8') as archivo:
+                registros = [json.loads(linea) for linea in archivo if linea.strip()]
+            fallidos = escribir_registros(registros)
+        except Exception as e:
+            logger.warning(f"No se pudo reprocesar {ruta}: {e}")
+            os.rename(tomado, ruta)
+            continue
+
+        if fallidos:
+            _escribir_archivo(tomado, fallidos)
+            os.rename(tomado, ruta)
+        else:
+            os.remove(tomado)
+        insertados += len(registros) - len(fallidos)
+
+    return insertados
+
+
+# ============================================================================
+# COLA Y VACIADO
+# ============================================================================
+
+def _tomar_lote(cola, limite):
+    lote = []
+    while len(lote) < limite:
+        try:
+            lote.append(cola.get_nowait())
+        except queue.Empty:
+            break
+    return lote
+
+
+def vaciar(cola=None):
+    """
+    Inserta todo lo que haya en la cola de este proceso.
+
+    Returns:
+        Cantidad de registros procesados
+    """
+    cola = cola or _estado['cola']
+    if cola is None:
+        return 0
+
+    total = 0
+    while True:
+        lote = _tomar_lote(cola, _tamano_lote())
+        if not lote:
+            break
+        total += len(lote)
+        try:
+            fallidos = escribir_registros(lote)
+        except Exception as e:
+            logger.warning(f"Fallo al insertar {len(lote)} registros de auditoría: {e}")
+            fallidos = lote
+        if fallidos:
+            # Solo los grupos que no se confirmaron; el resto de la cola espera al próximo ciclo
+            _guardar_en_disco(fallidos)
+            return total
+
+    if total:
+        reprocesar_pendientes()
+    return total
+
+
+def _bucle(cola):
+    """Hilo vaciador: espera el intervalo o a que se junte un lote completo"""
+    while True:
+        _vaciar_ahora.wait(_intervalo())
+        _vaciar_ahora.clear()
+        try:
+            vaciar(cola)
+        except Exception as e:
+            logger.error(f"Error en el escritor de auditoría: {e}")
+        finally:
+            # El hilo usa su propia conexión; no mantenerla abierta entre lotes
+            connection.close()
+
+
+def _asegurar_hilo():
+    """Crea la cola y el hilo vaciador de este proceso (detecta fork por pid)"""
+    pid = os.getpid()
+    hilo = _estado['hilo']
+    if _estado['pid'] == pid and hilo is not None and hilo.is_alive():
+        return _estado['cola']
+
+    with _lock:
+        hilo = _estado['hilo']
+        if _estado['pid'] == pid and hilo is not None and hilo.is_alive():
+            return _estado['cola']
+
+        cola = queue.Queue(maxsize=getattr(settings, 'AUDIT_QUEUE_MAX', 10000))
+        hilo = threading.Thread(target=_bucle, args=(cola,), name='escritor-auditoria', daemon=True)
+        _estado.update(pid=pid, hilo=hilo, cola=cola)
+        hilo.start()
+        return cola
+
+
+def encolar(registro):
+    """
+    Encola un registro para inserción asíncrona.
+    Si la cola está llena el registro se guarda en disco.
+
+    Args:
+        registro: dict armado por crear_registro()
+    """
+    cola = _asegurar_hilo()
+    try:
+        cola.put_nowait(registro)
+    except queue.Full:
+        _guardar_en_disco([registro])
+        return
+
+    if cola.qsize() >= _tamano_lote():
+        _vaciar_ahora.set()
+
+
+def crear_registro(usuario_id, accion, tabla_afectada=None, registro_id=None,
+                   detalles=None, ip_address=None, user_agent=None):
+    """Arma el registro compacto del schema actual (serializable a JSON)"""
+    from django.utils import timezone
+
+    return {
+        'schema': connection.schema_name,
+        'usuario_id': usuario_id,
+        'accion': accion[:255],
+        'tabla_afectada': tabla_afectada,
+        'registro_id': registro_id,
+        'detalles': detalles,
+        'ip_address': ip_address,
+        'user_agent': user_agent,
+        'fecha': timezone.now().isoformat(),
+    }
+
+
+def _al_salir():
+    if _estado['pid'] != os.getpid():
+        return
+    try:
+        vaciar()
+    except Exception as e:
+        logger.error(f"No se pudo vaciar la auditoría al salir: {e}")
+    # Lo que no se pudo insertar queda en disco para el próximo proceso
+    restantes = _tomar_lote(_estado['cola'], float('inf'))
+    if restantes:
+        _guardar_en_disco(restantes)
+
+
+atexit.register(_al_salir)
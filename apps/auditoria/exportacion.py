@@ -0,0 +1,131 @@
+"""
+Exportación en streaming de la bitácora (NDJSON o CSV, opcionalmente gzip).
+
+Las filas se leen con un cursor del lado del servidor (iterator con
+chunk_size) como tuplas, se serializan una a una y se envían en bloques de
+~64 KB, así la memoria usada no depende de cuántas filas se exporten.
+
+Bajo ASGI StreamingHttpResponse lee un iterador sync COMPLETO (en un hilo)
+antes de enviar el primer byte; por eso con asincrono=True se devuelve un
+iterador async que avanza el generador de a un bloque con sync_to_async.
+"""
+import csv
+import json
+import zlib
+
+from asgiref.sync import sync_to_async
+from django_tenants.utils import schema_context
+
+
+CAMPOS = [
+    'id', 'fecha', 'usuario_id', 'usuario_nombre', 'accion',
+    'tabla_afectada', 'registro_id', 'detalles', 'ip_address', 'user_agent',
+]
+
+_COLUMNAS = [
+    'id', 'fecha', 'usuario_id', 'usuario__nombre', 'usuario__apellido', 'accion',
+    'tabla_afectada', 'registro_id', 'detalles', 'ip_address', 'user_agent',
+]
+
+TAMANO_BLOQUE = 64 * 1024
+
+
+class _Eco:
+    """Destino de csv.writer que devuelve la línea escrita"""
+
+    def write(self, valor):
+        return valor
+
+
+def _filas(queryset, chunk_size):
+    for fila in queryset.values_list(*_COLUMNAS).iterator(chunk_size=chunk_size):
+        (id_, fecha, usuario_id, nombre, apellido, accion,
+         tabla, registro_id, detalles, ip_address, user_agent) = fila
+        usuario_nombre = f"{nombre} {apellido}" if usuario_id else "Sistema"
+        yield [
+            id_, fecha.isoformat(), usuario_id, usuario_nombre, accion,
+            tabla, registro_id, detalles, ip_address, user_agent,
+        ]
+
+
+def _lineas_ndjson(filas):
+    for fila in filas:
+        yield json.dumps(dict(zip(CAMPOS, fila)), ensure_ascii=False) + '\n'
+
+
+def _lineas_csv(filas):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(CAMPOS)
+    for fila in filas:
+        yield escritor.writerow(fila)
+
+
+def _en_bloques(lineas, comprimir):
+    """Agrupa las líneas en bloques de bytes (comprimidos con gzip si se pide)"""
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31) if comprimir else None
+    buffer = []
+    tamano = 0
+
+    for linea in lineas:
+        datos = linea.encode('utf-8')
+        buffer.append(datos)
+        tamano += len(datos)
+        if tamano >= TAMANO_BLOQUE:
+            bloque = b''.join(buffer)
+            buffer, tamano = [], 0
+            if compresor:
+                bloque = compresor.compress(bloque)
+            if bloque:
+                yield bloque
+
+    bloque = b''.join(buffer)
+    if compresor:
+        bloque = compresor.compress(bloque) + compresor.flush()
+    if bloque:
+        yield bloque
+
+
+async def _bloques_async(bloques):
+    """
+    Recorre un generador sync de a un bloque por vez. Las llamadas van al hilo
+    de la petición (thread_sensitive), así el cursor y el schema_context
+    siempre usan la misma conexión.
+    """
+    siguiente = sync_to_async(next)
+    try:
+        while True:
+            bloque = await siguiente(bloques, None)
+            if bloque is None:
+                break
+            yield bloque
+    finally:
+        await sync_to_async(bloques.close)()
+
+
+def generar_exportacion(queryset, formato='ndjson', comprimir=False, chunk_size=2000, asincrono=False):
+    """
+    Generador de bytes con la exportación del queryset.
+
+    El queryset se evalúa dentro del schema de la petición aunque el
+    generador se consuma después de que la vista retornó.
+
+    Args:
+        queryset: QuerySet de Bitacora ya filtrado y ordenado
+        formato: 'ndjson' o 'csv'
+        comprimir: Si es True la salida es gzip
+        chunk_size: Filas por viaje al cursor del servidor
+        asincrono: Si es True devuelve un iterador async (peticiones ASGI)
+    """
+    from django.db import connection
+
+    schema_name = connection.schema_name
+
+    def generador():
+        with schema_context(schema_name):
+            filas = _filas(queryset, chunk_size)
+            lineas = _lineas_csv(filas) if formato == 'csv' else _lineas_ndjson(filas)
+            yield from _en_bloques(lineas, comprimir)
+
+    if asincrono:
+        return _bloques_async(generador())
+    return generador()
@@ -0,0 +1,71 @@
+"""
+Comando para mantener la bitácora particionada: crea las particiones de los
+próximos meses y archiva/elimina las que superan la retención.
+Uso: python manage.py archivar_bitacora [--retencion-meses 12] [--schema clinica1] [--simular]
+"""
+from django.core.management.base import BaseCommand
+from django.conf import settings
+
+from apps.auditoria.particiones import mantener_bitacora
+from apps.comun.tenants import ejecutar_en_clinicas
+
+
+class Command(BaseCommand):
+    help = 'Archiva y elimina las particiones de la bitácora más antiguas que la retención'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retencion-meses',
+            type=int,
+            default=getattr(settings, 'AUDIT_RETENTION_MONTHS', 12),
+            help='Meses completos que se conservan en la base de datos'
+        )
+        parser.add_argument(
+            '--meses-adelante',
+            type=int,
+            default=getattr(settings, 'AUDIT_PARTITIONS_AHEAD', 2),
+            help='Meses futuros con partición creada'
+        )
+        parser.add_argument(
+            '--schema',
+            type=str,
+            help='Procesar solo esta clínica (schema_name)'
+        )
+        parser.add_argument(
+            '--simular',
+            action='store_true',
+            help='Solo mostrar qué particiones se archivarían'
+        )
+
+    def handle(self, *args, **options):
+        from django_tenants.utils import schema_context
+        
+        parametros = {
+            'meses_retencion': options['retencion_meses'],
+            'meses_adelante': options['meses_adelante'],
+            'simular': options['simular'],
+        }
+        
+        if options['schema']:
+            with schema_context(options['schema']):
+                por_clinica = {options['schema']: mantener_bitacora(**parametros)}
+        else:
+            por_clinica = ejecutar_en_clinicas(mantener_bitacora, solo_activas=False, **parametros)
+        
+        for schema_name, resultado in por_clinica.items():
+            if 'error' in resultado:
+                self.stdout.write(self.style.ERROR(f'❌ {schema_name}: {resultado["error"]}'))
+                continue
+            
+            for particion in resultado['creadas']:
+                self.stdout.write(f'   {schema_name}: partición {particion} creada')
+            for particion in resultado['archivadas']:
+                if options['simular']:
+                    self.stdout.write(self.style.WARNING(f'   {schema_name}: se archivaría {particion["particion"]}'))
+                else:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'✅ {schema_name}: {particion["particion"]} -> {particion["archivo"]} '
+                        f'({particion["filas"]} filas)'
+                    ))
+        
+        self.stdout.write(self.style.SUCCESS('✅ Mantenimiento de bitácora terminado'))
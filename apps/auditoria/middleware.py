@@ -9,6 +9,9 @@ class AuditoriaMiddleware:
     """
     Middleware que registra automáticamente todas las peticiones POST, PUT, PATCH, DELETE
     en la bitácora de auditoría.
+    
+    El registro se encola y lo inserta el escritor por lotes
+    (apps/auditoria/escritor.py), fuera del tiempo de respuesta.
     """
     
     def __init__(self, get_response):
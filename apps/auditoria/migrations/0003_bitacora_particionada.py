@@ -0,0 +1,105 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:47
+
+from datetime import date, datetime, timezone
+
+from django.db import migrations, models
+
+
+def _sumar_meses(mes, cantidad):
+    indice = mes.year * 12 + mes.month - 1 + cantidad
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def particionar_bitacora(apps, schema_editor):
+    """
+    Convierte `bitacora` en una tabla particionada por mes sobre `fecha`.
+    Se crea la tabla nueva, se copian las filas y se reemplaza la original.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('bitacora')")
+        fila = cursor.fetchone()
+        if fila is None or fila[0] == 'p':
+            return
+        cursor.execute(
+            "SELECT pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = 'bitacora'::regclass AND contype = 'f'"
+        )
+        claves_foraneas = [fila[0] for fila in cursor.fetchall()]
+        cursor.execute("SELECT min(fecha), max(id) FROM bitacora")
+        fecha_minima, id_maximo = cursor.fetchone()
+
+    ejecutar = schema_editor.execute
+    ejecutar("CREATE SEQUENCE bitacora_p_id_seq")
+    ejecutar("CREATE TABLE bitacora_p (LIKE bitacora INCLUDING DEFAULTS) PARTITION BY RANGE (fecha)")
+    ejecutar("ALTER TABLE bitacora_p ALTER COLUMN id SET DEFAULT nextval('bitacora_p_id_seq')")
+    ejecutar("ALTER TABLE bitacora_p ADD CONSTRAINT bitacora_p_pkey PRIMARY KEY (id, fecha)")
+    for indice, definicion in enumerate(claves_foraneas):
+        ejecutar(f"ALTER TABLE bitacora_p ADD CONSTRAINT bitacora_p_fk{indice} {definicion}")
+
+    # Un mes por partición desde el registro más antiguo hasta dos meses adelante
+    hoy = datetime.now(timezone.utc).date()
+    mes = date((fecha_minima or hoy).year, (fecha_minima or hoy).month, 1)
+    ultimo = _sumar_meses(date(hoy.year, hoy.month, 1), 2)
+    while mes <= ultimo:
+        siguiente = _sumar_meses(mes, 1)
+        ejecutar(
+            f"CREATE TABLE bitacora_p{mes.year:04d}_{mes.month:02d} PARTITION OF bitacora_p "
+            f"FOR VALUES FROM ('{mes.isoformat()} 00:00:00+00') TO ('{siguiente.isoformat()} 00:00:00+00')"
+        )
+        mes = siguiente
+    ejecutar("CREATE TABLE bitacora_default PARTITION OF bitacora_p DEFAULT")
+
+    ejecutar("INSERT INTO bitacora_p SELECT * FROM bitacora")
+    if id_maximo is not None:
+        ejecutar(f"SELECT setval('bitacora_p_id_seq', {int(id_maximo)})")
+
+    ejecutar("DROP TABLE bitacora")
+    ejecutar("ALTER TABLE bitacora_p RENAME TO bitacora")
+    ejecutar("ALTER TABLE bitacora RENAME CONSTRAINT bitacora_p_pkey TO bitacora_pkey")
+    ejecutar("ALTER SEQUENCE bitacora_p_id_seq RENAME TO bitacora_id_seq")
+    ejecutar("ALTER SEQUENCE bitacora_id_seq OWNED BY bitacora.id")
+
+
+def desparticionar_bitacora(apps, schema_editor):
+    """Vuelve a una tabla `bitacora` sin particiones conservando las filas"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    ejecutar = schema_editor.execute
+    ejecutar("CREATE TABLE bitacora_plana (LIKE bitacora INCLUDING DEFAULTS)")
+    ejecutar("INSERT INTO bitacora_plana SELECT * FROM bitacora")
+    ejecutar("ALTER SEQUENCE bitacora_id_seq OWNED BY bitacora_plana.id")
+    ejecutar("DROP TABLE bitacora")
+    ejecutar("ALTER TABLE bitacora_plana RENAME TO bitacora")
+    ejecutar("ALTER TABLE bitacora ADD CONSTRAINT bitacora_pkey PRIMARY KEY (id)")
+    ejecutar(
+        "ALTER TABLE bitacora ADD CONSTRAINT bitacora_usuario_id_fk FOREIGN KEY (usuario_id) "
+        "REFERENCES usuario (codigo) DEFERRABLE INITIALLY DEFERRED"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditoria', '0002_bitacora_fecha_default'),
+        ('usuarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar_bitacora, desparticionar_bitacora),
+        migrations.AddIndex(
+            model_name='bitacora',
+            index=models.Index(fields=['fecha'], name='bitacora_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bitacora',
+            index=models.Index(fields=['usuario', 'fecha'], name='bitacora_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bitacora',
+            index=models.Index(fields=['tabla_afectada', 'fecha'], name='bitacora_tabla_fecha_idx'),
+        ),
+    ]
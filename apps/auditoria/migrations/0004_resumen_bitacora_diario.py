@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:48
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+def cargar_resumen(apps, schema_editor):
+    """Calcula los conteos diarios de la bitácora existente"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO bitacora_resumen_diario (fecha, accion, tabla_afectada, usuario_id, total)
+            SELECT (fecha AT TIME ZONE %s)::date, accion, COALESCE(tabla_afectada, ''), usuario_id, count(*)
+            FROM bitacora
+            GROUP BY 1, 2, 3, 4
+            """,
+            [settings.TIME_ZONE]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditoria', '0003_bitacora_particionada'),
+        ('usuarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenBitacoraDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(help_text='Día (zona horaria de la clínica)')),
+                ('accion', models.CharField(max_length=255)),
+                ('tabla_afectada', models.CharField(blank=True, default='', max_length=100)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='usuarios.usuario')),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de bitácora',
+                'verbose_name_plural': 'Resúmenes diarios de bitácora',
+                'db_table': 'bitacora_resumen_diario',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['fecha', 'tabla_afectada'], name='bitacora_resumen_tabla_idx'), models.Index(fields=['usuario', 'fecha'], name='bitacora_resumen_usuario_idx')],
+                'constraints': [models.UniqueConstraint(models.F('fecha'), models.F('accion'), models.F('tabla_afectada'), django.db.models.functions.comparison.Coalesce('usuario', models.Value(0)), name='bitacora_resumen_unico')],
+            },
+        ),
+        migrations.RunPython(cargar_resumen, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 
 class Bitacora(models.Model):
@@ -10,14 +13,55 @@ class Bitacora(models.Model):
     detalles = models.TextField(null=True, blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(null=True, blank=True)
-    fecha = models.DateTimeField(auto_now_add=True)
+    # default en lugar de auto_now_add: el escritor por lotes conserva la hora de la petición
+    fecha = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         db_table = 'bitacora'
         verbose_name = 'Bitácora'
         verbose_name_plural = 'Bitácoras'
         ordering = ['-fecha']
+        # La tabla está particionada por mes sobre `fecha` (ver particiones.py);
+        # los índices se crean en cada partición
+        indexes = [
+            models.Index(fields=['fecha'], name='bitacora_fecha_idx'),
+            models.Index(fields=['usuario', 'fecha'], name='bitacora_usuario_fecha_idx'),
+            models.Index(fields=['tabla_afectada', 'fecha'], name='bitacora_tabla_fecha_idx'),
+        ]
 
     def __str__(self):
         usuario_str = self.usuario.nombre if self.usuario else "Sistema"
         return f"{usuario_str} - {self.accion} - {self.fecha}"
+
+
+class ResumenBitacoraDiario(models.Model):
+    """
+    Conteo diario de la bitácora por (acción, tabla, usuario).
+    Lo actualiza el escritor de auditoría al insertar cada lote (ver resumen.py)
+    y se conserva aunque las particiones antiguas de la bitácora se archiven.
+    """
+    fecha = models.DateField(help_text="Día (zona horaria de la clínica)")
+    accion = models.CharField(max_length=255)
+    tabla_afectada = models.CharField(max_length=100, blank=True, default='')
+    usuario = models.ForeignKey('usuarios.Usuario', on_delete=models.SET_NULL, null=True, blank=True)
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'bitacora_resumen_diario'
+        verbose_name = 'Resumen diario de bitácora'
+        verbose_name_plural = 'Resúmenes diarios de bitácora'
+        ordering = ['-fecha']
+        constraints = [
+            # usuario NULL (Sistema) cuenta como un valor más para el upsert
+            models.UniqueConstraint(
+                'fecha', 'accion', 'tabla_afectada', Coalesce('usuario', Value(0)),
+                name='bitacora_resumen_unico',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['fecha', 'tabla_afectada'], name='bitacora_resumen_tabla_idx'),
+            models.Index(fields=['usuario', 'fecha'], name='bitacora_resumen_usuario_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} - {self.accion} - {self.total}"
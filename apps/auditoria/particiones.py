@@ -0,0 +1,333 @@
+"""
+Particionado mensual de la bitácora (PostgreSQL, particiones nativas por rango).
+
+En cada schema de clínica la tabla `bitacora` está particionada por `fecha`:
+    bitacora_p2025_01, bitacora_p2025_02, ...   un mes por partición (UTC)
+    bitacora_default                            filas fuera de los meses creados
+
+La clave primaria es (id, fecha) porque PostgreSQL exige que incluya la clave
+de partición; el id sigue saliendo de una secuencia, así que es único.
+
+Mantenimiento (tarea mantener_bitacora / comando archivar_bitacora):
+1. Crear las particiones del mes actual y de los próximos AUDIT_PARTITIONS_AHEAD.
+2. Las particiones más antiguas que AUDIT_RETENTION_MONTHS se exportan a NDJSON
+   comprimido (gzip), se desenganchan (DETACH) y se eliminan.
+3. Las filas de bitacora_default anteriores al mismo corte (fechas que caían
+   fuera de los meses creados) se exportan igual y se borran de la partición
+   por defecto, para que la retención también se les aplique.
+
+Los archivos se guardan en AUDIT_ARCHIVE_BUCKET (S3) si está configurado o en
+AUDIT_ARCHIVE_DIR en el sistema de archivos local.
+"""
+import gzip
+import logging
+import os
+import re
+import shutil
+import tempfile
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+
+
+logger = logging.getLogger(__name__)
+
+TABLA = 'bitacora'
+PARTICION_DEFAULT = 'bitacora_default'
+_PATRON = re.compile(r'^bitacora_p(\d{4})_(\d{2})$')
+
+
+def _meses_retencion():
+    return getattr(settings, 'AUDIT_RETENTION_MONTHS', 12)
+
+
+def _meses_adelante():
+    return getattr(settings, 'AUDIT_PARTITIONS_AHEAD', 2)
+
+
+def inicio_mes(fecha):
+    return date(fecha.year, fecha.month, 1)
+
+
+def sumar_meses(mes, cantidad):
+    """Primer día del mes desplazado `cantidad` meses"""
+    indice = mes.year * 12 + mes.month - 1 + cantidad
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def nombre_particion(mes):
+    return f"bitacora_p{mes.year:04d}_{mes.month:02d}"
+
+
+def _limite(mes):
+    """Límite de rango en UTC (literal timestamptz)"""
+    return f"'{mes.isoformat()} 00:00:00+00'"
+
+
+def esta_particionada():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLA])
+        fila = cursor.fetchone()
+    return bool(fila) and fila[0] == 'p'
+
+
+def particiones_mensuales():
+    """
+    Particiones mensuales del schema actual.
+
+    Returns:
+        dict {primer día del mes: nombre de la partición}, ordenado por mes
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)
+            """,
+            [TABLA]
+        )
+        nombres = [fila[0] for fila in cursor.fetchall()]
+
+    particiones = {}
+    for nombre in nombres:
+        coincidencia = _PATRON.match(nombre)
+        if coincidencia:
+            particiones[date(int(coincidencia[1]), int(coincidencia[2]), 1)] = nombre
+    return dict(sorted(particiones.items()))
+
+
+def crear_particion(mes):
+    """
+    Crea la partición de un mes. Si la partición por defecto tiene filas de ese
+    mes, se mueven a la nueva partición (PostgreSQL no permite crearla si no).
+    """
+    nombre = nombre_particion(mes)
+    desde, hasta = _limite(mes), _limite(sumar_meses(mes, 1))
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {PARTICION_DEFAULT} "
+            f"WHERE fecha >= {desde} AND fecha < {hasta})"
+        )
+        hay_filas = cursor.fetchone()[0]
+
+        if not hay_filas:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {nombre} PARTITION OF {TABLA} "
+                f"FOR VALUES FROM ({desde}) TO ({hasta})"
+            )
+            return nombre
+
+        cursor.execute(f"ALTER TABLE {TABLA} DETACH PARTITION {PARTICION_DEFAULT}")
+        cursor.execute(
+            f"CREATE TABLE {nombre} PARTITION OF {TABLA} "
+            f"FOR VALUES FROM ({desde}) TO ({hasta})"
+        )
+        cursor.execute(
+            f"INSERT INTO {nombre} SELECT * FROM {PARTICION_DEFAULT} "
+            f"WHERE fecha >= {desde} AND fecha < {hasta}"
+        )
+        cursor.execute(
+            f"DELETE FROM {PARTICION_DEFAULT} WHERE fecha >= {desde} AND fecha < {hasta}"
+        )
+        cursor.execute(f"ALTER TABLE {TABLA} ATTACH PARTITION {PARTICION_DEFAULT} DEFAULT")
+    return nombre
+
+
+def asegurar_particiones(meses_adelante=None):
+    """
+    Crea las particiones del mes actual y de los próximos meses.
+
+    Returns:
+        Lista de particiones creadas
+    """
+    meses_adelante = _meses_adelante() if meses_adelante is None else meses_adelante
+    existentes = particiones_mensuales()
+    actual = inicio_mes(datetime.now(dt_timezone.utc))
+
+    creadas = []
+    for desplazamiento in range(meses_adelante + 1):
+        mes = sumar_meses(actual, desplazamiento)
+        if mes not in existentes:
+            creadas.append(crear_particion(mes))
+    return creadas
+
+
+# ============================================================================
+# ARCHIVO
+# ============================================================================
+
+def _ruta_archivo(mes):
+    return f"auditoria/{connection.schema_name}/bitacora_{mes.year:04d}_{mes.month:02d}.ndjson.gz"
+
+
+def _guardar_archivo(ruta_local, ruta_destino):
+    """Sube el archivo a S3 o lo copia al directorio de archivo local"""
+    bucket = getattr(settings, 'AUDIT_ARCHIVE_BUCKET', None)
+    if bucket:
+        import boto3
+
+        s3 = boto3.client(
+            's3',
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            region_name=settings.AWS_S3_REGION_NAME
+        )
+        s3.upload_file(
+            ruta_local, bucket, ruta_destino,
+            ExtraArgs={'ServerSideEncryption': 'AES256', 'StorageClass': 'GLACIER_IR'}
+        )
+        return f"s3://{bucket}/{ruta_destino}"
+
+    directorio = getattr(
+        settings, 'AUDIT_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archivo_auditoria')
+    )
+    destino = os.path.join(directorio, ruta_destino)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    shutil.copyfile(ruta_local, destino)
+    return destino
+
+
+def _exportar(consulta, ruta_destino, parametros=()):
+    """
+    Exporta el resultado de `consulta` (una columna con el JSON de cada fila)
+    a NDJSON comprimido. Las filas se leen con un cursor del lado del servidor.
+
+    Returns:
+        (ubicación del archivo, cantidad de filas)
+    """
+    filas = 0
+
+    with tempfile.NamedTemporaryFile(suffix='.ndjson.gz', delete=False) as temporal:
+        ruta_local = temporal.name
+
+    try:
+        with gzip.open(ruta_local, 'wt', encoding='utf-8') as archivo:
+            with transaction.atomic(), connection.chunked_cursor() as cursor:
+                cursor.execute(consulta, parametros)
+                while True:
+                    bloque = cursor.fetchmany(2000)
+                    if not bloque:
+                        break
+                    for (linea,) in bloque:
+                        archivo.write(linea)
+                        archivo.write('\n')
+                    filas += len(bloque)
+
+        return _guardar_archivo(ruta_local, ruta_destino), filas
+    finally:
+        os.remove(ruta_local)
+
+
+def exportar_particion(mes):
+    """
+    Exporta una partición a NDJSON comprimido (una fila JSON por línea).
+
+    Returns:
+        (ubicación del archivo, cantidad de filas)
+    """
+    return _exportar(
+        f"SELECT row_to_json(t)::text FROM {nombre_particion(mes)} t ORDER BY id",
+        _ruta_archivo(mes)
+    )
+
+
+def archivar_particion(mes):
+    """
+    Exporta la partición de un mes y luego la desengancha y elimina.
+    Si la exportación falla la partición queda intacta.
+
+    Returns:
+        dict con partición, archivo y filas
+    """
+    nombre = nombre_particion(mes)
+    ubicacion, filas = exportar_particion(mes)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLA} DETACH PARTITION {nombre}")
+        cursor.execute(f"DROP TABLE {nombre}")
+
+    logger.info(f"Bitácora {connection.schema_name}.{nombre}: {filas} filas archivadas en {ubicacion}")
+    return {'particion': nombre, 'archivo': ubicacion, 'filas': filas}
+
+
+def _corte(meses_retencion=None):
+    """Primer mes que se conserva"""
+    meses_retencion = _meses_retencion() if meses_retencion is None else meses_retencion
+    return sumar_meses(inicio_mes(datetime.now(dt_timezone.utc)), -meses_retencion)
+
+
+def particiones_vencidas(meses_retencion=None):
+    """Meses cuyas particiones superan la retención (el mes completo ya pasó)"""
+    corte = _corte(meses_retencion)
+    return [mes for mes in particiones_mensuales() if mes < corte]
+
+
+def _ultimo_id_vencido_default(corte):
+    """Mayor id de las filas de la partición por defecto anteriores al corte (None si no hay)"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT max(id) FROM {PARTICION_DEFAULT} WHERE fecha < {_limite(corte)}")
+        return cursor.fetchone()[0]
+
+
+def archivar_default_vencido(meses_retencion=None):
+    """
+    Exporta y borra las filas de la partición por defecto anteriores al corte
+    de retención. Solo se borran las filas exportadas (id <= el último
+    exportado); si la exportación falla no se borra nada.
+
+    Returns:
+        dict con partición, archivo y filas, o None si no había filas vencidas
+    """
+    corte = _corte(meses_retencion)
+    ultimo_id = _ultimo_id_vencido_default(corte)
+    if ultimo_id is None:
+        return None
+
+    condicion = f"fecha < {_limite(corte)} AND id <= %s"
+    ubicacion, filas = _exportar(
+        f"SELECT row_to_json(t)::text FROM {PARTICION_DEFAULT} t WHERE {condicion} ORDER BY id",
+        f"auditoria/{connection.schema_name}/{PARTICION_DEFAULT}_hasta_{ultimo_id}.ndjson.gz",
+        [ultimo_id]
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {PARTICION_DEFAULT} WHERE {condicion}", [ultimo_id])
+
+    logger.info(f"Bitácora {connection.schema_name}.{PARTICION_DEFAULT}: {filas} filas archivadas en {ubicacion}")
+    return {'particion': PARTICION_DEFAULT, 'archivo': ubicacion, 'filas': filas}
+
+
+def mantener_bitacora(meses_retencion=None, meses_adelante=None, simular=False):
+    """
+    Mantenimiento de la bitácora en el schema actual: crea particiones futuras
+    y archiva las vencidas (incluidas las filas vencidas de la partición por
+    defecto).
+
+    Args:
+        meses_retencion: Meses que se conservan en la BD (además del actual)
+        meses_adelante: Meses futuros con partición creada
+        simular: Si es True solo informa qué se archivaría
+
+    Returns:
+        dict con particiones creadas y archivadas
+    """
+    if not esta_particionada():
+        return {'error': 'La tabla bitacora no está particionada'}
+
+    vencidas = particiones_vencidas(meses_retencion)
+    if simular:
+        archivadas = [{'particion': nombre_particion(mes)} for mes in vencidas]
+        if _ultimo_id_vencido_default(_corte(meses_retencion)) is not None:
+            archivadas.append({'particion': PARTICION_DEFAULT})
+        return {'creadas': [], 'archivadas': archivadas}
+
+    creadas = asegurar_particiones(meses_adelante)
+    archivadas = [archivar_particion(mes) for mes in vencidas]
+    default = archivar_default_vencido(meses_retencion)
+    if default is not None:
+        archivadas.append(default)
+    return {'creadas': creadas, 'archivadas': archivadas}
@@ -0,0 +1,57 @@
+"""
+Tareas asíncronas para el módulo de auditoría.
+"""
+from celery import shared_task
+from django.utils import timezone
+
+
+@shared_task(name='apps.auditoria.tasks.mantener_particiones_bitacora')
+def mantener_particiones_bitacora():
+    """
+    Mantenimiento de la bitácora particionada en todas las clínicas.
+    
+    Crea las particiones de los próximos meses y archiva (NDJSON comprimido)
+    y elimina las que superan AUDIT_RETENTION_MONTHS.
+    Se ejecuta diariamente; es idempotente.
+    """
+    from apps.comun.tenants import ejecutar_en_clinicas
+    from .particiones import mantener_bitacora
+    
+    por_clinica = ejecutar_en_clinicas(mantener_bitacora, solo_activas=False)
+    
+    archivadas = 0
+    for schema_name, resultado in por_clinica.items():
+        if 'error' in resultado:
+            print(f"❌ Error al mantener la bitácora de {schema_name}: {resultado['error']}")
+            continue
+        archivadas += len(resultado['archivadas'])
+        for particion in resultado['archivadas']:
+            print(f"✅ {schema_name}: {particion['particion']} archivada ({particion['filas']} filas)")
+    
+    return {
+        'fecha_ejecucion': timezone.now().isoformat(),
+        'particiones_archivadas': archivadas,
+        'por_clinica': por_clinica,
+    }
+
+
+@shared_task(name='apps.auditoria.tasks.conciliar_resumen_bitacora')
+def conciliar_resumen_bitacora(dias=1):
+    """
+    Recalcula los conteos diarios de la bitácora de los últimos días
+    completos en todas las clínicas (corrige escrituras fuera del escritor
+    por lotes, p. ej. archivos pendientes reprocesados tarde).
+    """
+    from apps.comun.tenants import ejecutar_en_clinicas
+    from .resumen import conciliar_dias_anteriores
+    
+    por_clinica = ejecutar_en_clinicas(conciliar_dias_anteriores, dias, solo_activas=False)
+    
+    for schema_name, resultado in por_clinica.items():
+        if 'error' in resultado:
+            print(f"❌ Error al conciliar el resumen de {schema_name}: {resultado['error']}")
+    
+    return {
+        'fecha_ejecucion': timezone.now().isoformat(),
+        'por_clinica': por_clinica,
+    }
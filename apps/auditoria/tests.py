@@ -0,0 +1,191 @@
+"""
+Tests del módulo de auditoría.
+"""
+import contextlib
+import glob
+import gzip
+import json
+import os
+import queue
+import tempfile
+from unittest import mock
+
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import async_to_sync
+from django.http import StreamingHttpResponse
+from django.test import SimpleTestCase, override_settings
+from django_tenants.test.cases import TenantTestCase
+
+from . import escritor, exportacion, particiones
+from .models import Bitacora
+
+
+class EscritorFalloPorSchemaTest(SimpleTestCase):
+    """
+    Si la transacción de una clínica falla, solo sus registros van a disco:
+    los de las clínicas ya confirmadas no se reinsertan al reprocesar.
+    """
+
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(AUDIT_SPILL_DIR=directorio.name, AUDIT_BATCH_SIZE=200)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.directorio = directorio.name
+
+        self.schema_actual = None
+        self.fallan = {'clinica2'}
+        self.insertados = []
+        self.acumulados = []
+
+        @contextlib.contextmanager
+        def schema_context(schema_name):
+            self.schema_actual = schema_name
+            try:
+                yield
+            finally:
+                self.schema_actual = None
+
+        def bulk_create(objetos, batch_size=None):
+            if self.schema_actual in self.fallan:
+                raise RuntimeError(f'schema {self.schema_actual} no disponible')
+            self.insertados.extend((self.schema_actual, o.accion) for o in objetos)
+            return objetos
+
+        for parche in (
+            mock.patch.object(escritor, 'schema_context', schema_context),
+            mock.patch.object(escritor.transaction, 'atomic', contextlib.nullcontext),
+            mock.patch.object(Bitacora.objects, 'bulk_create', side_effect=bulk_create),
+            mock.patch('apps.auditoria.resumen.acumular', side_effect=self.acumulados.extend),
+        ):
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def _registro(self, schema_name, accion):
+        return {
+            'schema': schema_name,
+            'usuario_id': None,
+            'accion': accion,
+            'tabla_afectada': 'consulta',
+            'registro_id': 1,
+            'detalles': None,
+            'ip_address': None,
+            'user_agent': '',
+            'fecha': '2025-03-01T10:00:00+00:00',
+        }
+
+    def _pendientes(self):
+        registros = []
+        for ruta in glob.glob(os.path.join(self.directorio, '*.jsonl')):
+            with open(ruta, encoding='utf-8') as archivo:
+                registros.extend(json.loads(linea) for linea in archivo if linea.strip())
+        return registros
+
+    def test_solo_el_schema_que_falla_va_a_disco(self):
+        cola = queue.Queue()
+        for registro in (
+            self._registro('clinica1', 'a'), self._registro('clinica2', 'b'),
+            self._registro('clinica1', 'c'),
+        ):
+            cola.put(registro)
+
+        self.assertEqual(escritor.vaciar(cola), 3)
+
+        self.assertEqual(self.insertados, [('clinica1', 'a'), ('clinica1', 'c')])
+        self.assertEqual([r['accion'] for r in self._pendientes()], ['b'])
+
+    def test_reprocesar_no_duplica_los_grupos_confirmados(self):
+        escritor._guardar_en_disco([self._registro('clinica1', 'a'), self._registro('clinica2', 'b')])
+
+        # clinica2 sigue fallando: clinica1 se inserta una sola vez
+        self.assertEqual(escritor.reprocesar_pendientes(), 1)
+        self.assertEqual(escritor.reprocesar_pendientes(), 0)
+        self.assertEqual(self.insertados, [('clinica1', 'a')])
+        self.assertEqual([r['accion'] for r in self.acumulados], ['a'])
+        self.assertEqual([r['accion'] for r in self._pendientes()], ['b'])
+
+        # Cuando clinica2 vuelve, el archivo se vacía
+        self.fallan.clear()
+        self.assertEqual(escritor.reprocesar_pendientes(), 1)
+        self.assertEqual(self.insertados, [('clinica1', 'a'), ('clinica2', 'b')])
+        self.assertEqual(self._pendientes(), [])
+
+    def test_un_archivo_que_falla_no_frena_a_los_siguientes(self):
+        escritor._guardar_en_disco([self._registro('clinica2', 'b')])
+        escritor._guardar_en_disco([self._registro('clinica3', 'c')])
+
+        self.assertEqual(escritor.reprocesar_pendientes(), 1)
+        self.assertEqual(self.insertados, [('clinica3', 'c')])
+
+
+class ExportacionStreamingTest(SimpleTestCase):
+    """
+    Bajo ASGI la exportación debe enviar el primer bloque sin haber leído
+    todo el queryset (un iterador sync se leería completo antes de enviar).
+    """
+
+    FILAS = 5000
+
+    def test_primer_bloque_antes_de_agotar_el_queryset(self):
+        leidas = []
+
+        def filas(queryset, chunk_size):
+            for numero in range(self.FILAS):
+                leidas.append(numero)
+                yield [numero, '2025-03-01T10:00:00', None, 'Sistema', 'Creó consulta',
+                       'consulta', numero, None, None, '']
+
+        async def primer_bloque(response):
+            contenido = aiter(response)
+            bloque = await anext(contenido)
+            leidas_al_enviar = len(leidas)
+            await contenido.aclose()
+            return bloque, leidas_al_enviar
+
+        with mock.patch.object(exportacion, '_filas', filas), \
+                mock.patch.object(exportacion, 'TAMANO_BLOQUE', 4096):
+            response = StreamingHttpResponse(
+                exportacion.generar_exportacion(None, formato='csv', asincrono=True)
+            )
+            self.assertTrue(response.is_async)
+            bloque, leidas_al_enviar = async_to_sync(primer_bloque)(response)
+
+        self.assertTrue(bloque.startswith(b'id,fecha'))
+        self.assertLess(leidas_al_enviar, self.FILAS)
+
+
+class MantenimientoParticionDefaultTest(TenantTestCase):
+    """
+    Las filas de bitacora_default (fechas sin partición mensual) también
+    siguen la retención: las vencidas se archivan y se borran.
+    """
+
+    def test_filas_vencidas_de_default_se_archivan(self):
+        vieja = Bitacora.objects.create(accion='vieja', fecha=datetime(2000, 1, 15, tzinfo=dt_timezone.utc))
+        futura = Bitacora.objects.create(accion='futura', fecha=datetime(2100, 1, 15, tzinfo=dt_timezone.utc))
+
+        with tempfile.TemporaryDirectory() as directorio, \
+                override_settings(AUDIT_ARCHIVE_DIR=directorio, AUDIT_ARCHIVE_BUCKET=None):
+            simulado = particiones.mantener_bitacora(meses_retencion=12, meses_adelante=0, simular=True)
+            self.assertIn({'particion': particiones.PARTICION_DEFAULT}, simulado['archivadas'])
+
+            resultado = particiones.mantener_bitacora(meses_retencion=12, meses_adelante=0)
+            archivado = next(
+                a for a in resultado['archivadas'] if a['particion'] == particiones.PARTICION_DEFAULT
+            )
+            with gzip.open(archivado['archivo'], 'rt', encoding='utf-8') as archivo:
+                exportadas = [json.loads(linea) for linea in archivo]
+
+        self.assertEqual(archivado['filas'], 1)
+        self.assertEqual([fila['id'] for fila in exportadas], [vieja.id])
+        self.assertFalse(Bitacora.objects.filter(pk=vieja.pk).exists())
+        self.assertTrue(Bitacora.objects.filter(pk=futura.pk).exists())
+
+        # Sin filas vencidas no se vuelve a archivar
+        resultado = particiones.mantener_bitacora(meses_retencion=12, meses_adelante=0)
+        self.assertNotIn(
+            particiones.PARTICION_DEFAULT, [a['particion'] for a in resultado['archivadas']]
+        )
@@ -6,7 +6,10 @@ from rest_framework.routers import DefaultRouter
 from . import views
 
 router = DefaultRouter()
-# Registrar sin prefijo para que las acciones estén directamente en /api/v1/auditoria/
+# Rutas documentadas: /api/v1/auditoria/bitacora/... (antes del registro sin
+# prefijo, que tomaría 'bitacora' como pk)
+router.register(r'bitacora', views.BitacoraViewSet, basename='bitacora')
+# Registrar también sin prefijo para que las acciones estén directamente en /api/v1/auditoria/
 router.register(r'', views.BitacoraViewSet, basename='auditoria')
 
 urlpatterns = [
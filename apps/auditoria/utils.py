@@ -15,37 +15,38 @@ def registrar_accion(request, accion, tabla_afectada=None, registro_id=None, det
         detalles: Detalles adicionales (opcional)
     """
     try:
-        from .models import Bitacora
-        from apps.usuarios.models import Usuario
+        from .escritor import async_habilitado, crear_registro, encolar, escribir_registros
+        from apps.comun.principal import obtener_principal
         
-        # Obtener usuario desde el request
-        usuario = None
-        if request.user.is_authenticated:
-            try:
-                usuario = Usuario.objects.get(correoelectronico=request.user.email)
-            except Usuario.DoesNotExist:
-                pass
+        # Obtener usuario desde el request (principal memorizado por petición)
+        principal = obtener_principal(request)
+        usuario_id = principal.usuario.pk if principal else None
         
         # Obtener IP del cliente
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
         if x_forwarded_for:
-            ip_address = x_forwarded_for.split(',')[0]
+            ip_address = x_forwarded_for.split(',')[0].strip()
         else:
             ip_address = request.META.get('REMOTE_ADDR')
         
         # Obtener User Agent
         user_agent = request.META.get('HTTP_USER_AGENT', '')[:500]  # Limitar a 500 caracteres
         
-        # Crear registro en bitácora
-        Bitacora.objects.create(
-            usuario=usuario,
-            accion=accion,
+        registro = crear_registro(
+            usuario_id,
+            accion,
             tabla_afectada=tabla_afectada,
             registro_id=registro_id,
             detalles=detalles,
             ip_address=ip_address,
             user_agent=user_agent
         )
+        
+        # Encolar para el escritor por lotes (o escribir ya si está deshabilitado)
+        if async_habilitado():
+            encolar(registro)
+        else:
+            escribir_registros([registro])
     except Exception as e:
         # No queremos que falle la operación principal si falla el registro de auditoría
         print(f"Error al registrar auditoría: {str(e)}")
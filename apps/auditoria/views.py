@@ -7,9 +7,13 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from django.db.models import Count
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
 
-from .models import Bitacora
+from .models import Bitacora, ResumenBitacoraDiario
 from .serializers import BitacoraSerializer
 from apps.comun.permisos import EsAdministrador
 
@@ -25,6 +29,12 @@ class BitacoraViewSet(viewsets.ReadOnlyModelViewSet):
     - GET /api/v1/auditoria/bitacora/por_usuario/?usuario_id=1
     - GET /api/v1/auditoria/bitacora/por_tabla/?tabla=consulta
     - GET /api/v1/auditoria/bitacora/resumen/
+    - GET /api/v1/auditoria/bitacora/exportar/?formato=ndjson|csv&gzip=1
+    
+    Todos los endpoints aceptan ?desde=YYYY-MM-DD&hasta=YYYY-MM-DD. La tabla
+    está particionada por mes, así que un rango de fechas solo lee las
+    particiones de esos meses. resumen, por_usuario y por_tabla leen los
+    conteos diarios (ResumenBitacoraDiario); sin rango usan los últimos 30 días.
     """
     queryset = Bitacora.objects.all()
     serializer_class = BitacoraSerializer
@@ -35,9 +45,92 @@ class BitacoraViewSet(viewsets.ReadOnlyModelViewSet):
     ordering_fields = ['fecha']
     ordering = ['-fecha']
     
+    def _parsear_fecha(self, parametro, valor, fin_de_dia=False):
+        """Convierte una fecha o fecha-hora del query string en datetime aware"""
+        from datetime import datetime, time, timedelta
+        
+        fecha_hora = parse_datetime(valor)
+        if fecha_hora is None:
+            fecha = parse_date(valor)
+            if fecha is None:
+                raise ValidationError({parametro: 'Formato inválido. Use YYYY-MM-DD'})
+            if fin_de_dia:
+                fecha += timedelta(days=1)
+            fecha_hora = datetime.combine(fecha, time.min)
+        if timezone.is_naive(fecha_hora):
+            fecha_hora = timezone.make_aware(fecha_hora)
+        return fecha_hora
+    
+    def get_queryset(self):
+        """Aplica el rango ?desde / ?hasta (poda de particiones)"""
+        queryset = super().get_queryset()
+        
+        desde = self.request.query_params.get('desde')
+        hasta = self.request.query_params.get('hasta')
+        if desde:
+            queryset = queryset.filter(fecha__gte=self._parsear_fecha('desde', desde))
+        if hasta:
+            # hasta es inclusivo cuando es solo fecha
+            queryset = queryset.filter(fecha__lt=self._parsear_fecha('hasta', hasta, fin_de_dia=True))
+        return queryset
+    
+    def _ventana(self, request):
+        """
+        Rango de días [desde, hasta] para los resúmenes (por defecto los
+        últimos 30 días). Los resúmenes leen ResumenBitacoraDiario, nunca
+        la bitácora completa.
+        """
+        from datetime import timedelta
+        
+        hoy = timezone.localdate()
+        desde = hoy - timedelta(days=29)
+        hasta = hoy
+        
+        for parametro in ('desde', 'hasta'):
+            valor = request.query_params.get(parametro)
+            if not valor:
+                continue
+            fecha = parse_date(valor)
+            if fecha is None:
+                raise ValidationError({parametro: 'Formato inválido. Use YYYY-MM-DD'})
+            if parametro == 'desde':
+                desde = fecha
+            else:
+                hasta = fecha
+        
+        if desde > hasta:
+            raise ValidationError({'desde': 'desde no puede ser posterior a hasta'})
+        
+        return desde, hasta
+    
+    def _resumen_rango(self, resumenes, desde, hasta):
+        """Totales por acción, tabla y día de un conjunto de resúmenes"""
+        resumenes = resumenes.filter(fecha__range=(desde, hasta)).order_by()
+        
+        por_accion = resumenes.values('accion').annotate(
+            total=Sum('total')
+        ).order_by('-total')
+        
+        por_tabla = resumenes.values('tabla_afectada').annotate(
+            total=Sum('total')
+        ).order_by('-total')
+        
+        por_dia = resumenes.values('fecha').annotate(
+            total=Sum('total')
+        ).order_by('fecha')
+        
+        return {
+            'desde': desde,
+            'hasta': hasta,
+            'por_accion': list(por_accion),
+            'por_tabla': list(por_tabla),
+            'por_dia': list(por_dia),
+            'total_registros': resumenes.aggregate(total=Sum('total'))['total'] or 0,
+        }
+    
     @action(detail=False, methods=['get'])
     def por_usuario(self, request):
-        """Filtrar registros por usuario."""
+        """Actividad de un usuario en el rango ?desde / ?hasta."""
         usuario_id = request.query_params.get('usuario_id')
         
         if not usuario_id:
@@ -46,13 +139,16 @@ class BitacoraViewSet(viewsets.ReadOnlyModelViewSet):
                 status=400
             )
         
-        registros = self.queryset.filter(usuario_id=usuario_id)
-        serializer = self.get_serializer(registros, many=True)
-        return Response(serializer.data)
+        desde, hasta = self._ventana(request)
+        resumen = self._resumen_rango(
+            ResumenBitacoraDiario.objects.filter(usuario_id=usuario_id), desde, hasta
+        )
+        resumen['usuario_id'] = usuario_id
+        return Response(resumen)
     
     @action(detail=False, methods=['get'])
     def por_tabla(self, request):
-        """Filtrar registros por tabla afectada."""
+        """Actividad sobre una tabla en el rango ?desde / ?hasta."""
         tabla = request.query_params.get('tabla')
         
         if not tabla:
@@ -61,46 +157,89 @@ class BitacoraViewSet(viewsets.ReadOnlyModelViewSet):
                 status=400
             )
         
-        registros = self.queryset.filter(tabla_afectada__icontains=tabla)
-        serializer = self.get_serializer(registros, many=True)
-        return Response(serializer.data)
+        desde, hasta = self._ventana(request)
+        resumen = self._resumen_rango(
+            ResumenBitacoraDiario.objects.filter(tabla_afectada__icontains=tabla), desde, hasta
+        )
+        resumen['tabla'] = tabla
+        return Response(resumen)
     
     @action(detail=False, methods=['get'])
     def resumen(self, request):
-        """Resumen de actividad en la bitácora."""
-        from django.utils import timezone
+        """Resumen de actividad en la bitácora (desde los conteos diarios)."""
         from datetime import timedelta
         
-        hoy = timezone.now().date()
-        hace_7_dias = hoy - timedelta(days=7)
-        hace_30_dias = hoy - timedelta(days=30)
+        desde, hasta = self._ventana(request)
+        resumen = self._resumen_rango(ResumenBitacoraDiario.objects.all(), desde, hasta)
+        resumen['por_tabla'] = resumen['por_tabla'][:10]
         
-        # Actividad por acción
-        por_accion = self.queryset.values('accion').annotate(
-            total=Count('id')
-        ).order_by('-total')
+        # Actividad reciente
+        hoy = timezone.localdate()
+        recientes = ResumenBitacoraDiario.objects.order_by()
+        resumen['ultimos_7_dias'] = recientes.filter(
+            fecha__gt=hoy - timedelta(days=7)
+        ).aggregate(total=Sum('total'))['total'] or 0
+        resumen['ultimos_30_dias'] = recientes.filter(
+            fecha__gt=hoy - timedelta(days=30)
+        ).aggregate(total=Sum('total'))['total'] or 0
         
-        # Actividad por tabla
-        por_tabla = self.queryset.values('tabla_afectada').annotate(
-            total=Count('id')
-        ).order_by('-total')[:10]
+        return Response(resumen)
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, EsAdministrador])
+    def exportar(self, request):
+        """
+        Exportación en streaming de la bitácora.
         
-        # Actividad reciente
-        ultimos_7_dias = self.queryset.filter(
-            fecha__gte=hace_7_dias
-        ).count()
+        Query params:
+        - formato: ndjson (default) o csv
+        - gzip: 1 para comprimir la salida
+        - desde / hasta: rango de fechas (recomendado; poda particiones)
+        - usuario_id, tabla: filtros opcionales
         
-        ultimos_30_dias = self.queryset.filter(
-            fecha__gte=hace_30_dias
-        ).count()
+        GET /api/v1/auditoria/bitacora/exportar/?desde=2025-01-01&hasta=2025-03-31&formato=csv&gzip=1
+        """
+        from django.core.handlers.asgi import ASGIRequest
+        from django.http import StreamingHttpResponse
+        from .exportacion import generar_exportacion
         
-        return Response({
-            'por_accion': list(por_accion),
-            'por_tabla': list(por_tabla),
-            'ultimos_7_dias': ultimos_7_dias,
-            'ultimos_30_dias': ultimos_30_dias,
-            'total_registros': self.queryset.count()
-        })
+        formato = request.query_params.get('formato', 'ndjson').lower()
+        if formato not in ('ndjson', 'csv'):
+            return Response(
+                {'error': 'formato debe ser ndjson o csv'},
+                status=400
+            )
+        comprimir = request.query_params.get('gzip') in ('1', 'true', 'True')
+        
+        registros = self.filter_queryset(self.get_queryset())
+        usuario_id = request.query_params.get('usuario_id')
+        if usuario_id:
+            registros = registros.filter(usuario_id=usuario_id)
+        tabla = request.query_params.get('tabla')
+        if tabla:
+            registros = registros.filter(tabla_afectada__icontains=tabla)
+        registros = registros.order_by('fecha', 'id')
+        
+        nombre = f"bitacora_{connection.schema_name}_{timezone.localdate().isoformat()}.{formato}"
+        if comprimir:
+            nombre += '.gz'
+            content_type = 'application/gzip'
+        elif formato == 'csv':
+            content_type = 'text/csv; charset=utf-8'
+        else:
+            content_type = 'application/x-ndjson; charset=utf-8'
+        
+        response = StreamingHttpResponse(
+            generar_exportacion(
+                registros, formato=formato, comprimir=comprimir,
+                # Bajo ASGI un iterador sync se leería completo antes de enviar
+                asincrono=isinstance(request._request, ASGIRequest),
+            ),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+        # Evitar que un proxy acumule la respuesta completa
+        response['X-Accel-Buffering'] = 'no'
+        return response
     
     @action(detail=False, methods=['get'])
     def logs(self, request):
@@ -111,7 +250,7 @@ class BitacoraViewSet(viewsets.ReadOnlyModelViewSet):
     def actividad_reciente(self, request):
         """Obtener actividad reciente (últimos 50 registros)."""
         limit = int(request.query_params.get('limit', 50))
-        registros = self.queryset.order_by('-fecha')[:limit]
+        registros = self.get_queryset().order_by('-fecha')[:limit]
         serializer = self.get_serializer(registros, many=True)
         return Response(serializer.data)
 
@@ -5,3 +5,7 @@ class AutenticacionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.autenticacion'
     verbose_name = 'Autenticacion'
+
+    def ready(self):
+        """Registrar signals cuando la app esté lista"""
+        import apps.autenticacion.signals
@@ -0,0 +1,161 @@
+"""
+Autenticación por token con caché en memoria.
+
+TokenAuthentication de DRF hace un JOIN Token + User en cada petición. Esta
+clase es un reemplazo directo que cachea la resolución token -> usuario por
+tenant con un TTL (TOKEN_CACHE_TTL). El estado de BloqueoUsuario se guarda en
+la misma entrada, así un usuario bloqueado sigue siendo rechazado sin consultar
+la BD en cada petición.
+
+Los tokens son TokenAcceso (con fecha_expiracion). La expiración es deslizante:
+cuando a un token en uso le queda menos de la mitad de su vida se renueva con
+un UPDATE, lo que ocurre como mucho una vez cada TOKEN_EXPIRACION_DIAS / 2.
+
+Revocación:
+- revocar_token(key): logout / eliminación de un token
+- revocar_tokens_usuario(user_id): cambio de contraseña, bloqueo, cambios en User
+- revocar_tokens_tenant(): limpieza masiva de tokens
+
+Las revocaciones se publican en el bus de invalidación (mensajes 'token') para
+que todos los workers descarten la entrada.
+"""
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from apps.comun.bus_invalidacion import publicar, registrar_manejador
+
+
+_lock = threading.Lock()
+_entradas = {}  # (schema, key) -> (expira_en, user, token, bloqueado)
+
+
+def _ttl():
+    return getattr(settings, 'TOKEN_CACHE_TTL', 60)
+
+
+def _invalidar(mensaje):
+    """Manejador del bus para mensajes de tipo 'token'"""
+    schema = mensaje.get('schema')
+    key = mensaje.get('key')
+    user_id = mensaje.get('user_id')
+
+    with _lock:
+        if not schema:
+            _entradas.clear()
+            return
+        if key:
+            _entradas.pop((schema, key), None)
+            return
+        for clave, entrada in list(_entradas.items()):
+            if clave[0] != schema:
+                continue
+            if mensaje.get('todo') or entrada[1].pk == user_id:
+                del _entradas[clave]
+
+
+registrar_manejador('token', _invalidar)
+
+
+def revocar_token(key):
+    """Descarta un token de la caché de todos los workers"""
+    publicar('token', schema=connection.schema_name, key=key)
+
+
+def revocar_tokens_usuario(user_id):
+    """Descarta todos los tokens cacheados de un usuario (Django User id)"""
+    publicar('token', schema=connection.schema_name, user_id=user_id)
+
+
+def revocar_tokens_tenant():
+    """Descarta todos los tokens cacheados del tenant actual"""
+    publicar('token', schema=connection.schema_name, todo=True)
+
+
+def usuario_bloqueado(user):
+    """
+    Indica si el Usuario asociado al Django User tiene un bloqueo activo.
+
+    Args:
+        user: Django User (el correo está en username)
+
+    Returns:
+        True si existe un BloqueoUsuario activo
+    """
+    from .models import BloqueoUsuario
+
+    correos = {c for c in (user.username, user.email) if c}
+    return BloqueoUsuario.objects.filter(
+        usuario__correoelectronico__in=correos,
+        activo=True
+    ).exists()
+
+
+class AutenticacionTokenCacheada(TokenAuthentication):
+    """
+    TokenAuthentication con caché por tenant, expiración deslizante y
+    verificación de bloqueo.
+
+    Uso en settings:
+        "DEFAULT_AUTHENTICATION_CLASSES": [
+            "apps.autenticacion.authentication.AutenticacionTokenCacheada",
+            ...
+        ]
+    """
+
+    def get_model(self):
+        from .models import TokenAcceso
+        return TokenAcceso
+
+    def _renovar_si_corresponde(self, token):
+        """Extiende la expiración si ya consumió la mitad de su vida"""
+        ahora = timezone.now()
+        duracion = token.duracion()
+        if token.fecha_expiracion - ahora > duracion / 2:
+            return
+
+        nueva_expiracion = ahora + duracion
+        type(token).objects.filter(pk=token.pk).update(fecha_expiracion=nueva_expiracion)
+        token.fecha_expiracion = nueva_expiracion
+
+    def authenticate_credentials(self, key):
+        clave = (connection.schema_name, key)
+        ahora = time.monotonic()
+
+        with _lock:
+            entrada = _entradas.get(clave)
+
+        if entrada is None or entrada[0] <= ahora:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related('user').get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed('Token inválido.')
+
+            entrada = (ahora + _ttl(), token.user, token, usuario_bloqueado(token.user))
+            with _lock:
+                _entradas[clave] = entrada
+
+        _, user, token, bloqueado = entrada
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('Usuario inactivo o eliminado.')
+
+        if bloqueado:
+            raise exceptions.AuthenticationFailed('Usuario bloqueado.')
+
+        if token.expirado:
+            with _lock:
+                _entradas.pop(clave, None)
+            raise exceptions.AuthenticationFailed('Token expirado.')
+
+        self._renovar_si_corresponde(token)
+
+        # Copia por petición: el objeto cacheado se comparte entre hilos
+        return (copy.copy(user), token)
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autenticacion', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenJWTRevocado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jti', models.CharField(max_length=64, unique=True)),
+                ('expira', models.DateTimeField(db_index=True, help_text='Expiración del token revocado')),
+                ('fecha_revocacion', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Token JWT Revocado',
+                'verbose_name_plural': 'Tokens JWT Revocados',
+                'db_table': 'token_jwt_revocado',
+            },
+        ),
+    ]
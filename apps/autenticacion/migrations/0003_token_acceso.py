@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:43
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def copiar_tokens_drf(apps, schema_editor):
+    """Conserva las sesiones abiertas: cada Token de DRF pasa a TokenAcceso"""
+    Token = apps.get_model('authtoken', 'Token')
+    TokenAcceso = apps.get_model('autenticacion', 'TokenAcceso')
+
+    expiracion = timezone.now() + timedelta(days=getattr(settings, 'TOKEN_EXPIRACION_DIAS', 30))
+    tokens = Token.objects.values_list('key', 'user_id').iterator(chunk_size=2000)
+    lote = []
+    for key, user_id in tokens:
+        lote.append(TokenAcceso(key=key, user_id=user_id, fecha_expiracion=expiracion))
+        if len(lote) >= 2000:
+            TokenAcceso.objects.bulk_create(lote, ignore_conflicts=True)
+            lote = []
+    if lote:
+        TokenAcceso.objects.bulk_create(lote, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autenticacion', '0002_token_jwt_revocado'),
+        ('authtoken', '0004_alter_tokenproxy_options'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenAcceso',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_expiracion', models.DateTimeField(db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens_acceso', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Token de Acceso',
+                'verbose_name_plural': 'Tokens de Acceso',
+                'db_table': 'token_acceso',
+            },
+        ),
+        migrations.RunPython(copiar_tokens_drf, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,10 @@
+import binascii
+import os
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 
 class BloqueoUsuario(models.Model):
@@ -18,3 +24,69 @@ class BloqueoUsuario(models.Model):
 
     def __str__(self):
         return f"Bloqueo: {self.usuario} - {self.fecha_inicio} a {self.fecha_fin or 'indefinido'}"
+
+
+class TokenJWTRevocado(models.Model):
+    """
+    Lista de revocación (deny-list) de tokens JWT cerrados con logout.
+    Solo guarda el jti y su expiración; las filas vencidas se purgan.
+    """
+    jti = models.CharField(max_length=64, unique=True)
+    expira = models.DateTimeField(db_index=True, help_text="Expiración del token revocado")
+    fecha_revocacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'token_jwt_revocado'
+        verbose_name = 'Token JWT Revocado'
+        verbose_name_plural = 'Tokens JWT Revocados'
+
+    def __str__(self):
+        return f"JWT revocado {self.jti} (expira {self.expira})"
+
+
+class TokenAcceso(models.Model):
+    """
+    Token de autenticación con expiración deslizante.
+
+    Reemplaza al Token de DRF (sin expiración): cada login crea un token que
+    vence TOKEN_EXPIRACION_DIAS después; mientras se use, la expiración se
+    renueva (ver AutenticacionTokenCacheada). La limpieza diaria borra los
+    vencidos por rangos del índice de fecha_expiracion.
+    """
+    key = models.CharField(max_length=40, primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='tokens_acceso'
+    )
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_expiracion = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'token_acceso'
+        verbose_name = 'Token de Acceso'
+        verbose_name_plural = 'Tokens de Acceso'
+
+    def __str__(self):
+        return f"Token de {self.user} (expira {self.fecha_expiracion})"
+
+    @staticmethod
+    def duracion():
+        return timedelta(days=getattr(settings, 'TOKEN_EXPIRACION_DIAS', 30))
+
+    @staticmethod
+    def generar_key():
+        return binascii.hexlify(os.urandom(20)).decode()
+
+    @classmethod
+    def crear_para(cls, user):
+        """Crea un token nuevo para el usuario con la expiración por defecto"""
+        return cls.objects.create(
+            key=cls.generar_key(),
+            user=user,
+            fecha_expiracion=timezone.now() + cls.duracion()
+        )
+
+    @property
+    def expirado(self):
+        return self.fecha_expiracion <= timezone.now()
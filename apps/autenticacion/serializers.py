@@ -2,6 +2,7 @@
 Serializers para autenticación.
 """
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from apps.usuarios.models import Usuario
@@ -150,9 +151,10 @@ class RegistroSerializer(serializers.Serializer):
     def validate_tipo_usuario(self, value):
         """Validar que el tipo de usuario exista."""
         from apps.usuarios.models import Tipodeusuario
+        from apps.comun import catalogos
         try:
             # Buscar por rol (nombre del tipo)
-            tipo = Tipodeusuario.objects.get(rol__iexact=value)
+            tipo = catalogos.tipo_usuario(value)
             return tipo.rol
         except Tipodeusuario.DoesNotExist:
             raise serializers.ValidationError(
@@ -182,3 +184,30 @@ class RegistroSerializer(serializers.Serializer):
             pass
         
         return data
+
+
+class RefrescarTokenSerializer(TokenRefreshSerializer):
+    """
+    Refresco de JWT que además verifica tenant, deny-list y que el usuario
+    siga activo y sin bloqueo (como la autenticación por Token).
+    """
+    
+    def validate(self, attrs):
+        from django.contrib.auth.models import User
+        from django.db import connection
+        from rest_framework_simplejwt.settings import api_settings
+        from .authentication import usuario_bloqueado
+        from .tokens_jwt import esta_revocado
+        
+        refresh = self.token_class(attrs['refresh'])
+        if refresh.get('schema') != connection.schema_name:
+            raise serializers.ValidationError({'refresh': 'El token no pertenece a esta clínica'})
+        if esta_revocado(refresh):
+            raise serializers.ValidationError({'refresh': 'El token fue revocado'})
+        
+        user = User.objects.filter(pk=refresh.get(api_settings.USER_ID_CLAIM)).first()
+        if user is None or not user.is_active:
+            raise serializers.ValidationError({'refresh': 'Usuario inactivo o eliminado'})
+        if usuario_bloqueado(user):
+            raise serializers.ValidationError({'refresh': 'Usuario bloqueado'})
+        return super().validate(attrs)
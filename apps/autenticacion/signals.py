@@ -0,0 +1,81 @@
+"""
+Signals de autenticación.
+Mantienen coherente la caché de tokens (apps/autenticacion/authentication.py)
+y revocan los JWT cuando cambian credenciales, estado, bloqueo o rol.
+"""
+from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from apps.usuarios.models import Usuario
+
+from .models import BloqueoUsuario
+from .authentication import revocar_tokens_usuario
+from .tokens_jwt import jwt_habilitado, revocar_jwt_usuario
+
+
+@receiver(pre_save, sender=User)
+def recordar_credenciales(sender, instance, update_fields=None, **kwargs):
+    """Contraseña y estado anteriores, para saber si hay que revocar los JWT"""
+    if not jwt_habilitado() or instance._state.adding or not instance.pk:
+        return
+    if update_fields is not None and not {'password', 'is_active'} & set(update_fields):
+        return  # p. ej. last_login en cada login
+    instance._credenciales_originales = User.objects.filter(pk=instance.pk).values_list(
+        'password', 'is_active'
+    ).first()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def revocar_cache_usuario(sender, instance, **kwargs):
+    """Cambio de contraseña, desactivación o eliminación del Django User"""
+    revocar_tokens_usuario(instance.pk)
+    
+    if not jwt_habilitado() or kwargs.get('created'):
+        return
+    originales = getattr(instance, '_credenciales_originales', None)
+    instance._credenciales_originales = None
+    eliminado = 'created' not in kwargs  # post_delete
+    if eliminado or (originales is not None and (
+        originales[0] != instance.password or (originales[1] and not instance.is_active)
+    )):
+        revocar_jwt_usuario(instance.pk)
+
+
+@receiver(post_save, sender=BloqueoUsuario)
+@receiver(post_delete, sender=BloqueoUsuario)
+def revocar_cache_bloqueo(sender, instance, **kwargs):
+    """Al crear, levantar o eliminar un bloqueo se recalcula el estado cacheado"""
+    correo = instance.usuario.correoelectronico
+    bloquear_jwt = jwt_habilitado() and 'created' in kwargs and instance.activo
+    for user_id in User.objects.filter(username=correo).values_list('id', flat=True):
+        revocar_tokens_usuario(user_id)
+        if bloquear_jwt:
+            revocar_jwt_usuario(user_id)
+
+
+@receiver(pre_save, sender=Usuario)
+def recordar_rol(sender, instance, update_fields=None, **kwargs):
+    """Tipo de usuario anterior, para saber si hay que revocar los JWT"""
+    if not jwt_habilitado() or instance._state.adding or not instance.pk:
+        return
+    if update_fields is not None and not {'idtipousuario', 'idtipousuario_id'} & set(update_fields):
+        return
+    instance._rol_original = Usuario.objects.filter(pk=instance.pk).values_list(
+        'idtipousuario_id', flat=True
+    ).first()
+
+
+@receiver(post_save, sender=Usuario)
+def revocar_jwt_por_rol(sender, instance, created, **kwargs):
+    """
+    El rol viaja en los claims del JWT (obtener_rol no consulta la base):
+    al cambiar el tipo de usuario se revocan sus JWT y debe volver a iniciar sesión.
+    """
+    original = getattr(instance, '_rol_original', None)
+    instance._rol_original = None
+    if created or original is None or original == instance.idtipousuario_id:
+        return
+    for user_id in User.objects.filter(username=instance.correoelectronico).values_list('id', flat=True):
+        revocar_jwt_usuario(user_id)
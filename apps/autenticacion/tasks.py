@@ -3,52 +3,75 @@ Tareas asíncronas para el módulo de autenticación.
 """
 from celery import shared_task
 from django.utils import timezone
-from datetime import timedelta
+
+
+def eliminar_tokens_vencidos(ahora, tamano_lote):
+    """
+    Elimina los TokenAcceso vencidos del schema actual en lotes acotados.
+    
+    Cada lote toma como máximo `tamano_lote` claves usando el índice de
+    fecha_expiracion, así ninguna sentencia crece con el tamaño de la tabla.
+    
+    Returns:
+        dict con tokens eliminados y JWT revocados purgados
+    """
+    from .models import TokenAcceso
+    from .tokens_jwt import purgar_revocados
+    
+    eliminados = 0
+    while True:
+        claves = list(
+            TokenAcceso.objects
+            .filter(fecha_expiracion__lte=ahora)
+            .values_list('key', flat=True)[:tamano_lote]
+        )
+        if not claves:
+            break
+        TokenAcceso.objects.filter(key__in=claves).delete()
+        eliminados += len(claves)
+    
+    # Purgar la deny-list de JWT (solo guarda tokens aún no vencidos)
+    return {
+        'tokens_eliminados': eliminados,
+        'jwt_purgados': purgar_revocados(),
+    }
 
 
 @shared_task(name='apps.autenticacion.tasks.limpiar_tokens_expirados')
-def limpiar_tokens_expirados():
+def limpiar_tokens_expirados(tamano_lote=1000):
     """
-    Elimina tokens de autenticación expirados de la base de datos.
+    Elimina tokens de autenticación expirados en todas las clínicas.
     
     Se ejecuta diariamente a las 3:00 AM para mantener la BD limpia.
+    Los tokens vencidos ya son rechazados al autenticar; aquí solo se
+    libera espacio. El reporte incluye el conteo por clínica.
     """
-    from rest_framework.authtoken.models import Token
-    from django.contrib.auth import get_user_model
+    from apps.comun.tenants import ejecutar_en_clinicas
     
     ahora = timezone.now()
-    hace_30_dias = ahora - timedelta(days=30)
-    
-    # Estrategia: Eliminar tokens de usuarios inactivos hace más de 30 días
-    # Los tokens de DRF no tienen fecha de expiración por defecto,
-    # así que usamos last_login del usuario
     
-    User = get_user_model()
+    por_clinica = ejecutar_en_clinicas(
+        eliminar_tokens_vencidos, ahora, tamano_lote, solo_activas=False
+    )
     
-    tokens_eliminados = 0
+    tokens_eliminados = sum(
+        r.get('tokens_eliminados', 0) for r in por_clinica.values()
+    )
+    for schema_name, resultado in por_clinica.items():
+        if 'error' in resultado:
+            print(f"❌ Error al limpiar tokens en {schema_name}: {resultado['error']}")
+        elif resultado['tokens_eliminados'] or resultado['jwt_purgados']:
+            print(
+                f"✅ {schema_name}: {resultado['tokens_eliminados']} tokens eliminados, "
+                f"{resultado['jwt_purgados']} JWT revocados purgados"
+            )
     
-    try:
-        # Obtener usuarios inactivos hace más de 30 días
-        usuarios_inactivos = User.objects.filter(
-            last_login__lt=hace_30_dias
-        ).values_list('id', flat=True)
-        
-        # Eliminar sus tokens
-        tokens_a_eliminar = Token.objects.filter(
-            user_id__in=usuarios_inactivos
-        )
-        
-        tokens_eliminados = tokens_a_eliminar.count()
-        tokens_a_eliminar.delete()
-        
-        print(f"✅ Tokens expirados eliminados: {tokens_eliminados}")
-        
-    except Exception as e:
-        print(f"❌ Error al limpiar tokens: {str(e)}")
+    print(f"✅ Tokens expirados eliminados: {tokens_eliminados}")
     
     return {
         'fecha_ejecucion': ahora.isoformat(),
-        'tokens_eliminados': tokens_eliminados
+        'tokens_eliminados': tokens_eliminados,
+        'por_clinica': por_clinica,
     }
 
 
@@ -0,0 +1,237 @@
+"""
+Modo de autenticación JWT (opcional, AUTH_JWT_ENABLED) con djangorestframework-simplejwt.
+
+Los tokens de acceso y refresco llevan los claims:
+    schema:   schema del tenant que emitió el token
+    codigo:   Usuario.codigo
+    rol:      rol del usuario (Tipodeusuario.rol)
+    username, email, is_staff, is_superuser
+
+AutenticacionJWTTenant valida la firma y el schema sin consultar la BD y
+devuelve un UsuarioToken (sin fila de User). Los permisos leen el rol desde
+el claim (ver apps/comun/principal.obtener_rol). El refresco está en
+views.RefrescarTokenView.
+
+Logout: el jti del token se agrega a TokenJWTRevocado (deny-list compacta).
+Bloqueo, desactivación, cambio de contraseña o eliminación del usuario
+(signals.py): se guarda en la misma tabla una marca por usuario
+('usuario:<id>') y se rechazan sus tokens emitidos antes (claim iat).
+Cada worker mantiene en memoria los jti revocados y las marcas no vencidas
+por schema y recibe las nuevas revocaciones por el bus de invalidación
+(mensajes 'jwt').
+"""
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.comun.bus_invalidacion import publicar, registrar_manejador
+
+
+_lock = threading.Lock()
+_revocados = {}  # schema -> (expira_en, set(jti), {user_id: timestamp de la marca})
+
+PREFIJO_USUARIO = 'usuario:'
+
+
+def jwt_habilitado():
+    return getattr(settings, 'AUTH_JWT_ENABLED', False)
+
+
+# ============================================================================
+# DENY-LIST
+# ============================================================================
+
+def _ttl_revocados():
+    return getattr(settings, 'JWT_DENYLIST_REFRESH', 300)
+
+
+def _agregar_revocado(mensaje):
+    """Manejador del bus para mensajes de tipo 'jwt'"""
+    schema = mensaje.get('schema')
+    with _lock:
+        if mensaje.get('todo') or not schema:
+            _revocados.clear()
+            return
+        entrada = _revocados.get(schema)
+        if entrada is None:
+            return
+        if mensaje.get('jti'):
+            entrada[1].add(mensaje['jti'])
+        if mensaje.get('usuario') is not None:
+            entrada[2][mensaje['usuario']] = mensaje['desde']
+
+
+registrar_manejador('jwt', _agregar_revocado)
+
+
+def _deny_list():
+    """(jti revocados, {user_id: marca}) no vencidos del tenant actual"""
+    from .models import TokenJWTRevocado
+
+    schema = connection.schema_name
+    ahora = time.monotonic()
+    with _lock:
+        entrada = _revocados.get(schema)
+    if entrada is not None and entrada[0] > ahora:
+        return entrada[1], entrada[2]
+
+    jtis, marcas = set(), {}
+    filas = (
+        TokenJWTRevocado.objects
+        .filter(expira__gt=datetime.now(dt_timezone.utc))
+        .values_list('jti', 'fecha_revocacion')
+    )
+    for jti, fecha in filas:
+        if jti.startswith(PREFIJO_USUARIO):
+            marcas[int(jti[len(PREFIJO_USUARIO):])] = fecha.timestamp()
+        else:
+            jtis.add(jti)
+    with _lock:
+        _revocados[schema] = (ahora + _ttl_revocados(), jtis, marcas)
+    return jtis, marcas
+
+
+def esta_revocado(token):
+    """
+    Indica si el token está en la deny-list: su jti fue revocado (logout) o
+    se emitió antes de la última marca de su usuario.
+    """
+    jtis, marcas = _deny_list()
+    jti = token.get(api_settings.JTI_CLAIM)
+    if jti and jti in jtis:
+        return True
+    marca = marcas.get(token.get(api_settings.USER_ID_CLAIM))
+    return marca is not None and token.get('iat', 0) < marca
+
+
+def revocar_jwt(token):
+    """
+    Agrega el token a la deny-list hasta su expiración.
+
+    Args:
+        token: Token de simplejwt (acceso o refresco) ya validado
+    """
+    from .models import TokenJWTRevocado
+
+    jti = token.get(api_settings.JTI_CLAIM)
+    if not jti:
+        return
+    expira = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+    TokenJWTRevocado.objects.get_or_create(jti=jti, defaults={'expira': expira})
+    publicar('jwt', schema=connection.schema_name, jti=jti)
+
+
+def revocar_jwt_usuario(user_id):
+    """
+    Invalida todos los JWT ya emitidos para el usuario (bloqueo,
+    desactivación, cambio de contraseña). La marca dura lo que un token de
+    refresco, después ya no queda ninguno anterior con vida.
+
+    Args:
+        user_id: Django User id (claim user_id)
+    """
+    from .models import TokenJWTRevocado
+
+    ahora = datetime.now(dt_timezone.utc)
+    TokenJWTRevocado.objects.update_or_create(
+        jti=f'{PREFIJO_USUARIO}{user_id}',
+        defaults={
+            'expira': ahora + api_settings.REFRESH_TOKEN_LIFETIME,
+            'fecha_revocacion': ahora,
+        }
+    )
+    publicar('jwt', schema=connection.schema_name, usuario=user_id, desde=ahora.timestamp())
+
+
+def purgar_revocados():
+    """Elimina de la deny-list los tokens ya vencidos. Retorna la cantidad."""
+    from .models import TokenJWTRevocado
+
+    eliminados, _ = TokenJWTRevocado.objects.filter(
+        expira__lte=datetime.now(dt_timezone.utc)
+    ).delete()
+    return eliminados
+
+
+# ============================================================================
+# EMISIÓN
+# ============================================================================
+
+def emitir_tokens(django_user, usuario):
+    """
+    Emite el par de tokens JWT para un login.
+
+    Args:
+        django_user: Django User autenticado
+        usuario: Usuario de la clínica asociado
+
+    Returns:
+        dict con 'access' y 'refresh'
+    """
+    refresh = RefreshToken.for_user(django_user)
+    refresh['schema'] = connection.schema_name
+    refresh['codigo'] = usuario.codigo
+    refresh['rol'] = usuario.idtipousuario.rol if usuario.idtipousuario_id else None
+    refresh['username'] = django_user.username
+    refresh['email'] = django_user.email
+    refresh['is_staff'] = django_user.is_staff
+    refresh['is_superuser'] = django_user.is_superuser
+
+    # El token de acceso copia los claims del refresh
+    return {
+        'access': str(refresh.access_token),
+        'refresh': str(refresh),
+    }
+
+
+# ============================================================================
+# AUTENTICACIÓN
+# ============================================================================
+
+class UsuarioToken(TokenUser):
+    """Usuario sin estado respaldado por los claims del JWT"""
+
+    @property
+    def email(self):
+        return self.token.get('email', '')
+
+    @property
+    def codigo(self):
+        return self.token.get('codigo')
+
+    @property
+    def rol(self):
+        return self.token.get('rol')
+
+
+def _validar_schema(token):
+    """El token solo es válido en el tenant que lo emitió"""
+    if token.get('schema') != connection.schema_name:
+        raise InvalidToken('El token no pertenece a esta clínica')
+
+
+class AutenticacionJWTTenant(JWTStatelessUserAuthentication):
+    """
+    Autenticación JWT sin consultas: valida firma, expiración, tenant y
+    deny-list (en memoria) y devuelve un UsuarioToken.
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        _validar_schema(token)
+        if esta_revocado(token):
+            raise InvalidToken('El token fue revocado')
+        return token
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken('El token no identifica a un usuario')
+        return UsuarioToken(validated_token)
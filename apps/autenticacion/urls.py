@@ -12,4 +12,5 @@ urlpatterns = [
     path('cambiar-password/', views.CambiarPasswordView.as_view(), name='cambiar-password'),
     path('verificar-token/', views.VerificarTokenView.as_view(), name='verificar-token'),
     path('perfil/', views.PerfilView.as_view(), name='perfil'),
+    path('token/refresh/', views.RefrescarTokenView.as_view(), name='token-refresh'),
 ]
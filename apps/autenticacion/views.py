@@ -5,7 +5,6 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.authtoken.models import Token
 from django.contrib.auth import logout
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
@@ -16,10 +15,17 @@ from .serializers import (
     CambiarPasswordSerializer,
     TokenSerializer,
     ActualizarPerfilSerializer,
-    RegistroSerializer
+    RegistroSerializer,
+    RefrescarTokenSerializer
 )
-from .models import BloqueoUsuario
+from .models import BloqueoUsuario, TokenAcceso
 from apps.auditoria.utils import registrar_login, registrar_logout
+from apps.comun.principal import obtener_principal
+from .authentication import revocar_token, revocar_tokens_usuario
+from .tokens_jwt import jwt_habilitado, emitir_tokens, revocar_jwt
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import RefreshToken, Token as JWTToken
+from rest_framework_simplejwt.views import TokenRefreshView
 
 
 class LoginView(APIView):
@@ -51,18 +57,24 @@ class LoginView(APIView):
                     'fecha_fin': bloqueo_activo.fecha_fin
                 }, status=status.HTTP_403_FORBIDDEN)
 
-            # Crear/obtener token de autenticación ligado al Django User autenticado
-            token, created = Token.objects.get_or_create(user=django_user)
+            # Crear token de autenticación (con expiración) ligado al Django User autenticado
+            token = TokenAcceso.crear_para(django_user)
 
             # Registrar login exitoso en auditoría
             registrar_login(request, usuario.correoelectronico, exitoso=True)
 
             from apps.usuarios.serializers import UsuarioDetalleSerializer
-            return Response({
+            respuesta = {
                 'mensaje': 'Login exitoso',
                 'usuario': UsuarioDetalleSerializer(usuario).data,
                 'token': token.key
-            }, status=status.HTTP_200_OK)
+            }
+
+            # Modo JWT: además del token DRF se entregan access/refresh
+            if jwt_habilitado():
+                respuesta.update(emitir_tokens(django_user, usuario))
+
+            return Response(respuesta, status=status.HTTP_200_OK)
 
         # Registrar login fallido
         correo = request.data.get('correo', 'desconocido')
@@ -82,15 +94,28 @@ class LogoutView(APIView):
     def post(self, request):
         # Registrar logout en auditoría
         try:
-            from apps.usuarios.models import Usuario
-            usuario = Usuario.objects.get(correoelectronico=request.user.email)
-            registrar_logout(request, usuario.correoelectronico)
+            principal = obtener_principal(request)
+            if principal is not None:
+                registrar_logout(request, principal.usuario.correoelectronico)
         except:
             pass
         
-        # Eliminar token asociado al usuario autenticado (si existe)
+        # Modo JWT: revocar el token de acceso usado y el refresh enviado
+        if jwt_habilitado():
+            try:
+                if isinstance(request.auth, JWTToken):
+                    revocar_jwt(request.auth)
+                if request.data.get('refresh'):
+                    revocar_jwt(RefreshToken(request.data['refresh']))
+            except TokenError:
+                pass
+
+        # Eliminar el token usado en esta petición (si existe)
         try:
-            request.user.auth_token.delete()
+            if isinstance(request.auth, TokenAcceso):
+                key = request.auth.key
+                TokenAcceso.objects.filter(pk=key).delete()
+                revocar_token(key)
         except Exception:
             pass
 
@@ -145,6 +170,9 @@ class CambiarPasswordView(APIView):
         
         if serializer.is_valid():
             user = request.user
+            if not isinstance(user, User):
+                # Modo JWT: request.user es un UsuarioToken sin fila de BD
+                user = User.objects.get(pk=user.pk)
             
             # Verificar password actual
             if not user.check_password(serializer.validated_data['password_actual']):
@@ -158,8 +186,9 @@ class CambiarPasswordView(APIView):
             
             # Regenerar token después de cambiar contraseña
             try:
-                Token.objects.filter(user=user).delete()
-                new_token = Token.objects.create(user=user)
+                TokenAcceso.objects.filter(user=user).delete()
+                revocar_tokens_usuario(user.pk)
+                new_token = TokenAcceso.crear_para(user)
                 
                 return Response({
                     'mensaje': 'Contraseña cambiada exitosamente',
@@ -189,9 +218,8 @@ class VerificarTokenView(APIView):
         # Mapear el Django User a nuestro modelo Usuario por correo
         usuario = None
         try:
-            if request.user and request.user.email:
-                from apps.usuarios.models import Usuario
-                usuario = Usuario.objects.filter(correoelectronico=request.user.email).first()
+            principal = obtener_principal(request)
+            usuario = principal.usuario if principal else None
         except Exception:
             usuario = None
 
@@ -216,19 +244,17 @@ class PerfilView(APIView):
     
     def get(self, request):
         """Obtener datos del perfil del usuario autenticado."""
-        from apps.usuarios.models import Usuario
         from apps.usuarios.serializers import UsuarioDetalleSerializer
         
-        try:
-            usuario = Usuario.objects.get(correoelectronico=request.user.email)
-            return Response(
-                UsuarioDetalleSerializer(usuario).data,
-                status=status.HTTP_200_OK
-            )
-        except Usuario.DoesNotExist:
+        principal = obtener_principal(request)
+        if principal is None:
             return Response({
                 'error': 'Usuario no encontrado'
             }, status=status.HTTP_404_NOT_FOUND)
+        return Response(
+            UsuarioDetalleSerializer(principal.usuario).data,
+            status=status.HTTP_200_OK
+        )
     
     def patch(self, request):
         """Actualizar datos del perfil del usuario autenticado."""
@@ -308,6 +334,7 @@ class RegistroView(APIView):
     
     def post(self, request):
         from apps.usuarios.models import Usuario, Tipodeusuario, Paciente
+        from apps.comun import catalogos
         from apps.usuarios.serializers import UsuarioDetalleSerializer
         from django.db import transaction
         
@@ -330,7 +357,7 @@ class RegistroView(APIView):
                 )
                 
                 # 2. Obtener tipo de usuario
-                tipo_usuario = Tipodeusuario.objects.get(rol__iexact=data['tipo_usuario'])
+                tipo_usuario = catalogos.tipo_usuario(data['tipo_usuario'])
                 
                 # 3. Crear usuario personalizado
                 usuario = Usuario.objects.create(
@@ -355,7 +382,7 @@ class RegistroView(APIView):
                     )
                 
                 # 5. Generar token de autenticación
-                token = Token.objects.create(user=django_user)
+                token = TokenAcceso.crear_para(django_user)
                 
                 # 6. Registrar en auditoría (si está habilitado)
                 try:
@@ -386,3 +413,12 @@ class RegistroView(APIView):
                 'error': f'Error al registrar usuario: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
+class RefrescarTokenView(TokenRefreshView):
+    """
+    Vista para renovar el token de acceso JWT (modo AUTH_JWT_ENABLED).
+    
+    POST /api/v1/auth/token/refresh/
+    Body: { "refresh": "<jwt>" }
+    """
+    serializer_class = RefrescarTokenSerializer
@@ -6,6 +6,7 @@ from django.db.models import Q
 from apps.citas.models import Consulta, Horario, Tipodeconsulta
 from apps.usuarios.models import Paciente
 from apps.profesionales.models import Odontologo
+from apps.comun import catalogos
 import re
 
 
@@ -239,17 +240,17 @@ class ChatbotEngine:
                 raise ValueError()
             
             horario_id = horarios_ids[seleccion - 1]
-            horario = Horario.objects.get(id=horario_id)
+            horario = catalogos.horario(horario_id)
             
             # Guardar en contexto
             self.contexto['datos_cita']['horario_id'] = horario_id
             
             # Mostrar tipos de consulta
-            tipos = Tipodeconsulta.objects.filter(permite_agendamiento_web=True)
+            tipos = catalogos.tipos_consulta(agendamiento_web=True)
             
-            if not tipos.exists():
+            if not tipos:
                 # Si no hay tipos permitidos, usar tipos genéricos
-                tipos = Tipodeconsulta.objects.all()[:5]
+                tipos = catalogos.tipos_consulta()[:5]
             
             mensaje = f'✅ Horario seleccionado: {horario.hora.strftime("%H:%M")}\n\n'
             mensaje += '🦷 **Tipo de consulta:**\n\n'
@@ -288,7 +289,7 @@ class ChatbotEngine:
                 raise ValueError()
             
             tipo_id = tipos_ids[seleccion - 1]
-            tipo = Tipodeconsulta.objects.get(id=tipo_id)
+            tipo = catalogos.tipo_consulta(tipo_id)
             
             # Guardar en contexto
             self.contexto['datos_cita']['tipo_consulta_id'] = tipo_id
@@ -296,7 +297,7 @@ class ChatbotEngine:
             # Resumen para confirmación
             datos = self.contexto['datos_cita']
             fecha = datetime.fromisoformat(datos['fecha'])
-            horario = Horario.objects.get(id=datos['horario_id'])
+            horario = catalogos.horario(datos['horario_id'])
             
             mensaje = '📋 **Resumen de tu cita:**\n\n'
             mensaje += f"📅 Fecha: {fecha.strftime('%d/%m/%Y')}\n"
@@ -377,33 +378,28 @@ class ChatbotEngine:
                 return {'success': False, 'error': 'Paciente no identificado'}
             
             # Obtener objetos
-            from apps.citas.models import Estadodeconsulta
             fecha = datetime.fromisoformat(datos['fecha']).date()
-            horario = Horario.objects.get(id=datos['horario_id'])
-            tipo = Tipodeconsulta.objects.get(id=datos['tipo_consulta_id'])
-            estado_pendiente = Estadodeconsulta.objects.get(estado='Pendiente')
+            horario = catalogos.horario(datos['horario_id'])
+            tipo = catalogos.tipo_consulta(datos['tipo_consulta_id'])
+            estado_pendiente = catalogos.estado_consulta('Pendiente')
             
-            # Verificar disponibilidad nuevamente
-            existe = Consulta.objects.filter(
-                fecha=fecha,
-                idhorario=horario
-            ).exists()
-            
-            if existe:
+            # Reservar el horario y crear la consulta (sin doble agendamiento)
+            from apps.citas.reservas import reservar_horario, HorarioOcupado
+            try:
+                with reservar_horario(fecha, horario.id):
+                    consulta = Consulta.objects.create(
+                        fecha=fecha,
+                        codpaciente=self.conversacion.paciente,
+                        idhorario=horario,
+                        idtipoconsulta=tipo,
+                        idestadoconsulta=estado_pendiente,
+                        estado='pendiente',
+                        motivo_consulta=datos.get('motivo', 'Agendado via chatbot'),
+                        tipo_consulta='primera_vez'
+                    )
+            except HorarioOcupado:
                 return {'success': False, 'error': 'El horario ya fue reservado'}
             
-            # Crear consulta
-            consulta = Consulta.objects.create(
-                fecha=fecha,
-                codpaciente=self.conversacion.paciente,
-                idhorario=horario,
-                idtipoconsulta=tipo,
-                idestadoconsulta=estado_pendiente,
-                estado='pendiente',
-                motivo_consulta=datos.get('motivo', 'Agendado via chatbot'),
-                tipo_consulta='primera_vez'
-            )
-            
             mensaje = f"📅 Fecha: {fecha.strftime('%d/%m/%Y')}\n"
             mensaje += f"🕐 Hora: {horario.hora.strftime('%H:%M')}\n"
             mensaje += f"🦷 Tipo: {tipo.nombreconsulta}\n"
@@ -505,8 +501,7 @@ class ChatbotEngine:
             cita = Consulta.objects.get(id=cita_id)
             
             # Cancelar la cita
-            from apps.citas.models import Estadodeconsulta
-            estado_cancelada = Estadodeconsulta.objects.get(estado='Cancelada')
+            estado_cancelada = catalogos.estado_consulta('Cancelada')
             cita.estado = 'cancelada'
             cita.idestadoconsulta = estado_cancelada
             cita.motivo_cancelacion = 'Cancelada via chatbot'
@@ -585,10 +580,7 @@ class ChatbotEngine:
     
     def _obtener_horarios_disponibles(self, fecha):
         """Obtener horarios disponibles para una fecha."""
-        # IDs de horarios ocupados
-        horarios_ocupados = Consulta.objects.filter(
-            fecha=fecha
-        ).values_list('idhorario_id', flat=True)
+        from apps.citas.disponibilidad import horarios_libres
         
-        # Horarios disponibles
-        return Horario.objects.exclude(id__in=horarios_ocupados).order_by('hora')
+        # Horarios sin consulta activa en la clínica (motor de disponibilidad en caché)
+        return horarios_libres(fecha)
@@ -0,0 +1,118 @@
+"""
+Agenda semanal de todos los odontólogos (grilla de recepción).
+
+- marcador(): UNA consulta agregada (max(fecha_actualizacion), count) sobre el
+  rango; con los catálogos de horarios y tipos de consulta forma el ETag. Si
+  el cliente ya tiene esa versión la vista responde 304 sin armar la agenda.
+- construir(): UNA consulta values() con solo los campos que usa la grilla,
+  agrupada en memoria por odontólogo y día en formato columnar (una lista
+  por campo) para que la respuesta sea compacta.
+
+Los updates masivos sobre Consulta deben asignar fecha_actualizacion a mano
+(QuerySet.update no aplica auto_now) para que el ETag cambie.
+
+Cambiar solo el nombre de un paciente u odontólogo no toca las consultas, así
+que no cambia el ETag por sí mismo: el ETag incluye además una ventana de
+AGENDA_ETAG_VIGENCIA segundos, de modo que esos nombres quedan desactualizados
+como mucho ese tiempo.
+"""
+import hashlib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Max
+
+from apps.comun import catalogos
+
+from .disponibilidad import ESTADOS_LIBRES
+
+
+COLUMNAS = ['id', 'horario', 'paciente_id', 'paciente', 'estado', 'tipo']
+
+
+def _consultas(desde, hasta, odontologo_id=None):
+    from .models import Consulta
+
+    consultas = Consulta.objects.filter(
+        fecha__gte=desde, fecha__lte=hasta
+    ).exclude(estado__in=ESTADOS_LIBRES).order_by()
+    if odontologo_id is not None:
+        consultas = consultas.filter(cododontologo_id=odontologo_id)
+    return consultas
+
+
+def marcador(desde, hasta, odontologo_id=None):
+    """
+    ETag de la agenda del rango: cambia al crear, modificar o eliminar una
+    consulta del rango, al cambiar los catálogos de horarios o tipos de
+    consulta y al pasar cada ventana de AGENDA_ETAG_VIGENCIA segundos.
+    """
+    datos = _consultas(desde, hasta, odontologo_id).aggregate(
+        ultima=Max('fecha_actualizacion'), total=Count('id')
+    )
+    horarios = ','.join(f'{h.id}:{h.hora}' for h in catalogos.horarios())
+    tipos = ','.join(f'{t.id}:{t.nombreconsulta}' for t in catalogos.tipos_consulta())
+    ventana = int(time.time() // max(getattr(settings, 'AGENDA_ETAG_VIGENCIA', 300), 1))
+    texto = (
+        f"{connection.schema_name}|{desde}|{hasta}|{odontologo_id}|"
+        f"{datos['ultima'] and datos['ultima'].isoformat()}|{datos['total']}|"
+        f"{horarios}|{tipos}|{ventana}"
+    )
+    return '"' + hashlib.blake2b(texto.encode(), digest_size=12).hexdigest() + '"'
+
+
+def construir(desde, hasta, odontologo_id=None):
+    """
+    Agenda del rango agrupada por odontólogo y día.
+
+    Returns:
+        dict con los horarios, los tipos de consulta, los días del rango y
+        por odontólogo (None = sin asignar) un dict {fecha: {columna: [...]}}
+    """
+    filas = _consultas(desde, hasta, odontologo_id).values_list(
+        'id', 'fecha', 'idhorario_id', 'idtipoconsulta_id', 'estado',
+        'codpaciente_id', 'codpaciente__codusuario__nombre', 'codpaciente__codusuario__apellido',
+        'cododontologo_id', 'cododontologo__codusuario__nombre', 'cododontologo__codusuario__apellido',
+    )
+
+    horarios = catalogos.horarios()
+    orden_horario = {h.id: posicion for posicion, h in enumerate(horarios)}
+
+    odontologos = {}
+    for (consulta_id, fecha, horario_id, tipo_id, estado, paciente_id, paciente_nombre,
+         paciente_apellido, odontologo, odontologo_nombre, odontologo_apellido) in filas:
+        grupo = odontologos.get(odontologo)
+        if grupo is None:
+            grupo = odontologos[odontologo] = {
+                'id': odontologo,
+                'nombre': f"Dr(a). {odontologo_nombre} {odontologo_apellido}" if odontologo else 'Sin asignar',
+                'dias': {},
+            }
+        grupo['dias'].setdefault(fecha.isoformat(), []).append((
+            orden_horario.get(horario_id, len(horarios)),
+            [consulta_id, horario_id, paciente_id, f"{paciente_nombre} {paciente_apellido}", estado, tipo_id],
+        ))
+
+    for grupo in odontologos.values():
+        for dia, consultas in grupo['dias'].items():
+            consultas.sort(key=lambda item: item[0])
+            columnas = list(zip(*(valores for _, valores in consultas)))
+            grupo['dias'][dia] = {nombre: list(columna) for nombre, columna in zip(COLUMNAS, columnas)}
+
+    dias = []
+    fecha = desde
+    while fecha <= hasta:
+        dias.append(fecha.isoformat())
+        fecha += timedelta(days=1)
+
+    return {
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'dias': dias,
+        'columnas': COLUMNAS,
+        'horarios': [{'id': h.id, 'hora': h.hora.strftime('%H:%M')} for h in horarios],
+        'tipos': {t.id: t.nombreconsulta for t in catalogos.tipos_consulta()},
+        'odontologos': sorted(odontologos.values(), key=lambda g: (g['id'] is None, g['nombre'])),
+    }
@@ -0,0 +1,169 @@
+"""
+Contadores de asistencia por paciente (AsistenciaPaciente).
+
+En lugar de contar las consultas del paciente en cada guardado, los signals
+de Consulta comparan el (paciente, estado) con el que se cargó la consulta y
+solo cuando cambia suman/restan con F() en la columna correspondiente:
+
+- no_show    -> noshows
+- completada -> completadas
+- cancelada  -> canceladas
+
+Los updates masivos (QuerySet.update) no disparan signals: si alguno cambia
+estos estados debe llamar a registrar_transicion() o ejecutar
+reconciliar() después (comando reconciliar_asistencia).
+"""
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+
+COLUMNAS = {
+    'no_show': 'noshows',
+    'completada': 'completadas',
+    'cancelada': 'canceladas',
+}
+
+LIMITE_NOSHOWS = 3
+
+
+def _sumar(paciente_id, cambios):
+    """Aplica {columna: delta} de forma atómica, creando la fila si no existe"""
+    from .models import AsistenciaPaciente
+
+    actualizar = {columna: F(columna) + delta for columna, delta in cambios.items()}
+    if AsistenciaPaciente.objects.filter(paciente_id=paciente_id).update(
+        fecha_actualizacion=timezone.now(), **actualizar
+    ):
+        return
+
+    try:
+        with transaction.atomic():
+            AsistenciaPaciente.objects.create(
+                paciente_id=paciente_id,
+                **{columna: max(delta, 0) for columna, delta in cambios.items()}
+            )
+    except IntegrityError:
+        # Otra petición creó la fila al mismo tiempo
+        AsistenciaPaciente.objects.filter(paciente_id=paciente_id).update(
+            fecha_actualizacion=timezone.now(), **actualizar
+        )
+
+
+def registrar_transicion(anterior, actual):
+    """
+    Actualiza los contadores por un cambio de estado de una consulta.
+
+    Args:
+        anterior, actual: (paciente_id, estado) o None (consulta nueva / eliminada)
+
+    Returns:
+        True si la transición sumó una falta (no-show) al paciente actual
+    """
+    if anterior == actual:
+        return False
+
+    cambios = {}
+    if anterior is not None and anterior[1] in COLUMNAS:
+        cambios[anterior[0]] = {COLUMNAS[anterior[1]]: -1}
+    if actual is not None and actual[1] in COLUMNAS:
+        delta = cambios.setdefault(actual[0], {})
+        columna = COLUMNAS[actual[1]]
+        delta[columna] = delta.get(columna, 0) + 1
+
+    for paciente_id, delta in cambios.items():
+        delta = {columna: valor for columna, valor in delta.items() if valor}
+        if delta:
+            _sumar(paciente_id, delta)
+
+    return actual is not None and actual[1] == 'no_show' and anterior != actual
+
+
+def conteos(paciente_id):
+    """dict con noshows, completadas y canceladas del paciente"""
+    from .models import AsistenciaPaciente
+
+    fila = AsistenciaPaciente.objects.filter(paciente_id=paciente_id).values(
+        'noshows', 'completadas', 'canceladas'
+    ).first()
+    return fila or {'noshows': 0, 'completadas': 0, 'canceladas': 0}
+
+
+def bloquear_si_corresponde(paciente_id, noshows, creado_por=None):
+    """
+    Bloquea al usuario del paciente si alcanzó LIMITE_NOSHOWS faltas y no
+    tiene un bloqueo activo.
+
+    Returns:
+        El BloqueoUsuario creado o None
+    """
+    if noshows < LIMITE_NOSHOWS:
+        return None
+
+    from apps.autenticacion.models import BloqueoUsuario
+
+    if BloqueoUsuario.objects.filter(usuario_id=paciente_id, activo=True).exists():
+        return None
+
+    return BloqueoUsuario.objects.create(
+        usuario_id=paciente_id,
+        motivo=f'Bloqueo automático por {noshows} faltas (no-show) registradas',
+        creado_por=creado_por,  # None = bloqueado automáticamente por el sistema
+        activo=True
+    )
+
+
+def reconciliar():
+    """
+    Recalcula los contadores del schema actual desde las consultas.
+
+    Returns:
+        dict con pacientes recalculados y filas corregidas
+    """
+    from .models import AsistenciaPaciente, Consulta
+
+    reales = {
+        fila['codpaciente_id']: fila
+        for fila in Consulta.objects.order_by().values('codpaciente_id').annotate(
+            noshows=Count('id', filter=Q(estado='no_show')),
+            completadas=Count('id', filter=Q(estado='completada')),
+            canceladas=Count('id', filter=Q(estado='cancelada')),
+        ).filter(Q(noshows__gt=0) | Q(completadas__gt=0) | Q(canceladas__gt=0))
+    }
+
+    corregidas = 0
+    with transaction.atomic():
+        actuales = {
+            fila.paciente_id: fila
+            for fila in AsistenciaPaciente.objects.select_for_update()
+        }
+
+        nuevas = []
+        for paciente_id, fila in reales.items():
+            valores = {columna: fila[columna] for columna in COLUMNAS.values()}
+            actual = actuales.pop(paciente_id, None)
+            if actual is None:
+                nuevas.append(AsistenciaPaciente(paciente_id=paciente_id, **valores))
+            elif any(getattr(actual, columna) != valor for columna, valor in valores.items()):
+                AsistenciaPaciente.objects.filter(paciente_id=paciente_id).update(
+                    fecha_actualizacion=timezone.now(), **valores
+                )
+                corregidas += 1
+
+        AsistenciaPaciente.objects.bulk_create(nuevas, batch_size=1000)
+
+        # Pacientes con contadores pero sin consultas en esos estados
+        sobrantes = [
+            paciente_id for paciente_id, fila in actuales.items()
+            if fila.noshows or fila.completadas or fila.canceladas
+        ]
+        if sobrantes:
+            AsistenciaPaciente.objects.filter(paciente_id__in=sobrantes).update(
+                noshows=0, completadas=0, canceladas=0, fecha_actualizacion=timezone.now()
+            )
+
+    return {
+        'schema': connection.schema_name,
+        'pacientes': len(reales),
+        'corregidas': corregidas + len(nuevas) + len(sobrantes),
+    }
@@ -0,0 +1,244 @@
+"""
+Motor de disponibilidad de horarios por rango de fechas.
+
+La ocupación de una semana se guarda como un mapa de bits por día: el bit
+`idhorario` está en 1 si ese horario tiene una consulta activa. Hay una
+entrada por (schema, odontólogo, lunes de la semana); odontólogo None es la
+ocupación de toda la clínica (cualquier consulta en ese horario), que es lo
+que usan el agendamiento sin odontólogo y el chatbot.
+
+- Las semanas que faltan en caché se calculan con UNA consulta para todo el
+  rango pedido.
+- Crear, reprogramar, cancelar o eliminar una Consulta publica el cambio en el
+  bus de invalidación (mensajes 'disponibilidad') y cada worker enciende o
+  apaga el bit correspondiente sin volver a consultar. Las entradas de toda la
+  clínica se descartan cuando se libera un horario (otra consulta podría
+  seguir ocupándolo).
+- DISPONIBILIDAD_CACHE_TTL es un TTL de respaldo (p. ej. para updates masivos
+  que no disparan signals, ver invalidar()).
+
+IMPORTANTE: Los objetos Horario devueltos vienen del catálogo en caché; no
+modificarlos.
+"""
+import threading
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils.dateparse import parse_date
+
+from apps.comun import catalogos
+from apps.comun.bus_invalidacion import publicar, registrar_manejador
+
+
+# Estados en los que la consulta ya no ocupa su horario
+ESTADOS_LIBRES = ('cancelada', 'no_asistio', 'no_show', 'vencida')
+
+_lock = threading.Lock()
+_generaciones = {}  # schema -> contador de cambios
+_entradas = {}  # (schema, odontologo_id, lunes) -> (expira_en, [mapa por día x7])
+
+
+def _ttl():
+    return getattr(settings, 'DISPONIBILIDAD_CACHE_TTL', 300)
+
+
+def a_fecha(valor):
+    """Acepta date o 'YYYY-MM-DD' (las vistas a veces asignan el string)"""
+    if isinstance(valor, str):
+        return parse_date(valor)
+    return valor
+
+
+def lunes(fecha):
+    return fecha - timedelta(days=fecha.weekday())
+
+
+# ============================================================================
+# INVALIDACIÓN INCREMENTAL
+# ============================================================================
+
+def _aplicar(mensaje):
+    """Manejador del bus para mensajes de tipo 'disponibilidad'"""
+    schema = mensaje.get('schema')
+    with _lock:
+        if mensaje.get('todo') or not schema:
+            if schema:
+                _generaciones[schema] = _generaciones.get(schema, 0) + 1
+                for clave in [c for c in _entradas if c[0] == schema]:
+                    del _entradas[clave]
+            else:
+                for clave in list(_generaciones):
+                    _generaciones[clave] += 1
+                _entradas.clear()
+            return
+
+        _generaciones[schema] = _generaciones.get(schema, 0) + 1
+
+        for fecha_iso, horario_id, odontologo_id, ocupa in mensaje.get('cambios', ()):
+            fecha = date.fromisoformat(fecha_iso)
+            semana = lunes(fecha)
+            bit = 1 << horario_id
+
+            if odontologo_id is not None:
+                entrada = _entradas.get((schema, odontologo_id, semana))
+                if entrada is not None:
+                    mapas = entrada[1]
+                    if ocupa:
+                        mapas[fecha.weekday()] |= bit
+                    else:
+                        mapas[fecha.weekday()] &= ~bit
+
+            clave_clinica = (schema, None, semana)
+            entrada = _entradas.get(clave_clinica)
+            if entrada is not None:
+                if ocupa:
+                    entrada[1][fecha.weekday()] |= bit
+                else:
+                    del _entradas[clave_clinica]
+
+
+registrar_manejador('disponibilidad', _aplicar)
+
+
+def publicar_cambio(anterior, actual):
+    """
+    Publica el cambio de ocupación de una consulta.
+
+    Args:
+        anterior, actual: (fecha, horario_id, odontologo_id) o None si la
+            consulta no ocupaba / no ocupa un horario
+    """
+    if anterior == actual:
+        return
+
+    cambios = []
+    if anterior is not None:
+        cambios.append([anterior[0].isoformat(), anterior[1], anterior[2], False])
+    if actual is not None:
+        cambios.append([actual[0].isoformat(), actual[1], actual[2], True])
+
+    publicar('disponibilidad', schema=connection.schema_name, cambios=cambios)
+
+
+def invalidar():
+    """Descarta toda la disponibilidad cacheada del tenant actual (updates masivos)"""
+    publicar('disponibilidad', schema=connection.schema_name, todo=True)
+
+
+# ============================================================================
+# CÁLCULO
+# ============================================================================
+
+def _cargar_semanas(schema, odontologo_id, semanas):
+    """Calcula los mapas de varias semanas con una sola consulta"""
+    from .models import Consulta
+
+    consultas = Consulta.objects.filter(
+        fecha__gte=min(semanas),
+        fecha__lt=max(semanas) + timedelta(days=7),
+    ).exclude(estado__in=ESTADOS_LIBRES)
+    if odontologo_id is not None:
+        consultas = consultas.filter(cododontologo_id=odontologo_id)
+
+    mapas = {semana: [0] * 7 for semana in semanas}
+    for fecha, horario_id in consultas.values_list('fecha', 'idhorario_id').order_by():
+        semana = lunes(fecha)
+        if semana in mapas:
+            mapas[semana][fecha.weekday()] |= 1 << horario_id
+    return mapas
+
+
+def ocupacion(desde, hasta, odontologo_id=None):
+    """
+    Mapas de bits de ocupación por día.
+
+    Args:
+        desde, hasta: date (inclusive)
+        odontologo_id: Odontólogo (codusuario) o None para toda la clínica
+
+    Returns:
+        dict {fecha: entero con el bit idhorario encendido si está ocupado}
+    """
+    schema = connection.schema_name
+    ahora = time.monotonic()
+
+    semanas = []
+    semana = lunes(desde)
+    while semana <= hasta:
+        semanas.append(semana)
+        semana += timedelta(days=7)
+
+    with _lock:
+        generacion = _generaciones.get(schema, 0)
+        cache = {}
+        for semana in semanas:
+            entrada = _entradas.get((schema, odontologo_id, semana))
+            if entrada is not None and entrada[0] > ahora:
+                cache[semana] = list(entrada[1])
+
+    faltantes = [semana for semana in semanas if semana not in cache]
+    if faltantes:
+        cargadas = _cargar_semanas(schema, odontologo_id, faltantes)
+        with _lock:
+            # Si llegó un cambio durante la carga no se guarda (se usa igual en esta petición)
+            if _generaciones.get(schema, 0) == generacion:
+                for semana, mapas in cargadas.items():
+                    _entradas[(schema, odontologo_id, semana)] = (ahora + _ttl(), list(mapas))
+        cache.update(cargadas)
+
+    resultado = {}
+    fecha = desde
+    while fecha <= hasta:
+        resultado[fecha] = cache[lunes(fecha)][fecha.weekday()]
+        fecha += timedelta(days=1)
+    return resultado
+
+
+def horarios_libres(fecha, odontologo_id=None):
+    """Horarios (catálogo, ordenados por hora) sin consulta activa en la fecha"""
+    fecha = a_fecha(fecha)
+    mapa = ocupacion(fecha, fecha, odontologo_id)[fecha]
+    return [h for h in catalogos.horarios() if not mapa >> h.id & 1]
+
+
+def horarios_ocupados(fecha, odontologo_id=None):
+    """IDs de horarios con consulta activa en la fecha"""
+    fecha = a_fecha(fecha)
+    mapa = ocupacion(fecha, fecha, odontologo_id)[fecha]
+    return [h.id for h in catalogos.horarios() if mapa >> h.id & 1]
+
+
+def esta_libre(fecha, horario_id, odontologo_id=None):
+    fecha = a_fecha(fecha)
+    return not ocupacion(fecha, fecha, odontologo_id)[fecha] >> int(horario_id) & 1
+
+
+def disponibilidad_rango(desde, hasta, odontologo_id=None):
+    """
+    Disponibilidad compacta de un rango para el calendario.
+
+    Returns:
+        dict con la lista de horarios (orden de las posiciones del mapa) y por
+        día un string 'mapa' donde '1' = libre en esa posición
+    """
+    horarios = catalogos.horarios()
+    ocupado = ocupacion(desde, hasta, odontologo_id)
+
+    dias = []
+    for fecha, mapa in ocupado.items():
+        libres = ''.join('0' if mapa >> h.id & 1 else '1' for h in horarios)
+        dias.append({
+            'fecha': fecha.isoformat(),
+            'mapa': libres,
+            'libres': libres.count('1'),
+        })
+
+    return {
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'odontologo_id': odontologo_id,
+        'horarios': [{'id': h.id, 'hora': h.hora.strftime('%H:%M')} for h in horarios],
+        'dias': dias,
+    }
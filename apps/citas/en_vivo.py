@@ -0,0 +1,211 @@
+"""
+Agenda en vivo: eventos de consultas por Server-Sent Events (ASGI).
+
+1. Los signals de Consulta calculan un diff compacto (crear, confirmar,
+   cancelar, reprogramar, llegada del paciente, ...) y lo publican con
+   publicar_cambio() en el bus de invalidación (mensajes 'agenda'). El bus lo
+   entrega al confirmar la transacción en este proceso y, vía PostgreSQL
+   LISTEN/NOTIFY, a los demás workers.
+2. Cada worker reparte el evento a las conexiones SSE abiertas de ese schema
+   (una asyncio.Queue por conexión; el hilo del bus entrega con
+   call_soon_threadsafe).
+3. Si una conexión se atrasa (cola llena), se reconecta el listener o el
+   mensaje no cabe en un NOTIFY, el cliente recibe 'resync' y debe volver a
+   pedir la agenda (GET /citas/agenda/ con su ETag).
+
+Requiere servir config.asgi con uvicorn (o gunicorn con el worker de
+uvicorn). Bajo WSGI Django consume el generador asíncrono completo antes de
+enviar nada y, como el flujo no termina, la conexión no recibiría eventos y
+bloquearía un worker; por eso la vista responde 501 si la petición no es
+ASGI.
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+from apps.comun.bus_invalidacion import publicar, registrar_manejador
+
+
+_lock = threading.Lock()
+_suscripciones = {}  # schema -> set(_Suscripcion)
+
+RESYNC = {'accion': 'resync'}
+
+
+def _configuracion(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+class _Suscripcion:
+    """Conexión SSE abierta: cola de eventos en el event loop de la conexión"""
+
+    def __init__(self, schema, odontologo_id, loop):
+        self.schema = schema
+        self.odontologo_id = odontologo_id
+        self.loop = loop
+        self.cola = asyncio.Queue(maxsize=_configuracion('AGENDA_EN_VIVO_COLA_MAX', 200))
+
+    def interesa(self, evento):
+        if self.odontologo_id is None or evento.get('accion') == 'resync':
+            return True
+        return self.odontologo_id in (evento.get('odontologo'), (evento.get('anterior') or {}).get('odontologo'))
+
+    def _poner(self, evento):
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Cliente lento: descartar lo pendiente y pedirle resincronizar
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.cola.put_nowait(RESYNC)
+
+    def entregar(self, evento):
+        """Se llama desde cualquier hilo (bus, petición que guardó la consulta)"""
+        try:
+            self.loop.call_soon_threadsafe(self._poner, evento)
+        except RuntimeError:
+            # El event loop ya cerró; la conexión se da de baja al terminar
+            pass
+
+
+def suscribir(schema, odontologo_id=None):
+    suscripcion = _Suscripcion(schema, odontologo_id, asyncio.get_running_loop())
+    with _lock:
+        _suscripciones.setdefault(schema, set()).add(suscripcion)
+    return suscripcion
+
+
+def desuscribir(suscripcion):
+    with _lock:
+        conjunto = _suscripciones.get(suscripcion.schema)
+        if conjunto is not None:
+            conjunto.discard(suscripcion)
+            if not conjunto:
+                del _suscripciones[suscripcion.schema]
+
+
+def _recibir(mensaje):
+    """Manejador del bus para mensajes de tipo 'agenda'"""
+    schema = mensaje.get('schema')
+    evento = RESYNC if mensaje.get('todo') or 'evento' not in mensaje else mensaje['evento']
+
+    with _lock:
+        if schema:
+            destinos = list(_suscripciones.get(schema, ()))
+        else:
+            destinos = [s for conjunto in _suscripciones.values() for s in conjunto]
+
+    for suscripcion in destinos:
+        if suscripcion.interesa(evento):
+            suscripcion.entregar(evento)
+
+
+registrar_manejador('agenda', _recibir)
+
+
+# ============================================================================
+# PUBLICACIÓN
+# ============================================================================
+
+def _accion(anterior, actual):
+    """Nombre del cambio entre dos Consulta.estado_agenda() o None si no afecta la grilla"""
+    estado, fecha, horario, odontologo, llegada = actual
+    if anterior[0] != estado and estado in ('confirmada', 'cancelada'):
+        return estado
+    if (anterior[1], anterior[2], anterior[3]) != (fecha, horario, odontologo):
+        return 'reprogramada'
+    if anterior[4] is None and llegada is not None:
+        return 'llegada'
+    if anterior[0] != estado:
+        return 'estado'
+    return None
+
+
+def publicar_cambio(consulta, creada=False, eliminada=False):
+    """
+    Publica el cambio de una consulta para las agendas en vivo.
+
+    Args:
+        consulta: Instancia guardada o eliminada
+        creada, eliminada: Tipo de operación
+    """
+    anterior = getattr(consulta, '_agenda_original', False)
+    actual = consulta.estado_agenda()
+
+    if eliminada:
+        accion = 'eliminada'
+        actual = anterior or actual
+    elif creada:
+        accion = 'creada'
+    elif anterior is False:
+        accion = 'actualizada'
+    else:
+        accion = _accion(anterior, actual) if actual is not False else None
+
+    if actual is False:
+        # Campos diferidos: no se puede armar el diff
+        publicar_resync()
+        return
+    if accion is None:
+        return
+
+    estado, fecha, horario, odontologo, llegada = actual
+    evento = {
+        'accion': accion,
+        'id': consulta.pk,
+        'fecha': fecha.isoformat() if fecha else None,
+        'horario': horario,
+        'odontologo': odontologo,
+        'paciente_id': consulta.__dict__.get('codpaciente_id'),
+        'estado': estado,
+        'llegada': llegada.isoformat() if llegada else None,
+    }
+    if accion == 'reprogramada':
+        evento['anterior'] = {
+            'fecha': anterior[1].isoformat() if anterior[1] else None,
+            'horario': anterior[2],
+            'odontologo': anterior[3],
+        }
+
+    publicar('agenda', schema=connection.schema_name, evento=evento)
+
+
+def publicar_resync():
+    """Pide a las agendas en vivo del tenant actual volver a cargar (updates masivos)"""
+    publicar('agenda', schema=connection.schema_name, todo=True)
+
+
+# ============================================================================
+# FLUJO SSE
+# ============================================================================
+
+def _formatear(numero, evento):
+    tipo = 'resync' if evento.get('accion') == 'resync' else 'consulta'
+    datos = json.dumps(evento, ensure_ascii=False, separators=(',', ':'))
+    return f"id: {numero}\nevent: {tipo}\ndata: {datos}\n\n"
+
+
+async def eventos(schema, odontologo_id=None):
+    """
+    Generador asíncrono del cuerpo SSE de una conexión.
+    Envía un comentario cada AGENDA_EN_VIVO_HEARTBEAT segundos para que los
+    proxies no cierren la conexión.
+    """
+    suscripcion = suscribir(schema, odontologo_id)
+    latido = _configuracion('AGENDA_EN_VIVO_HEARTBEAT', 15)
+    numero = 0
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                evento = await asyncio.wait_for(suscripcion.cola.get(), timeout=latido)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            numero += 1
+            yield _formatear(numero, evento)
+    finally:
+        desuscribir(suscripcion)
@@ -0,0 +1,40 @@
+"""
+Comando para recalcular los contadores de asistencia (no-show, completadas,
+canceladas) de los pacientes desde las consultas.
+Uso: python manage.py reconciliar_asistencia [--schema clinica1]
+"""
+from django.core.management.base import BaseCommand
+
+from apps.citas.asistencia import reconciliar
+from apps.comun.tenants import ejecutar_en_clinicas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores de asistencia de los pacientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--schema',
+            type=str,
+            help='Procesar solo esta clínica (schema_name)'
+        )
+
+    def handle(self, *args, **options):
+        from django_tenants.utils import schema_context
+        
+        if options['schema']:
+            with schema_context(options['schema']):
+                por_clinica = {options['schema']: reconciliar()}
+        else:
+            por_clinica = ejecutar_en_clinicas(reconciliar, solo_activas=False)
+        
+        for schema_name, resultado in por_clinica.items():
+            if 'error' in resultado:
+                self.stdout.write(self.style.ERROR(f'❌ {schema_name}: {resultado["error"]}'))
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ {schema_name}: {resultado["pacientes"]} pacientes, '
+                f'{resultado["corregidas"]} contadores corregidos'
+            ))
+        
+        self.stdout.write(self.style.SUCCESS('✅ Reconciliación de asistencia terminada'))
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:52
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def verificar_duplicados(apps, schema_editor):
+    """
+    La restricción no se puede crear si ya hay consultas activas duplicadas.
+    Se informan para resolverlas (cancelar o reprogramar) antes de migrar.
+    """
+    Consulta = apps.get_model('citas', 'Consulta')
+    duplicados = list(
+        Consulta.objects
+        .exclude(estado__in=['cancelada', 'no_asistio', 'no_show', 'vencida'])
+        .filter(cododontologo__isnull=False)
+        .values('fecha', 'idhorario_id', 'cododontologo_id')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+        .order_by('fecha')[:20]
+    )
+    if duplicados:
+        detalle = '; '.join(
+            f"fecha={d['fecha']} horario={d['idhorario_id']} odontologo={d['cododontologo_id']} ({d['total']})"
+            for d in duplicados
+        )
+        raise RuntimeError(
+            f"Hay consultas activas en el mismo horario y odontólogo en el schema "
+            f"'{getattr(schema_editor.connection, 'schema_name', 'public')}': {detalle}. "
+            f"Cancelar o reprogramar las duplicadas y volver a migrar."
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0001_initial'),
+        ('profesionales', '0001_initial'),
+        ('usuarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(verificar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='consulta',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado__in', ['cancelada', 'no_asistio', 'no_show', 'vencida']), _negated=True), fields=('fecha', 'idhorario', 'cododontologo'), name='consulta_horario_activo_unico'),
+        ),
+    ]
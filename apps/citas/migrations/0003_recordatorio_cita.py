@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:53
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0002_consulta_horario_activo_unico'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordatorioCita',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('canal', models.CharField(choices=[('email', 'Email'), ('push', 'Push')], max_length=10)),
+                ('ventana', models.CharField(default='24h', help_text='Anticipación del recordatorio', max_length=10)),
+                ('destino', models.CharField(help_text='Correo o token del dispositivo', max_length=255)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('enviando', 'Enviando'), ('enviado', 'Enviado'), ('fallido', 'Fallido')], default='pendiente', max_length=10)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('proximo_intento', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ultimo_error', models.TextField(blank=True, null=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_envio', models.DateTimeField(blank=True, null=True)),
+                ('consulta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recordatorios', to='citas.consulta')),
+            ],
+            options={
+                'verbose_name': 'Recordatorio de Cita',
+                'verbose_name_plural': 'Recordatorios de Cita',
+                'db_table': 'recordatorio_cita',
+                'indexes': [models.Index(fields=['estado', 'proximo_intento'], name='recordatorio_pendiente_idx')],
+                'constraints': [models.UniqueConstraint(fields=('consulta', 'canal', 'ventana'), name='recordatorio_cita_unico')],
+            },
+        ),
+    ]
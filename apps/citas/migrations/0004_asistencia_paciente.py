@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def cargar_contadores(apps, schema_editor):
+    """Carga inicial de los contadores desde las consultas existentes"""
+    schema_editor.execute(
+        """
+        INSERT INTO asistencia_paciente (codpaciente, noshows, completadas, canceladas, fecha_actualizacion)
+        SELECT codpaciente,
+               count(*) FILTER (WHERE estado = 'no_show'),
+               count(*) FILTER (WHERE estado = 'completada'),
+               count(*) FILTER (WHERE estado = 'cancelada'),
+               now()
+        FROM consulta
+        WHERE estado IN ('no_show', 'completada', 'cancelada')
+        GROUP BY codpaciente
+        """
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0003_recordatorio_cita'),
+        ('usuarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AsistenciaPaciente',
+            fields=[
+                ('paciente', models.OneToOneField(db_column='codpaciente', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='asistencia', serialize=False, to='usuarios.paciente')),
+                ('noshows', models.PositiveIntegerField(default=0)),
+                ('completadas', models.PositiveIntegerField(default=0)),
+                ('canceladas', models.PositiveIntegerField(default=0)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Asistencia de Paciente',
+                'verbose_name_plural': 'Asistencia de Pacientes',
+                'db_table': 'asistencia_paciente',
+            },
+        ),
+        migrations.RunPython(cargar_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0004_asistencia_paciente'),
+        ('profesionales', '0001_initial'),
+        ('usuarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consulta',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['fecha', 'fecha_actualizacion'], name='consulta_fecha_modif_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0005_consulta_fecha_actualizacion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recordatoriocita',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('enviando', 'Enviando'), ('enviado', 'Enviado'), ('fallido', 'Fallido'), ('descartado', 'Descartado')], default='pendiente', max_length=10),
+        ),
+    ]
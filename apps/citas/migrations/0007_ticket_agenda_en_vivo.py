@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0006_recordatorio_descartado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketAgendaEnVivo',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('fecha_expiracion', models.DateTimeField(db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tickets_agenda_en_vivo', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Ticket de Agenda en Vivo',
+                'verbose_name_plural': 'Tickets de Agenda en Vivo',
+                'db_table': 'ticket_agenda_en_vivo',
+            },
+        ),
+    ]
@@ -1,4 +1,6 @@
-﻿from django.db import models
+﻿from django.conf import settings
+from django.db import models
+from django.utils import timezone
 
 
 class Horario(models.Model):
@@ -104,12 +106,196 @@ class Consulta(models.Model):
     tratamiento = models.TextField(null=True, blank=True)
     costo_consulta = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     requiere_pago = models.BooleanField(default=False)
+    fecha_actualizacion = models.DateTimeField(auto_now=True, null=True, blank=True)
 
     class Meta:
         db_table = "consulta"
         verbose_name = "Consulta"
         verbose_name_plural = "Consultas"
         ordering = ["-fecha"]
+        constraints = [
+            # Un odontólogo no puede tener dos consultas activas en el mismo horario
+            # (ver reservas.py; los estados deben coincidir con disponibilidad.ESTADOS_LIBRES)
+            models.UniqueConstraint(
+                fields=["fecha", "idhorario", "cododontologo"],
+                condition=~models.Q(estado__in=["cancelada", "no_asistio", "no_show", "vencida"]),
+                name="consulta_horario_activo_unico",
+            ),
+        ]
+        indexes = [
+            # Marcador de cambios de la agenda (ver agenda.py)
+            models.Index(fields=["fecha", "fecha_actualizacion"], name="consulta_fecha_modif_idx"),
+        ]
 
     def __str__(self):
         return f"Consulta {self.id} - {self.codpaciente} - {self.fecha}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Horario ocupado al cargar, para actualizar la disponibilidad en caché al guardar
+        instancia._horario_ocupado_original = instancia.horario_ocupado()
+        # Paciente y estado al cargar, para detectar transiciones (ver asistencia.py)
+        instancia._asistencia_original = instancia.estado_asistencia()
+        # Campos de la grilla de agenda, para publicar solo cambios reales (ver en_vivo.py)
+        instancia._agenda_original = instancia.estado_agenda()
+        return instancia
+
+    def horario_ocupado(self):
+        """
+        (fecha, idhorario_id, cododontologo_id) si la consulta ocupa su horario,
+        None si no lo ocupa (cancelada, no asistió, vencida) y False si no se
+        puede saber porque hay campos diferidos.
+        """
+        from .disponibilidad import ESTADOS_LIBRES, a_fecha
+
+        datos = self.__dict__
+        if not all(campo in datos for campo in ('fecha', 'idhorario_id', 'cododontologo_id', 'estado')):
+            return False
+        if datos['estado'] in ESTADOS_LIBRES or datos['fecha'] is None:
+            return None
+        return (a_fecha(datos['fecha']), datos['idhorario_id'], datos['cododontologo_id'])
+
+    def estado_asistencia(self):
+        """(codpaciente_id, estado) o False si alguno de los dos está diferido"""
+        datos = self.__dict__
+        if 'codpaciente_id' not in datos or 'estado' not in datos:
+            return False
+        return (datos['codpaciente_id'], datos['estado'])
+
+    def estado_agenda(self):
+        """
+        (estado, fecha, idhorario_id, cododontologo_id, hora_llegada) o False
+        si alguno está diferido
+        """
+        from .disponibilidad import a_fecha
+
+        campos = ('estado', 'fecha', 'idhorario_id', 'cododontologo_id', 'hora_llegada')
+        datos = self.__dict__
+        if not all(campo in datos for campo in campos):
+            return False
+        return (datos['estado'], a_fecha(datos['fecha']), datos['idhorario_id'],
+                datos['cododontologo_id'], datos['hora_llegada'])
+
+
+class AsistenciaPaciente(models.Model):
+    """
+    Contadores de asistencia por paciente (ver asistencia.py).
+    Se actualizan con F() solo cuando una consulta cambia de estado.
+    """
+    paciente = models.OneToOneField(
+        "usuarios.Paciente", on_delete=models.CASCADE, primary_key=True,
+        db_column="codpaciente", related_name="asistencia"
+    )
+    noshows = models.PositiveIntegerField(default=0)
+    completadas = models.PositiveIntegerField(default=0)
+    canceladas = models.PositiveIntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "asistencia_paciente"
+        verbose_name = "Asistencia de Paciente"
+        verbose_name_plural = "Asistencia de Pacientes"
+
+    def __str__(self):
+        return f"Asistencia {self.paciente_id}: {self.noshows} faltas, {self.completadas} completadas"
+
+
+class RecordatorioCita(models.Model):
+    """
+    Bandeja de salida de recordatorios (ver recordatorios.py).
+    Una fila por (consulta, canal, ventana): volver a encolar no duplica envíos.
+    """
+    CANALES = [
+        ("email", "Email"),
+        ("push", "Push"),
+    ]
+
+    ESTADOS = [
+        ("pendiente", "Pendiente"),
+        ("enviando", "Enviando"),
+        ("enviado", "Enviado"),
+        ("fallido", "Fallido"),
+        ("descartado", "Descartado"),
+    ]
+
+    consulta = models.ForeignKey("Consulta", on_delete=models.CASCADE, related_name="recordatorios")
+    canal = models.CharField(max_length=10, choices=CANALES)
+    ventana = models.CharField(max_length=10, default="24h", help_text="Anticipación del recordatorio")
+    destino = models.CharField(max_length=255, help_text="Correo o token del dispositivo")
+    estado = models.CharField(max_length=10, choices=ESTADOS, default="pendiente")
+    intentos = models.PositiveSmallIntegerField(default=0)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    ultimo_error = models.TextField(null=True, blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_envio = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "recordatorio_cita"
+        verbose_name = "Recordatorio de Cita"
+        verbose_name_plural = "Recordatorios de Cita"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["consulta", "canal", "ventana"],
+                name="recordatorio_cita_unico",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["estado", "proximo_intento"], name="recordatorio_pendiente_idx"),
+        ]
+
+    def __str__(self):
+        return f"Recordatorio {self.canal} - Consulta {self.consulta_id} - {self.estado}"
+
+
+class TicketAgendaEnVivo(models.Model):
+    """
+    Ticket de un solo uso para abrir la agenda en vivo (SSE).
+
+    EventSource no envía headers: en lugar del token de sesión en la URL (que
+    queda en los logs de acceso, de proxies y en el historial) el cliente pide
+    un ticket con POST autenticado y lo pasa como ?ticket=. Vence a los
+    AGENDA_EN_VIVO_TICKET_TTL segundos y se borra al usarse.
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="tickets_agenda_en_vivo"
+    )
+    fecha_expiracion = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = "ticket_agenda_en_vivo"
+        verbose_name = "Ticket de Agenda en Vivo"
+        verbose_name_plural = "Tickets de Agenda en Vivo"
+
+    def __str__(self):
+        return f"Ticket de {self.user} (expira {self.fecha_expiracion})"
+
+    @classmethod
+    def emitir(cls, user):
+        """Crea un ticket para el usuario (y descarta los vencidos)"""
+        import secrets
+        from datetime import timedelta
+
+        ahora = timezone.now()
+        cls.objects.filter(fecha_expiracion__lte=ahora).delete()
+        return cls.objects.create(
+            key=secrets.token_urlsafe(32),
+            user=user,
+            fecha_expiracion=ahora + timedelta(seconds=getattr(settings, "AGENDA_EN_VIVO_TICKET_TTL", 30)),
+        )
+
+    @classmethod
+    def canjear(cls, key):
+        """
+        Usa el ticket: devuelve su User si está vigente, None si no.
+        El DELETE decide: si dos conexiones usan el mismo ticket solo una lo borra.
+        """
+        ticket = cls.objects.select_related("user").filter(
+            key=key, fecha_expiracion__gt=timezone.now()
+        ).first()
+        if ticket is None or cls.objects.filter(key=key).delete()[0] == 0:
+            return None
+        return ticket.user
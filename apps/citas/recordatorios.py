@@ -0,0 +1,305 @@
+"""
+Pipeline de recordatorios de citas (CU17).
+
+1. encolar(): crea las filas de RecordatorioCita de las consultas de una fecha
+   (bulk_create con ignore_conflicts; la restricción única por
+   (consulta, canal, ventana) hace que reencolar no duplique envíos). Respeta
+   Usuario.recibir_notificaciones / notificaciones_email / notificaciones_push.
+2. despachar(): toma lotes de recordatorios pendientes (SKIP LOCKED, con una
+   concesión para recuperar lotes de un worker caído), arma los mensajes de
+   todo el lote con una consulta y los envía con un pool de hilos acotado por
+   canal. Cada hilo de email reutiliza UNA conexión SMTP para su sub-lote.
+   Los recordatorios de consultas que ya no ocupan su horario (canceladas,
+   no asistió, vencidas: ESTADOS_LIBRES) se marcan 'descartado' sin enviar.
+3. Los fallos se reintentan con backoff exponencial desde
+   NOTIFICATION_RETRY_DELAY segundos hasta MAX_NOTIFICATION_RETRIES intentos.
+
+Todo trabaja sobre el schema actual; las tareas lo recorren en cada clínica.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+ESTADOS_A_RECORDAR = ['confirmada', 'pendiente']
+
+
+def _configuracion(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+# ============================================================================
+# ENCOLADO
+# ============================================================================
+
+def encolar(fecha, ventana='24h'):
+    """
+    Encola los recordatorios de las consultas de una fecha.
+
+    Returns:
+        Cantidad de recordatorios nuevos
+    """
+    from .models import Consulta, RecordatorioCita
+
+    consultas = Consulta.objects.filter(
+        fecha=fecha,
+        estado__in=ESTADOS_A_RECORDAR,
+        codpaciente__codusuario__recibir_notificaciones=True,
+    ).values_list(
+        'id',
+        'codpaciente__codusuario__correoelectronico',
+        'codpaciente__codusuario__notificaciones_email',
+        'codpaciente__codusuario__notificaciones_push',
+    ).order_by()
+
+    nuevos = []
+    for consulta_id, correo, acepta_email, acepta_push in consultas.iterator(chunk_size=1000):
+        if acepta_email and correo:
+            nuevos.append(RecordatorioCita(consulta_id=consulta_id, canal='email', ventana=ventana, destino=correo))
+        # Push: el Usuario aún no guarda token de dispositivo (ver enviar_notificacion_push)
+
+    if not nuevos:
+        return 0
+
+    antes = RecordatorioCita.objects.filter(ventana=ventana, consulta__fecha=fecha).count()
+    RecordatorioCita.objects.bulk_create(nuevos, batch_size=1000, ignore_conflicts=True)
+    return RecordatorioCita.objects.filter(ventana=ventana, consulta__fecha=fecha).count() - antes
+
+
+# ============================================================================
+# RENDERIZADO
+# ============================================================================
+
+def _datos_por_consulta(consulta_ids):
+    """
+    Datos de plantilla de varias consultas en una sola consulta SQL.
+    Omite las consultas en ESTADOS_LIBRES (ya no hay cita que recordar).
+    """
+    from .disponibilidad import ESTADOS_LIBRES
+    from .models import Consulta
+
+    filas = Consulta.objects.filter(id__in=consulta_ids).exclude(estado__in=ESTADOS_LIBRES).values(
+        'id', 'fecha', 'hora_consulta', 'motivo_consulta', 'idhorario__hora',
+        'codpaciente__codusuario__nombre', 'codpaciente__codusuario__apellido',
+        'cododontologo__codusuario__nombre', 'cododontologo__codusuario__apellido',
+    )
+
+    datos = {}
+    for fila in filas:
+        hora = fila['hora_consulta'] or fila['idhorario__hora']
+        odontologo = 'Por asignar'
+        if fila['cododontologo__codusuario__nombre']:
+            odontologo = (
+                f"Dr(a). {fila['cododontologo__codusuario__nombre']} "
+                f"{fila['cododontologo__codusuario__apellido']}"
+            )
+        datos[fila['id']] = {
+            'paciente_nombre': f"{fila['codpaciente__codusuario__nombre']} {fila['codpaciente__codusuario__apellido']}",
+            'fecha': fila['fecha'].strftime('%d/%m/%Y'),
+            'hora': hora.strftime('%H:%M') if hora else 'Por confirmar',
+            'odontologo': odontologo,
+            'motivo': fila['motivo_consulta'] or 'Consulta general',
+            'consulta_id': fila['id'],
+        }
+    return datos
+
+
+# ============================================================================
+# ENVÍO POR CANAL
+# ============================================================================
+
+def _enviar_emails(lote):
+    """
+    Envía un sub-lote de emails con una sola conexión SMTP.
+
+    Args:
+        lote: Lista de (recordatorio_id, destino, datos)
+
+    Returns:
+        dict {recordatorio_id: None si se envió o el mensaje de error}
+    """
+    from django.core.mail import EmailMultiAlternatives, get_connection
+    from .tasks import contenido_email_recordatorio
+
+    resultados = {}
+    try:
+        with get_connection(fail_silently=False) as conexion:
+            for recordatorio_id, destino, datos in lote:
+                asunto, texto, html = contenido_email_recordatorio(datos)
+                mensaje = EmailMultiAlternatives(
+                    asunto, texto, settings.DEFAULT_FROM_EMAIL, [destino], connection=conexion
+                )
+                mensaje.attach_alternative(html, 'text/html')
+                try:
+                    conexion.send_messages([mensaje])
+                    resultados[recordatorio_id] = None
+                except Exception as e:
+                    resultados[recordatorio_id] = str(e) or e.__class__.__name__
+    except Exception as e:
+        # No se pudo abrir (o cerrar) la conexión: todo lo no enviado falla
+        for recordatorio_id, _, _ in lote:
+            resultados.setdefault(recordatorio_id, str(e) or e.__class__.__name__)
+    return resultados
+
+
+def _enviar_push(lote):
+    """Envía un sub-lote de notificaciones push (stub de FCM)"""
+    from .tasks import enviar_notificacion_push
+
+    resultados = {}
+    for recordatorio_id, destino, datos in lote:
+        try:
+            enviar_notificacion_push(destino, datos)
+            resultados[recordatorio_id] = None
+        except Exception as e:
+            resultados[recordatorio_id] = str(e) or e.__class__.__name__
+    return resultados
+
+
+CANALES = {
+    'email': (_enviar_emails, 'RECORDATORIOS_HILOS_EMAIL', 4),
+    'push': (_enviar_push, 'RECORDATORIOS_HILOS_PUSH', 8),
+}
+
+
+def _enviar_canal(canal, items):
+    """Reparte los items de un canal en sub-lotes sobre un pool de hilos acotado"""
+    funcion, ajuste_hilos, hilos_defecto = CANALES[canal]
+    tamano = _configuracion('RECORDATORIOS_LOTE_CONEXION', 50)
+    sublotes = [items[i:i + tamano] for i in range(0, len(items), tamano)]
+
+    resultados = {}
+    hilos = min(_configuracion(ajuste_hilos, hilos_defecto), len(sublotes))
+    with ThreadPoolExecutor(max_workers=max(hilos, 1)) as pool:
+        for parcial in pool.map(funcion, sublotes):
+            resultados.update(parcial)
+    return resultados
+
+
+# ============================================================================
+# DESPACHO
+# ============================================================================
+
+def _reclamar_lote(tamano):
+    """Marca un lote de pendientes como 'enviando' con una concesión de tiempo"""
+    from .models import RecordatorioCita
+
+    ahora = timezone.now()
+    concesion = timedelta(seconds=_configuracion('RECORDATORIOS_CONCESION', 600))
+
+    with transaction.atomic():
+        # 'enviando' vencido = un worker se cayó a mitad del lote
+        recordatorios = list(
+            RecordatorioCita.objects
+            .filter(estado__in=['pendiente', 'enviando'], proximo_intento__lte=ahora)
+            .select_for_update(skip_locked=True)
+            .order_by('proximo_intento')
+            .values_list('id', 'consulta_id', 'canal', 'destino')[:tamano]
+        )
+        if recordatorios:
+            RecordatorioCita.objects.filter(id__in=[r[0] for r in recordatorios]).update(
+                estado='enviando',
+                proximo_intento=ahora + concesion,
+                intentos=F('intentos') + 1,
+            )
+    return recordatorios
+
+
+def _registrar_resultados(resultados):
+    """Guarda envíos exitosos y programa reintentos con backoff"""
+    from .models import RecordatorioCita
+
+    ahora = timezone.now()
+    enviados = [rid for rid, error in resultados.items() if error is None]
+    if enviados:
+        RecordatorioCita.objects.filter(id__in=enviados).update(
+            estado='enviado', fecha_envio=ahora, ultimo_error=None
+        )
+
+    fallidos = {rid: error for rid, error in resultados.items() if error is not None}
+    if not fallidos:
+        return len(enviados), 0, 0
+
+    maximo = _configuracion('MAX_NOTIFICATION_RETRIES', 3)
+    demora = _configuracion('NOTIFICATION_RETRY_DELAY', 30)
+    definitivos = reintentos = 0
+
+    intentos = dict(RecordatorioCita.objects.filter(id__in=fallidos).values_list('id', 'intentos'))
+    for rid, error in fallidos.items():
+        numero = intentos.get(rid, maximo)
+        if numero >= maximo:
+            cambios = {'estado': 'fallido'}
+            definitivos += 1
+        else:
+            cambios = {
+                'estado': 'pendiente',
+                'proximo_intento': ahora + timedelta(seconds=demora * 2 ** (numero - 1)),
+            }
+            reintentos += 1
+        RecordatorioCita.objects.filter(id=rid).update(ultimo_error=error[:1000], **cambios)
+
+    return len(enviados), reintentos, definitivos
+
+
+def despachar(tamano_lote=500):
+    """
+    Envía los recordatorios pendientes del schema actual.
+
+    Returns:
+        dict con enviados, reintentos programados y fallidos definitivos
+    """
+    from .models import RecordatorioCita
+
+    totales = {'enviados': 0, 'reintentos': 0, 'fallidos': 0, 'descartados': 0}
+
+    while True:
+        recordatorios = _reclamar_lote(tamano_lote)
+        if not recordatorios:
+            break
+
+        datos = _datos_por_consulta({r[1] for r in recordatorios})
+        por_canal = {}
+        resultados = {}
+        descartados = []
+        for recordatorio_id, consulta_id, canal, destino in recordatorios:
+            if consulta_id not in datos:
+                # Cancelada, no asistió o vencida desde que se encoló
+                descartados.append(recordatorio_id)
+                continue
+            if canal not in CANALES:
+                resultados[recordatorio_id] = 'Canal no disponible'
+                continue
+            por_canal.setdefault(canal, []).append((recordatorio_id, destino, datos[consulta_id]))
+
+        if descartados:
+            RecordatorioCita.objects.filter(id__in=descartados).update(estado='descartado')
+            totales['descartados'] += len(descartados)
+
+        # Los canales se envían en paralelo entre sí
+        with ThreadPoolExecutor(max_workers=max(len(por_canal), 1)) as pool:
+            futuros = [pool.submit(_enviar_canal, canal, items) for canal, items in por_canal.items()]
+            for futuro in futuros:
+                resultados.update(futuro.result())
+
+        enviados, reintentos, fallidos = _registrar_resultados(resultados)
+        totales['enviados'] += enviados
+        totales['reintentos'] += reintentos
+        totales['fallidos'] += fallidos
+
+        if len(recordatorios) < tamano_lote:
+            break
+
+    return totales
+
+
+def procesar_fecha(fecha, ventana='24h'):
+    """Encola y despacha los recordatorios de una fecha en el schema actual"""
+    encolados = encolar(fecha, ventana)
+    return dict(despachar(), encolados=encolados)
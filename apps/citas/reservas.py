@@ -0,0 +1,104 @@
+"""
+Reserva de horarios sin doble agendamiento.
+
+Toda escritura que ocupa un horario (crear consulta, reprogramar, chatbot)
+pasa por reservar_horario():
+
+1. Toma un advisory lock de PostgreSQL de la transacción para el horario con
+   pg_try_advisory_xact_lock (no espera: si otro proceso está reservando el
+   mismo horario se responde 409 de inmediato, sin acumular reintentos).
+   - Con odontólogo: lock exclusivo de (fecha, horario, odontólogo) y
+     compartido de (fecha, horario) de la clínica.
+   - Sin odontólogo (chatbot, solicitudes web): lock exclusivo de
+     (fecha, horario) de la clínica.
+2. Con el lock tomado verifica que no exista otra consulta activa.
+3. La restricción única parcial consulta_horario_activo_unico es la última
+   barrera: un IntegrityError sobre ella también se convierte en HorarioOcupado.
+
+El lock se libera solo al terminar la transacción.
+"""
+import hashlib
+from contextlib import contextmanager
+
+from django.db import IntegrityError, connection, transaction
+
+from .disponibilidad import ESTADOS_LIBRES, a_fecha
+
+
+RESTRICCION_UNICA = 'consulta_horario_activo_unico'
+
+
+class HorarioOcupado(Exception):
+    """El horario ya está ocupado o lo está reservando otra petición"""
+
+    def __init__(self, mensaje='El horario seleccionado ya está ocupado'):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+
+
+def _clave(fecha, horario_id, odontologo_id=None):
+    """Clave bigint del advisory lock (los locks son de toda la BD: incluye el schema)"""
+    texto = f"{connection.schema_name}:{fecha.isoformat()}:{horario_id}:{odontologo_id or 0}"
+    return int.from_bytes(hashlib.blake2b(texto.encode(), digest_size=8).digest(), 'big', signed=True)
+
+
+def _tomar_lock(clave, compartido=False):
+    funcion = 'pg_try_advisory_xact_lock_shared' if compartido else 'pg_try_advisory_xact_lock'
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {funcion}(%s)", [clave])
+        return cursor.fetchone()[0]
+
+
+def _ocupado(fecha, horario_id, odontologo_id, excluir_id):
+    from .models import Consulta
+
+    consultas = Consulta.objects.filter(
+        fecha=fecha, idhorario_id=horario_id
+    ).exclude(estado__in=ESTADOS_LIBRES)
+    if odontologo_id is not None:
+        consultas = consultas.filter(cododontologo_id=odontologo_id)
+    if excluir_id is not None:
+        consultas = consultas.exclude(id=excluir_id)
+    return consultas.exists()
+
+
+@contextmanager
+def reservar_horario(fecha, horario_id, odontologo_id=None, excluir_id=None):
+    """
+    Reserva un horario durante una transacción. El bloque debe guardar la
+    consulta; si otro proceso ocupa el horario se lanza HorarioOcupado.
+
+    Uso:
+        with reservar_horario(fecha, horario.id, odontologo_id):
+            Consulta.objects.create(...)
+
+    Args:
+        fecha: date o 'YYYY-MM-DD'
+        horario_id: ID del Horario
+        odontologo_id: Odontólogo (codusuario) o None para la clínica
+        excluir_id: Consulta a ignorar (la que se reprograma)
+    """
+    fecha = a_fecha(fecha)
+    horario_id = int(horario_id)
+
+    try:
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                if odontologo_id is not None:
+                    obtenido = (
+                        _tomar_lock(_clave(fecha, horario_id), compartido=True)
+                        and _tomar_lock(_clave(fecha, horario_id, odontologo_id))
+                    )
+                else:
+                    obtenido = _tomar_lock(_clave(fecha, horario_id))
+                if not obtenido:
+                    raise HorarioOcupado('El horario se está reservando en este momento, intente con otro')
+
+            if _ocupado(fecha, horario_id, odontologo_id, excluir_id):
+                raise HorarioOcupado()
+
+            yield
+    except IntegrityError as e:
+        if RESTRICCION_UNICA in str(e):
+            raise HorarioOcupado()
+        raise
@@ -3,6 +3,9 @@ Serializers para la app de citas.
 """
 from rest_framework import serializers
 from .models import Horario, Estadodeconsulta, Tipodeconsulta, Consulta
+from apps.comun import catalogos
+from . import disponibilidad
+from .reservas import reservar_horario, HorarioOcupado
 
 
 class HorarioSerializer(serializers.ModelSerializer):
@@ -211,10 +214,10 @@ class ConsultaCrearSerializer(serializers.ModelSerializer):
         
         # SIEMPRE establecer estado de consulta correcto (ID fijo 1 = Pendiente)
         try:
-            estado_pendiente = Estadodeconsulta.objects.get(id=1)  # ID fijo del seed
+            estado_pendiente = catalogos.estado_consulta_por_id(1)  # ID fijo del seed
         except Estadodeconsulta.DoesNotExist:
             # Fallback: buscar por nombre
-            estado_pendiente = Estadodeconsulta.objects.get(estado='Pendiente')
+            estado_pendiente = catalogos.estado_consulta('Pendiente')
         validated_data['idestadoconsulta'] = estado_pendiente
         
         # Si es agendamiento paciente (sin fecha directa)
@@ -222,12 +225,35 @@ class ConsultaCrearSerializer(serializers.ModelSerializer):
             validated_data['fecha'] = fecha_preferida
             validated_data['horario_preferido'] = horario_preferido or 'cualquiera'
             
-            # Asignar primer horario disponible temporalmente
+            # Asignar temporalmente el primer horario libre de esa fecha
             if 'idhorario' not in validated_data:
-                horario = Horario.objects.first()
-                validated_data['idhorario'] = horario
+                return self._crear_en_horario_libre(validated_data)
         
-        return super().create(validated_data)
+        odontologo = validated_data.get('cododontologo')
+        with reservar_horario(
+            validated_data['fecha'],
+            validated_data['idhorario'].id,
+            odontologo.pk if odontologo else None
+        ):
+            return super().create(validated_data)
+    
+    def _crear_en_horario_libre(self, validated_data, intentos=3):
+        """
+        Solicitud web sin horario: reserva el primer horario libre. Si otro
+        proceso lo toma primero se prueba con el siguiente (máx. `intentos`).
+        """
+        odontologo = validated_data.get('cododontologo')
+        odontologo_id = odontologo.pk if odontologo else None
+        libres = disponibilidad.horarios_libres(validated_data['fecha'], odontologo_id)
+        
+        for horario in libres[:intentos]:
+            try:
+                with reservar_horario(validated_data['fecha'], horario.id, odontologo_id):
+                    return super().create(dict(validated_data, idhorario=horario))
+            except HorarioOcupado:
+                continue
+        
+        raise HorarioOcupado('No hay horarios disponibles para la fecha solicitada')
 
 
 class ConsultaActualizarEstadoSerializer(serializers.ModelSerializer):
@@ -1,51 +1,89 @@
 """
 Signals para el módulo de citas.
-CU18: No-Show Automation
+CU18: No-Show Automation (contadores de asistencia, ver asistencia.py)
+Disponibilidad: cambios de horario ocupado (ver disponibilidad.py)
+Agenda en vivo: eventos para las conexiones SSE (ver en_vivo.py)
 """
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal
 from django.dispatch import receiver
-from django.utils import timezone
 from .models import Consulta
+from . import asistencia, disponibilidad, en_vivo
+
+
+# Enviada por tasks.vencer_citas_pendientes después de cada lote marcado como
+# vencido (UPDATE masivo, sin post_save). Argumentos: ids, schema_name.
+citas_vencidas = Signal()
 
 
 @receiver(post_save, sender=Consulta)
 def bloquear_paciente_por_noshows(sender, instance, created, **kwargs):
     """
-    Signal que bloquea automáticamente a un paciente cuando acumula
-    3 o más faltas (no-show).
+    Actualiza los contadores de asistencia del paciente cuando la consulta
+    cambia de estado y lo bloquea automáticamente cuando acumula 3 o más
+    faltas (no-show).
     
     CU18: Automatización de No-Show
     """
-    # Solo ejecutar si la consulta fue marcada como no_show
-    if instance.estado == 'no_show':
-        paciente = instance.codpaciente
-        usuario = paciente.codusuario
-        
-        # Contar total de no-shows del paciente
-        total_noshows = Consulta.objects.filter(
-            codpaciente=paciente,
-            estado='no_show'
-        ).count()
-        
-        # Si tiene 3 o más faltas, bloquear
-        if total_noshows >= 3:
-            from apps.autenticacion.models import BloqueoUsuario
-            
-            # Verificar si ya está bloqueado
-            bloqueo_existente = BloqueoUsuario.objects.filter(
-                usuario=usuario,
-                activo=True
-            ).first()
-            
-            if not bloqueo_existente:
-                # Crear bloqueo automático
-                BloqueoUsuario.objects.create(
-                    usuario=usuario,
-                    motivo=f'Bloqueo automático por {total_noshows} faltas consecutivas (no-show)',
-                    fecha_bloqueo=timezone.now(),
-                    bloqueado_por=None,  # Bloqueado automáticamente por el sistema
-                    activo=True
-                )
-                
-                # TODO: Opcional - Enviar notificación al paciente
-                # Ejemplo: enviar_email_bloqueo(usuario.email, total_noshows)
+    anterior = None if created else getattr(instance, '_asistencia_original', False)
+    actual = instance.estado_asistencia()
+    
+    if anterior is False or actual is False:
+        # Estado diferido: no se puede saber si hubo transición (reconciliar_asistencia lo corrige)
+        return
+    
+    if asistencia.registrar_transicion(anterior, actual) and not getattr(instance, '_omitir_bloqueo', False):
+        # marcar_noshow bloquea por su cuenta con el usuario que marcó la falta
+        total_noshows = asistencia.conteos(actual[0])['noshows']
+        asistencia.bloquear_si_corresponde(actual[0], total_noshows)
+        # TODO: Opcional - Enviar notificación al paciente
+        # Ejemplo: enviar_email_bloqueo(usuario.email, total_noshows)
+    
+    instance._asistencia_original = actual
+
+
+@receiver(post_save, sender=Consulta)
+def actualizar_disponibilidad(sender, instance, created, **kwargs):
+    """
+    Publica el cambio de horario ocupado (crear, reprogramar, cancelar) para
+    que los workers actualicen su mapa de disponibilidad.
+    """
+    anterior = None if created else getattr(instance, '_horario_ocupado_original', False)
+    actual = instance.horario_ocupado()
+
+    if anterior is False or actual is False:
+        # Sin el estado original no se puede calcular el cambio
+        disponibilidad.invalidar()
+    else:
+        disponibilidad.publicar_cambio(anterior, actual)
+
+    instance._horario_ocupado_original = actual
+
+
+@receiver(post_save, sender=Consulta)
+def publicar_agenda_en_vivo(sender, instance, created, **kwargs):
+    """Publica el diff de la consulta para las agendas en vivo"""
+    en_vivo.publicar_cambio(instance, creada=created)
+    instance._agenda_original = instance.estado_agenda()
+
+
+@receiver(citas_vencidas)
+def resincronizar_agenda_vencidas(sender, ids, schema_name, **kwargs):
+    """Las citas vencidas se marcan con un UPDATE masivo: las agendas recargan"""
+    en_vivo.publicar_resync()
+
+
+@receiver(post_delete, sender=Consulta)
+def liberar_disponibilidad(sender, instance, **kwargs):
+    """Libera el horario de una consulta eliminada y descuenta su estado"""
+    anterior_asistencia = getattr(instance, '_asistencia_original', instance.estado_asistencia())
+    if anterior_asistencia:
+        asistencia.registrar_transicion(anterior_asistencia, None)
+
+    anterior = getattr(instance, '_horario_ocupado_original', instance.horario_ocupado())
+    if anterior is False:
+        disponibilidad.invalidar()
+    else:
+        disponibilidad.publicar_cambio(anterior, None)
+
+    en_vivo.publicar_cambio(instance, eliminada=True)
@@ -5,7 +5,6 @@ CU17: Recordatorios automáticos
 from celery import shared_task
 from django.utils import timezone
 from datetime import timedelta, datetime
-from django.db.models import Q
 
 
 @shared_task(name='apps.citas.tasks.enviar_recordatorios_24h')
@@ -14,112 +13,150 @@ def enviar_recordatorios_24h():
     Envía recordatorios de citas programadas para dentro de 24 horas.
     CU17: Recordatorios automáticos
     
-    Se ejecuta diariamente a las 9:00 AM.
+    Se ejecuta diariamente a las 9:00 AM en todas las clínicas activas.
+    Los recordatorios pasan por la bandeja de salida RecordatorioCita
+    (ver recordatorios.py): no se duplican si la tarea se repite y los
+    fallos se reintentan con despachar_recordatorios.
     """
-    from .models import Consulta, Estadodeconsulta
+    from django.conf import settings
+    from apps.comun.tenants import ejecutar_en_clinicas
+    from .recordatorios import procesar_fecha
     
-    # Calcular fecha de mañana
     ahora = timezone.now()
-    manana = ahora + timedelta(days=1)
-    
-    # Obtener consultas confirmadas para mañana
-    consultas = Consulta.objects.filter(
-        fecha=manana.date(),
-        estado__in=['confirmada', 'pendiente']
-    ).select_related(
-        'codpaciente__codusuario',
-        'cododontologo__codusuario',
-        'idhorario'
-    )
-    
-    total_enviados = 0
-    errores = []
+    manana = timezone.localdate() + timedelta(days=1)
     
-    for consulta in consultas:
-        try:
-            paciente = consulta.codpaciente
-            usuario = paciente.codusuario
-            
-            # Preparar datos del recordatorio
-            datos_recordatorio = {
-                'paciente_nombre': f"{usuario.nombre} {usuario.apellido}",
-                'fecha': consulta.fecha.strftime('%d/%m/%Y'),
-                'hora': consulta.hora_consulta.strftime('%H:%M') if consulta.hora_consulta else 'Por confirmar',
-                'odontologo': f"Dr(a). {consulta.cododontologo.codusuario.nombre} {consulta.cododontologo.codusuario.apellido}" if consulta.cododontologo else 'Por asignar',
-                'motivo': consulta.motivo_consulta or 'Consulta general',
-                'consulta_id': consulta.id
-            }
-            
-            # 1. Enviar notificación push (si el usuario tiene FCM token)
-            if hasattr(usuario, 'fcm_token') and usuario.fcm_token:
-                enviar_notificacion_push(usuario.fcm_token, datos_recordatorio)
-            
-            # 2. Enviar email
-            if usuario.correoelectronico:
-                enviar_email_recordatorio(usuario.correoelectronico, datos_recordatorio)
-            
-            # 3. TODO: Enviar SMS (opcional)
-            # if usuario.telefono:
-            #     enviar_sms_recordatorio(usuario.telefono, datos_recordatorio)
-            
-            total_enviados += 1
-            
-        except Exception as e:
-            error_msg = f"Error al enviar recordatorio para consulta {consulta.id}: {str(e)}"
-            errores.append(error_msg)
-            print(error_msg)
+    por_clinica = ejecutar_en_clinicas(
+        procesar_fecha,
+        manana,
+        paralelismo=getattr(settings, 'TENANT_TASK_PARALLELISM', 4)
+    )
     
-    # Registrar en auditoría
     resultado = {
         'fecha_ejecucion': ahora.isoformat(),
-        'consultas_procesadas': consultas.count(),
-        'recordatorios_enviados': total_enviados,
-        'errores': len(errores),
-        'detalles_errores': errores
+        'fecha_citas': manana.isoformat(),
+        'recordatorios_encolados': 0,
+        'recordatorios_enviados': 0,
+        'reintentos_programados': 0,
+        'errores': 0,
+        'por_clinica': por_clinica,
     }
+    for schema_name, parcial in por_clinica.items():
+        if 'error' in parcial:
+            resultado['errores'] += 1
+            print(f"❌ Error al enviar recordatorios en {schema_name}: {parcial['error']}")
+            continue
+        resultado['recordatorios_encolados'] += parcial['encolados']
+        resultado['recordatorios_enviados'] += parcial['enviados']
+        resultado['reintentos_programados'] += parcial['reintentos']
+        resultado['errores'] += parcial['fallidos']
     
-    print(f"✅ Recordatorios enviados: {total_enviados}/{consultas.count()}")
+    print(f"✅ Recordatorios enviados: {resultado['recordatorios_enviados']}/{resultado['recordatorios_encolados']}")
     
     return resultado
 
 
+@shared_task(name='apps.citas.tasks.despachar_recordatorios')
+def despachar_recordatorios():
+    """
+    Reintenta los recordatorios pendientes (backoff de NOTIFICATION_RETRY_DELAY)
+    y recupera lotes de workers caídos. Se ejecuta cada 10 minutos.
+    """
+    from django.conf import settings
+    from apps.comun.tenants import ejecutar_en_clinicas
+    from .recordatorios import despachar
+    
+    por_clinica = ejecutar_en_clinicas(
+        despachar,
+        paralelismo=getattr(settings, 'TENANT_TASK_PARALLELISM', 4)
+    )
+    
+    return {
+        'fecha_ejecucion': timezone.now().isoformat(),
+        'recordatorios_enviados': sum(r.get('enviados', 0) for r in por_clinica.values()),
+        'por_clinica': por_clinica,
+    }
+
+
+def vencer_citas_pendientes(hoy, tamano_lote=500):
+    """
+    Marca como vencidas las citas pendientes anteriores a `hoy` en el schema
+    actual con UPDATE por lotes (sin save() ni signals por fila).
+    
+    Cada lote bloquea sus filas con SKIP LOCKED, así una cita que se está
+    confirmando en ese momento no se pisa. Después de cada lote se envía la
+    signal citas_vencidas con los IDs para efectos secundarios por fila.
+    
+    Returns:
+        dict con la cantidad de citas marcadas
+    """
+    from django.db import connection, transaction
+    from .models import Consulta
+    from .signals import citas_vencidas
+    from . import disponibilidad
+    from apps.comun import catalogos
+    
+    estado_vencido = catalogos.estado_consulta('vencida', crear=True)
+    pendientes = Consulta.objects.filter(fecha__lt=hoy, estado='pendiente').order_by()
+    
+    total_marcadas = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                pendientes.select_for_update(skip_locked=True)
+                .values_list('id', flat=True)[:tamano_lote]
+            )
+            if not ids:
+                break
+            Consulta.objects.filter(id__in=ids).update(
+                estado='vencida',
+                idestadoconsulta=estado_vencido,
+                fecha_actualizacion=timezone.now()  # update() no aplica auto_now
+            )
+            citas_vencidas.send(sender=Consulta, ids=ids, schema_name=connection.schema_name)
+        total_marcadas += len(ids)
+    
+    if total_marcadas:
+        # El UPDATE no dispara signals: descartar la disponibilidad cacheada
+        disponibilidad.invalidar()
+    
+    return {'citas_marcadas': total_marcadas}
+
+
 @shared_task(name='apps.citas.tasks.marcar_citas_vencidas')
-def marcar_citas_vencidas():
+def marcar_citas_vencidas(tamano_lote=500):
     """
     Marca automáticamente como vencidas las citas que no fueron confirmadas
-    y cuya fecha ya pasó.
+    y cuya fecha ya pasó, en todas las clínicas activas.
     
-    Se ejecuta diariamente a las 12:30 AM.
+    Se ejecuta diariamente a las 12:30 AM. Las clínicas se procesan en
+    paralelo (TENANT_TASK_PARALLELISM) y el reporte incluye el conteo por
+    clínica.
     """
-    from .models import Consulta, Estadodeconsulta
+    from django.conf import settings
+    from apps.comun.tenants import ejecutar_en_clinicas
     
     ahora = timezone.now()
-    ayer = ahora - timedelta(days=1)
     
-    # Obtener estado vencido
-    try:
-        estado_vencido = Estadodeconsulta.objects.get(estado__iexact='vencida')
-    except Estadodeconsulta.DoesNotExist:
-        estado_vencido = Estadodeconsulta.objects.create(estado='vencida')
-    
-    # Buscar citas pendientes cuya fecha ya pasó
-    citas_vencidas = Consulta.objects.filter(
-        fecha__lt=ahora.date(),
-        estado='pendiente'
+    por_clinica = ejecutar_en_clinicas(
+        vencer_citas_pendientes,
+        timezone.localdate(),
+        tamano_lote,
+        paralelismo=getattr(settings, 'TENANT_TASK_PARALLELISM', 4)
     )
     
     total_marcadas = 0
-    for cita in citas_vencidas:
-        cita.estado = 'vencida'
-        cita.idestadoconsulta = estado_vencido
-        cita.save()
-        total_marcadas += 1
+    for schema_name, resultado in por_clinica.items():
+        if 'error' in resultado:
+            print(f"❌ Error al marcar citas vencidas en {schema_name}: {resultado['error']}")
+            continue
+        total_marcadas += resultado['citas_marcadas']
     
-    print(f"✅ Citas marcadas como vencidas: {total_marcadas}")
+    print(f"✅ Citas marcadas como vencidas: {total_marcadas} en {len(por_clinica)} clínicas")
     
     return {
         'fecha_ejecucion': ahora.isoformat(),
-        'citas_marcadas': total_marcadas
+        'citas_marcadas': total_marcadas,
+        'por_clinica': por_clinica,
     }
 
 
@@ -154,14 +191,13 @@ def enviar_notificacion_push(fcm_token, datos):
     return True
 
 
-def enviar_email_recordatorio(email, datos):
-    """
-    Envía email de recordatorio al paciente.
+def contenido_email_recordatorio(datos):
     """
-    from django.core.mail import send_mail
-    from django.template.loader import render_to_string
-    from django.conf import settings
+    Arma el email de recordatorio.
     
+    Returns:
+        (asunto, texto, html)
+    """
     asunto = f"🦷 Recordatorio: Cita el {datos['fecha']}"
     
     # TODO: Crear template HTML profesional
@@ -223,6 +259,19 @@ def enviar_email_recordatorio(email, datos):
     Clínica Dental
     """
     
+    return asunto, mensaje_texto, mensaje_html
+
+
+def enviar_email_recordatorio(email, datos):
+    """
+    Envía un email de recordatorio al paciente (envío individual).
+    Los recordatorios masivos usan recordatorios.despachar().
+    """
+    from django.core.mail import send_mail
+    from django.conf import settings
+    
+    asunto, mensaje_texto, mensaje_html = contenido_email_recordatorio(datos)
+    
     try:
         send_mail(
             subject=asunto,
@@ -236,6 +285,4 @@ def enviar_email_recordatorio(email, datos):
         return True
     except Exception as e:
         print(f"❌ Error al enviar email a {email}: {str(e)}")
-        # En desarrollo, simular envío exitoso
-        print(f"📧 [SIMULADO] Email enviado a {email}")
-        return True
+        return False
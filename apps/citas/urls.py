@@ -14,6 +14,9 @@ router.register(r'consultas', views.ConsultaViewSet, basename='consulta')
 router.register(r'', views.ConsultaViewSet, basename='cita')
 
 urlpatterns = [
+    # Antes del router: la ruta raíz de consultas tomaría 'en-vivo' como pk
+    path('en-vivo/', views.agenda_en_vivo, name='agenda-en-vivo'),
+    path('en-vivo/ticket/', views.ticket_agenda_en_vivo, name='agenda-en-vivo-ticket'),
     path('', include(router.urls)),
     # Alias para compatibilidad con frontend (horarios-disponibles en vez de horarios/disponibles/)
     path('horarios-disponibles/', views.HorarioViewSet.as_view({'get': 'disponibles'}), name='horarios-disponibles'),
@@ -2,12 +2,14 @@
 Views para la app de citas.
 """
 from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from datetime import datetime, timedelta
+from django.conf import settings
+from django.utils.dateparse import parse_date
 
 from .models import Horario, Estadodeconsulta, Tipodeconsulta, Consulta
 from .serializers import (
@@ -21,6 +23,45 @@ from .serializers import (
     ConsultaDiagnosticoSerializer
 )
 from apps.comun.permisos import EsStaff, EsOdontologo, EsPaciente, EsPropietarioOStaff
+from apps.comun import catalogos
+from . import disponibilidad
+from .reservas import reservar_horario, HorarioOcupado
+from apps.comun.principal import obtener_principal
+
+
+def _fecha(valor):
+    """parse_date que devuelve None también para fechas imposibles (2025-02-30)"""
+    try:
+        return parse_date(str(valor or ''))
+    except ValueError:
+        return None
+
+
+def _guardar_con_reserva(serializer):
+    """
+    Guarda un serializer de Consulta pasando por reservar_horario si el
+    resultado ocupa un horario que la consulta no ocupaba (cambio de fecha,
+    horario u odontólogo, o reactivación de una cancelada).
+    Lanza HorarioOcupado si el horario ya está tomado.
+    """
+    consulta = serializer.instance
+    datos = serializer.validated_data
+    estado = datos.get('estado', consulta.estado)
+    fecha = disponibilidad.a_fecha(datos.get('fecha', consulta.fecha))
+    horario_id = datos['idhorario'].pk if datos.get('idhorario') else consulta.idhorario_id
+    if 'cododontologo' in datos:
+        odontologo_id = datos['cododontologo'].pk if datos['cododontologo'] else None
+    else:
+        odontologo_id = consulta.cododontologo_id
+    
+    nuevo = None
+    if estado not in disponibilidad.ESTADOS_LIBRES and fecha is not None and horario_id:
+        nuevo = (fecha, horario_id, odontologo_id)
+    if nuevo is None or nuevo == consulta.horario_ocupado():
+        return serializer.save()
+    
+    with reservar_horario(fecha, horario_id, odontologo_id, excluir_id=consulta.id):
+        return serializer.save()
 
 
 class HorarioViewSet(viewsets.ReadOnlyModelViewSet):
@@ -46,16 +87,15 @@ class HorarioViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Obtener horarios ocupados para esa fecha (y odontólogo si se especifica)
-        filtros = {'fecha': fecha}
-        if odontologo_id:
-            filtros['cododontologo_id'] = odontologo_id
-        
-        # IDs de horarios ya ocupados
-        horarios_ocupados = Consulta.objects.filter(**filtros).values_list('idhorario_id', flat=True)
+        fecha = _fecha(fecha)
+        if fecha is None:
+            return Response(
+                {'error': 'Formato de fecha inválido (YYYY-MM-DD)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Solo devolver horarios NO ocupados
-        horarios = Horario.objects.exclude(id__in=horarios_ocupados).order_by('hora')
+        # Solo devolver horarios NO ocupados (motor de disponibilidad en caché)
+        horarios = disponibilidad.horarios_libres(fecha, int(odontologo_id) if odontologo_id else None)
         serializer = self.get_serializer(horarios, many=True)
         return Response(serializer.data)
 
@@ -82,7 +122,7 @@ class TipodeconsultaViewSet(viewsets.ReadOnlyModelViewSet):
         """
         Obtener tipos de consulta disponibles para agendamiento web.
         """
-        tipos = Tipodeconsulta.objects.filter(permite_agendamiento_web=True)
+        tipos = catalogos.tipos_consulta(agendamiento_web=True)
         serializer = self.get_serializer(tipos, many=True)
         return Response(serializer.data)
 
@@ -125,6 +165,8 @@ class ConsultaViewSet(viewsets.ModelViewSet):
         if self.action == 'create':
             # Permitir a pacientes crear consultas (agendamiento web)
             return [IsAuthenticated()]
+        if self.action == 'agenda':
+            return [EsStaff()]
         return super().get_permissions()
     
     def create(self, request, *args, **kwargs):
@@ -157,10 +199,13 @@ class ConsultaViewSet(viewsets.ModelViewSet):
                     'error': 'Pago no encontrado'
                 }, status=status.HTTP_404_NOT_FOUND)
         
-        # Crear consulta normalmente
+        # Crear consulta reservando el horario (409 si otro lo tomó)
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        consulta = serializer.save()
+        try:
+            consulta = serializer.save()
+        except HorarioOcupado as e:
+            return Response({'error': e.mensaje}, status=status.HTTP_409_CONFLICT)
         
         # Vincular pago a consulta si existe
         if pago_id:
@@ -175,36 +220,47 @@ class ConsultaViewSet(viewsets.ModelViewSet):
             response_data['codigo_pago'] = pago.codigo_pago
         
         return Response(response_data, status=status.HTTP_201_CREATED, headers=headers)
-    
+
+    def update(self, request, *args, **kwargs):
+        """
+        PUT/PATCH de la consulta: mover fecha u horario reserva el nuevo horario
+        (409 si está ocupado).
+        """
+        try:
+            return super().update(request, *args, **kwargs)
+        except HorarioOcupado as e:
+            return Response({'error': e.mensaje}, status=status.HTTP_409_CONFLICT)
+
+    def perform_update(self, serializer):
+        _guardar_con_reserva(serializer)
+
     @action(detail=False, methods=['get'])
     def mis_consultas(self, request):
         """
         Obtener consultas del paciente autenticado.
         """
-        try:
-            from apps.usuarios.models import Paciente, Usuario
-            # Lookup en dos pasos: User.email -> Usuario -> Paciente
-            usuario = Usuario.objects.get(correoelectronico=request.user.email)
-            paciente = Paciente.objects.get(codusuario=usuario)
-            consultas = self.get_queryset().filter(codpaciente=paciente)
-            
-            page = self.paginate_queryset(consultas)
-            if page is not None:
-                serializer = self.get_serializer(page, many=True)
-                return self.get_paginated_response(serializer.data)
-            
-            serializer = self.get_serializer(consultas, many=True)
-            return Response(serializer.data)
-        except Usuario.DoesNotExist:
+        # User -> Usuario -> Paciente (resuelto y cacheado por el principal)
+        principal = obtener_principal(request)
+        if principal is None:
             return Response(
                 {'error': 'Usuario no encontrado'},
                 status=status.HTTP_404_NOT_FOUND
             )
-        except Paciente.DoesNotExist:
+        if principal.paciente is None:
             return Response(
                 {'error': 'El usuario no es un paciente'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        consultas = self.get_queryset().filter(codpaciente=principal.paciente)
+        
+        page = self.paginate_queryset(consultas)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
+        serializer = self.get_serializer(consultas, many=True)
+        return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def hoy(self, request):
@@ -257,23 +313,107 @@ class ConsultaViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Obtener horarios ocupados
-        filtros = {'fecha': fecha}
-        if odontologo_id:
-            filtros['cododontologo_id'] = odontologo_id
-        
-        consultas_ocupadas = self.get_queryset().filter(**filtros).values_list('idhorario_id', flat=True)
+        fecha_consulta = _fecha(fecha)
+        if fecha_consulta is None:
+            return Response(
+                {'error': 'Formato de fecha inválido (YYYY-MM-DD)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Obtener horarios disponibles
-        horarios_disponibles = Horario.objects.exclude(id__in=consultas_ocupadas)
+        # Horarios ocupados y disponibles (motor de disponibilidad en caché).
+        # La ocupación se calcula sobre TODAS las consultas de la clínica y no
+        # sobre self.get_queryset(): hoy son las mismas filas (el viewset no
+        # filtra por usuario), pero si get_queryset se restringe al usuario un
+        # paciente vería libres los horarios tomados por otros.
+        odontologo = int(odontologo_id) if odontologo_id else None
+        consultas_ocupadas = disponibilidad.horarios_ocupados(fecha_consulta, odontologo)
+        horarios_disponibles = disponibilidad.horarios_libres(fecha_consulta, odontologo)
         
         return Response({
             'fecha': fecha,
             'odontologo_id': odontologo_id,
             'horarios_disponibles': HorarioSerializer(horarios_disponibles, many=True).data,
-            'horarios_ocupados': list(consultas_ocupadas)
+            'horarios_ocupados': consultas_ocupadas
         })
     
+    @action(detail=False, methods=['get'], url_path='disponibilidad-rango')
+    def disponibilidad_rango(self, request):
+        """
+        Disponibilidad de un rango de fechas en una sola llamada (vista de calendario).
+        Query params: desde, hasta (YYYY-MM-DD, máx. DISPONIBILIDAD_MAX_DIAS días), odontologo_id (opcional)
+        
+        Respuesta: lista de horarios y por día un 'mapa' con '1' = libre en la
+        posición de cada horario.
+        """
+        desde = _fecha(request.query_params.get('desde'))
+        hasta = _fecha(request.query_params.get('hasta'))
+        odontologo_id = request.query_params.get('odontologo_id')
+        
+        if desde is None or hasta is None:
+            return Response(
+                {'error': 'Debe proporcionar desde y hasta (YYYY-MM-DD)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        max_dias = getattr(settings, 'DISPONIBILIDAD_MAX_DIAS', 93)
+        if desde > hasta or (hasta - desde).days >= max_dias:
+            return Response(
+                {'error': f'Rango inválido: desde debe ser anterior a hasta y abarcar como máximo {max_dias} días'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            odontologo = int(odontologo_id) if odontologo_id else None
+        except ValueError:
+            return Response(
+                {'error': 'odontologo_id inválido'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(disponibilidad.disponibilidad_rango(desde, hasta, odontologo))
+    
+    @action(detail=False, methods=['get'])
+    def agenda(self, request):
+        """
+        Agenda de todos los odontólogos agrupada por odontólogo y día (grilla de recepción).
+        Query params: desde, hasta (YYYY-MM-DD, máx. AGENDA_MAX_DIAS días), odontologo_id (opcional)
+        
+        Respuesta columnar: por odontólogo y día una lista por cada campo de
+        'columnas'. Lleva ETag; con If-None-Match vigente responde 304.
+        """
+        from . import agenda
+        
+        desde = _fecha(request.query_params.get('desde'))
+        hasta = _fecha(request.query_params.get('hasta'))
+        odontologo_id = request.query_params.get('odontologo_id')
+        
+        if desde is None or hasta is None:
+            return Response(
+                {'error': 'Debe proporcionar desde y hasta (YYYY-MM-DD)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        max_dias = getattr(settings, 'AGENDA_MAX_DIAS', 31)
+        if desde > hasta or (hasta - desde).days >= max_dias:
+            return Response(
+                {'error': f'Rango inválido: desde debe ser anterior a hasta y abarcar como máximo {max_dias} días'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            odontologo = int(odontologo_id) if odontologo_id else None
+        except ValueError:
+            return Response(
+                {'error': 'odontologo_id inválido'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        etag = agenda.marcador(desde, hasta, odontologo)
+        if etag in [valor.strip() for valor in request.headers.get('If-None-Match', '').split(',')]:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        
+        return Response(agenda.construir(desde, hasta, odontologo), headers={'ETag': etag})
+    
     @action(detail=True, methods=['patch'])
     def actualizar_estado(self, request, pk=None):
         """
@@ -285,7 +425,11 @@ class ConsultaViewSet(viewsets.ModelViewSet):
         )
         
         if serializer.is_valid():
-            serializer.save()
+            # Reactivar una cancelada vuelve a ocupar su horario (409 si ya está tomado)
+            try:
+                _guardar_con_reserva(serializer)
+            except HorarioOcupado as e:
+                return Response({'error': e.mensaje}, status=status.HTTP_409_CONFLICT)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -321,7 +465,7 @@ class ConsultaViewSet(viewsets.ModelViewSet):
             )
         
         consulta.estado = 'confirmada'
-        estado_confirmada = Estadodeconsulta.objects.get(estado='Confirmada')
+        estado_confirmada = catalogos.estado_consulta('Confirmada')
         consulta.idestadoconsulta = estado_confirmada
         consulta.save()
         
@@ -343,7 +487,7 @@ class ConsultaViewSet(viewsets.ModelViewSet):
             )
         
         consulta.estado = 'cancelada'
-        estado_cancelada = Estadodeconsulta.objects.get(estado='Cancelada')
+        estado_cancelada = catalogos.estado_consulta('Cancelada')
         consulta.idestadoconsulta = estado_cancelada
         consulta.motivo_cancelacion = motivo
         consulta.save()
@@ -370,23 +514,16 @@ class ConsultaViewSet(viewsets.ModelViewSet):
         
         # Verificar que el horario existe
         try:
-            nuevo_horario = Horario.objects.get(id=nuevo_horario_id)
+            nuevo_horario = catalogos.horario(nuevo_horario_id)
         except Horario.DoesNotExist:
             return Response(
                 {'error': 'El horario especificado no existe'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Verificar que el horario no esté ocupado
-        horario_ocupado = Consulta.objects.filter(
-            fecha=nueva_fecha,
-            idhorario=nuevo_horario,
-            cododontologo=consulta.cododontologo
-        ).exclude(id=consulta.id).exists()
-        
-        if horario_ocupado:
+        if _fecha(nueva_fecha) is None:
             return Response(
-                {'error': 'El horario seleccionado ya está ocupado'},
+                {'error': 'Formato de fecha inválido (YYYY-MM-DD)'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
@@ -398,12 +535,19 @@ class ConsultaViewSet(viewsets.ModelViewSet):
         if consulta.estado == 'cancelada':
             consulta.estado = 'pendiente'
             try:
-                estado_pendiente = Estadodeconsulta.objects.get(estado='Pendiente')
+                estado_pendiente = catalogos.estado_consulta('Pendiente')
                 consulta.idestadoconsulta = estado_pendiente
             except Estadodeconsulta.DoesNotExist:
                 pass
         
-        consulta.save()
+        # Reservar el nuevo horario y guardar (409 si está ocupado)
+        try:
+            with reservar_horario(
+                nueva_fecha, nuevo_horario.id, consulta.cododontologo_id, excluir_id=consulta.id
+            ):
+                consulta.save()
+        except HorarioOcupado as e:
+            return Response({'error': e.mensaje}, status=status.HTTP_409_CONFLICT)
         
         serializer = self.get_serializer(consulta)
         return Response(serializer.data)
@@ -426,49 +570,29 @@ class ConsultaViewSet(viewsets.ModelViewSet):
             )
         
         # Obtener o crear estado no_show
-        try:
-            estado_noshow = Estadodeconsulta.objects.get(estado__iexact='no_show')
-        except Estadodeconsulta.DoesNotExist:
-            # Si no existe, crear el estado
-            estado_noshow = Estadodeconsulta.objects.create(
-                estado='no_show',
-                descripcion='Paciente no asistió a la cita'
-            )
+        estado_noshow = catalogos.estado_consulta('no_show', crear=True)
         
         # Marcar como no-show
+        nueva_falta = consulta.estado != 'no_show'
         consulta.estado = 'no_show'
         consulta.idestadoconsulta = estado_noshow
+        # El signal solo actualiza el contador; el bloqueo lo hace esta vista
+        # para registrar quién marcó la falta
+        consulta._omitir_bloqueo = True
         consulta.save()
         
-        # Contar faltas del paciente
-        paciente = consulta.codpaciente
-        total_noshows = Consulta.objects.filter(
-            codpaciente=paciente,
-            estado='no_show'
-        ).count()
+        from .asistencia import bloquear_si_corresponde, conteos
+        total_noshows = conteos(consulta.codpaciente_id)['noshows']
         
         # Auto-bloqueo si tiene 3 o más faltas
         mensaje_bloqueo = None
-        if total_noshows >= 3:
-            from apps.autenticacion.models import BloqueoUsuario
-            from django.utils import timezone
-            
-            # Verificar si ya está bloqueado
-            usuario = paciente.codusuario
-            bloqueo_existente = BloqueoUsuario.objects.filter(
-                usuario=usuario,
-                activo=True
-            ).first()
-            
-            if not bloqueo_existente:
-                # Crear bloqueo automático
-                BloqueoUsuario.objects.create(
-                    usuario=usuario,
-                    motivo=f'Bloqueo automático: {total_noshows} faltas (no-show) registradas',
-                    fecha_bloqueo=timezone.now(),
-                    bloqueado_por=request.user,
-                    activo=True
-                )
+        if nueva_falta:
+            principal = obtener_principal(request)
+            bloqueo = bloquear_si_corresponde(
+                consulta.codpaciente_id, total_noshows,
+                creado_por=principal.usuario if principal else None
+            )
+            if bloqueo is not None:
                 mensaje_bloqueo = f'⚠️ PACIENTE BLOQUEADO: Acumuló {total_noshows} faltas'
         
         # Respuesta
@@ -482,3 +606,101 @@ class ConsultaViewSet(viewsets.ModelViewSet):
             response_data['alerta_bloqueo'] = mensaje_bloqueo
         
         return Response(response_data)
+
+
+@api_view(['POST'])
+@permission_classes([EsStaff])
+def ticket_agenda_en_vivo(request):
+    """
+    Ticket de un solo uso para conectarse a la agenda en vivo.
+    POST /api/v1/citas/en-vivo/ticket/
+    
+    Respuesta: { "ticket": "...", "expira": "..." }; se usa una vez como
+    /citas/en-vivo/?ticket=<ticket> dentro de AGENDA_EN_VIVO_TICKET_TTL segundos.
+    """
+    from .models import TicketAgendaEnVivo
+    
+    ticket = TicketAgendaEnVivo.emitir(request.user)
+    return Response(
+        {'ticket': ticket.key, 'expira': ticket.fecha_expiracion.isoformat()},
+        status=status.HTTP_201_CREATED
+    )
+
+
+def _autenticar_staff(request):
+    """
+    Autentica la conexión SSE. EventSource no envía headers: el navegador
+    usa un ticket de un solo uso (?ticket=, ver ticket_agenda_en_vivo), nunca
+    el token de sesión en la URL. Los clientes que sí envían Authorization
+    se autentican con las clases de DRF.
+
+    Returns:
+        None si es staff, o (mensaje, status) del error
+    """
+    from rest_framework.exceptions import APIException
+    from rest_framework.request import Request
+    from rest_framework.settings import api_settings
+    from .models import TicketAgendaEnVivo
+
+    if 'HTTP_AUTHORIZATION' in request.META:
+        drf_request = Request(request, authenticators=[clase() for clase in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+        try:
+            if not drf_request.user or not drf_request.user.is_authenticated:
+                return 'Debe autenticarse', status.HTTP_401_UNAUTHORIZED
+        except APIException as e:
+            return str(e.detail), status.HTTP_401_UNAUTHORIZED
+    else:
+        ticket = request.GET.get('ticket')
+        user = TicketAgendaEnVivo.canjear(ticket) if ticket else None
+        if user is None or not user.is_active:
+            return 'Ticket inválido o vencido', status.HTTP_401_UNAUTHORIZED
+        request.user = user
+        drf_request = request
+
+    if not EsStaff().has_permission(drf_request, None):
+        return EsStaff.message, status.HTTP_403_FORBIDDEN
+    return None
+
+
+async def agenda_en_vivo(request):
+    """
+    Eventos de la agenda en vivo por Server-Sent Events (solo staff).
+    GET /api/v1/citas/en-vivo/?tenant=<schema>&ticket=<ticket>[&odontologo_id=]
+    (ticket de POST /api/v1/citas/en-vivo/ticket/)
+    
+    Eventos: 'consulta' con el diff (accion: creada, confirmada, cancelada,
+    reprogramada, llegada, estado, eliminada) y 'resync' cuando el cliente
+    debe volver a pedir /citas/agenda/. Ver en_vivo.py.
+    """
+    from asgiref.sync import sync_to_async
+    from django.core.handlers.asgi import ASGIRequest
+    from django.http import JsonResponse, StreamingHttpResponse
+    from . import en_vivo
+    
+    if not isinstance(request, ASGIRequest):
+        # Bajo WSGI el flujo se consumiría entero antes de enviarse (nunca termina)
+        return JsonResponse(
+            {'error': 'La agenda en vivo requiere el servidor ASGI (config.asgi)'},
+            status=status.HTTP_501_NOT_IMPLEMENTED
+        )
+    
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Método no permitido'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    
+    schema_name = request.tenant.schema_name
+    error = await sync_to_async(_autenticar_staff)(request)
+    if error is not None:
+        return JsonResponse({'error': error[0]}, status=error[1])
+    
+    try:
+        odontologo_id = int(request.GET['odontologo_id']) if request.GET.get('odontologo_id') else None
+    except ValueError:
+        return JsonResponse({'error': 'odontologo_id inválido'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    respuesta = StreamingHttpResponse(
+        en_vivo.eventos(schema_name, odontologo_id),
+        content_type='text/event-stream'
+    )
+    respuesta['Cache-Control'] = 'no-cache'
+    respuesta['X-Accel-Buffering'] = 'no'  # nginx / proxies: no acumular el flujo
+    return respuesta
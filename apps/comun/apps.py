@@ -6,3 +6,7 @@ class ComunConfig(AppConfig):
     name = 'apps.comun'
     verbose_name = 'Común'
     verbose_name_plural = 'Comunes'
+
+    def ready(self):
+        """Registrar signals cuando la app esté lista"""
+        import apps.comun.signals
@@ -0,0 +1,192 @@
+"""
+Bus de invalidación de cachés entre procesos usando PostgreSQL LISTEN/NOTIFY.
+
+Cada worker (gunicorn, celery, uvicorn) mantiene cachés en memoria propias.
+Cuando un proceso modifica un dato cacheado publica un mensaje en el canal
+CACHE_INVALIDATION_CHANNEL; un hilo ligero en cada worker escucha el canal y
+reenvía el mensaje a los manejadores registrados para ese tipo.
+
+Mensaje (JSON):
+    {"tipo": "tenant", "schema": "clinica1", "origen": "<id del proceso>"}
+    {"tipo": "catalogo", "schema": "clinica1", "modelo": "citas.horario", ...}
+
+Un mensaje sin "schema" (o con "todo": true) significa "invalidar todo".
+Tras una reconexión del listener se envía ese mensaje a todos los tipos, porque
+las notificaciones emitidas mientras estuvo caído se pierden.
+"""
+import json
+import logging
+import os
+import select
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import connection, transaction
+
+
+logger = logging.getLogger(__name__)
+
+# Límite de payload de NOTIFY en PostgreSQL (8000 bytes)
+MAX_PAYLOAD = 7900
+
+_ORIGEN = uuid.uuid4().hex
+_manejadores = {}  # tipo -> [funcion(mensaje)]
+_lock = threading.Lock()
+_listener = {'pid': None, 'hilo': None}
+
+
+def _canal():
+    return getattr(settings, 'CACHE_INVALIDATION_CHANNEL', 'clinica_cache')
+
+
+def _habilitado():
+    return getattr(settings, 'CACHE_INVALIDATION_BUS_ENABLED', True)
+
+
+def registrar_manejador(tipo, funcion):
+    """
+    Registra una función que recibirá los mensajes de un tipo.
+
+    Args:
+        tipo: Tipo de mensaje ('tenant', 'catalogo', ...)
+        funcion: Callable que recibe el mensaje (dict)
+    """
+    with _lock:
+        lista = _manejadores.setdefault(tipo, [])
+        if funcion not in lista:
+            lista.append(funcion)
+
+
+def _despachar(mensaje):
+    """Entrega un mensaje a los manejadores locales de su tipo"""
+    with _lock:
+        funciones = list(_manejadores.get(mensaje.get('tipo'), ()))
+
+    for funcion in funciones:
+        try:
+            funcion(mensaje)
+        except Exception as e:
+            logger.error(f"Error en manejador de invalidación {funcion!r}: {e}")
+
+
+def publicar(tipo, **datos):
+    """
+    Publica una invalidación para todos los procesos.
+
+    El proceso actual aplica la invalidación al confirmar la transacción;
+    PostgreSQL entrega el NOTIFY a los demás procesos también al confirmar.
+
+    Args:
+        tipo: Tipo de mensaje
+        **datos: Datos del mensaje (schema, modelo, ...)
+    """
+    mensaje = dict(datos, tipo=tipo)
+    transaction.on_commit(lambda: _despachar(mensaje))
+
+    if not _habilitado():
+        return
+
+    payload = json.dumps(dict(mensaje, origen=_ORIGEN), default=str)
+    if len(payload) > MAX_PAYLOAD:
+        payload = json.dumps({'tipo': tipo, 'todo': True, 'origen': _ORIGEN})
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [_canal(), payload])
+    except Exception as e:
+        # La caché local ya se invalida; los demás workers caen por TTL
+        logger.warning(f"No se pudo publicar invalidación '{tipo}': {e}")
+
+
+def _conectar():
+    """Abre una conexión psycopg2 dedicada (fuera del ORM) para LISTEN"""
+    import psycopg2
+    import psycopg2.extensions
+
+    db = settings.DATABASES['default']
+    conexion = psycopg2.connect(
+        dbname=db.get('NAME'),
+        user=db.get('USER'),
+        password=db.get('PASSWORD'),
+        host=db.get('HOST') or None,
+        port=db.get('PORT') or None,
+        **db.get('OPTIONS', {}),
+    )
+    conexion.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    with conexion.cursor() as cursor:
+        cursor.execute(f'LISTEN "{_canal()}"')
+    return conexion
+
+
+def _invalidar_todo():
+    """Invalida todas las cachés registradas (tras reconectar)"""
+    with _lock:
+        tipos = list(_manejadores.keys())
+    for tipo in tipos:
+        _despachar({'tipo': tipo, 'todo': True})
+
+
+def _escuchar():
+    """Bucle del hilo listener: reconecta con backoff y despacha mensajes"""
+    espera = 1
+    primera_vez = True
+
+    while True:
+        conexion = None
+        try:
+            conexion = _conectar()
+            if not primera_vez:
+                _invalidar_todo()
+            primera_vez = False
+            espera = 1
+            logger.info(f"Listener de invalidación escuchando '{_canal()}' (pid {os.getpid()})")
+
+            while True:
+                if select.select([conexion], [], [], 30) == ([], [], []):
+                    continue
+                conexion.poll()
+                while conexion.notifies:
+                    notificacion = conexion.notifies.pop(0)
+                    try:
+                        mensaje = json.loads(notificacion.payload)
+                    except ValueError:
+                        continue
+                    if mensaje.get('origen') == _ORIGEN:
+                        continue
+                    _despachar(mensaje)
+        except Exception as e:
+            logger.warning(f"Listener de invalidación desconectado: {e}. Reintentando en {espera}s")
+            time.sleep(espera)
+            espera = min(espera * 2, 60)
+        finally:
+            if conexion is not None:
+                try:
+                    conexion.close()
+                except Exception:
+                    pass
+
+
+def asegurar_listener():
+    """
+    Inicia el hilo listener en este proceso si aún no está corriendo.
+    Es seguro llamarlo en cada petición: tras un fork (gunicorn --preload)
+    detecta el cambio de pid y arranca un hilo nuevo.
+    """
+    if not _habilitado():
+        return
+
+    pid = os.getpid()
+    hilo = _listener['hilo']
+    if _listener['pid'] == pid and hilo is not None and hilo.is_alive():
+        return
+
+    with _lock:
+        hilo = _listener['hilo']
+        if _listener['pid'] == pid and hilo is not None and hilo.is_alive():
+            return
+        hilo = threading.Thread(target=_escuchar, name='bus-invalidacion', daemon=True)
+        _listener['pid'] = pid
+        _listener['hilo'] = hilo
+        hilo.start()
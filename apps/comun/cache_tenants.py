@@ -0,0 +1,81 @@
+"""
+Caché local (por proceso) de resolución de tenants.
+
+TenantHeaderMiddleware resuelve la clínica en cada petición. Este módulo evita
+el round trip al schema público guardando las clínicas por schema_name con un
+TTL corto, y recordando también los subdominios inexistentes (caché negativa)
+para que un header inválido repetido no golpee la base de datos.
+
+Las entradas se invalidan desde las signals de Clinica/Dominio
+(ver apps/comun/signals.py), de modo que crear, editar, activar o desactivar
+una clínica se refleja de inmediato en el proceso que hizo el cambio.
+"""
+import copy
+import threading
+import time
+
+from django.conf import settings
+
+
+_NO_EXISTE = object()
+
+_lock = threading.Lock()
+_entradas = {}  # schema_name -> (expira_en, clinica | _NO_EXISTE)
+
+
+def _ttl():
+    return getattr(settings, 'TENANT_CACHE_TTL', 60)
+
+
+def _ttl_negativo():
+    return getattr(settings, 'TENANT_CACHE_NEGATIVE_TTL', 10)
+
+
+def obtener_clinica(schema_name):
+    """
+    Obtiene la clínica con el schema_name dado, usando la caché del proceso.
+
+    Args:
+        schema_name: Nombre del schema (subdominio) de la clínica
+
+    Returns:
+        Copia de la instancia de Clinica, o None si no existe
+    """
+    from apps.comun.models import Clinica
+
+    ahora = time.monotonic()
+    with _lock:
+        entrada = _entradas.get(schema_name)
+
+    if entrada is not None and entrada[0] > ahora:
+        valor = entrada[1]
+    else:
+        try:
+            valor = Clinica.objects.get(schema_name=schema_name)
+            expira_en = ahora + _ttl()
+        except Clinica.DoesNotExist:
+            valor = _NO_EXISTE
+            expira_en = ahora + _ttl_negativo()
+
+        with _lock:
+            _entradas[schema_name] = (expira_en, valor)
+
+    if valor is _NO_EXISTE:
+        return None
+
+    # Cada petición recibe su propia copia: el middleware le asigna domain_url
+    return copy.copy(valor)
+
+
+def invalidar_clinica(schema_name=None):
+    """
+    Elimina una clínica de la caché (o toda la caché si no se indica schema).
+
+    Args:
+        schema_name: Schema a invalidar. None limpia todas las entradas.
+    """
+    with _lock:
+        if schema_name is None:
+            _entradas.clear()
+        else:
+            _entradas.pop(schema_name, None)
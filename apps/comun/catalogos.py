@@ -0,0 +1,248 @@
+"""
+Caché en memoria (por proceso) de las tablas de catálogo de cada tenant.
+
+Horario, Estadodeconsulta, Tipodeconsulta, Tipopago, Estadodefactura y
+Tipodeusuario son tablas pequeñas que casi nunca cambian pero se consultan en
+casi todos los endpoints de escritura. Aquí se cargan completas una vez por
+(schema, modelo) y se sirven desde memoria.
+
+Invalidación versionada: cada (schema, modelo) tiene un número de versión que
+se incrementa al recibir un mensaje 'catalogo' del bus de invalidación
+(apps/comun/bus_invalidacion.py). Una entrada cargada con una versión anterior
+se descarta y se recarga en el siguiente acceso. Además hay un TTL de respaldo
+(CATALOG_CACHE_TTL) por si se pierde alguna notificación.
+
+IMPORTANTE: Las instancias devueltas se comparten entre peticiones; se pueden
+asignar a claves foráneas pero no deben modificarse.
+"""
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+
+from apps.comun.bus_invalidacion import registrar_manejador
+
+
+_lock = threading.Lock()
+_generacion = [0]  # se incrementa para invalidar todos los schemas
+_versiones = {}  # (schema, modelo) -> version
+_entradas = {}  # (schema, modelo) -> (generacion, version, expira_en, filas)
+
+
+def _ttl():
+    return getattr(settings, 'CATALOG_CACHE_TTL', 300)
+
+
+def _invalidar(mensaje):
+    """Manejador del bus para mensajes de tipo 'catalogo'"""
+    with _lock:
+        schema = mensaje.get('schema')
+        if mensaje.get('todo') or not schema:
+            _generacion[0] += 1
+            return
+        clave = (schema, mensaje.get('modelo'))
+        _versiones[clave] = _versiones.get(clave, 0) + 1
+
+
+registrar_manejador('catalogo', _invalidar)
+
+
+def _filas(modelo):
+    """
+    Devuelve todas las filas del catálogo para el tenant actual.
+
+    Args:
+        modelo: Label del modelo en minúsculas ('citas.horario')
+
+    Returns:
+        Lista de instancias en el orden de Meta.ordering del modelo
+    """
+    clave = (connection.schema_name, modelo)
+    ahora = time.monotonic()
+
+    with _lock:
+        generacion = _generacion[0]
+        version = _versiones.get(clave, 0)
+        entrada = _entradas.get(clave)
+
+    if entrada is not None:
+        gen_entrada, version_entrada, expira_en, filas = entrada
+        if gen_entrada == generacion and version_entrada == version and expira_en > ahora:
+            return filas
+
+    modelo_cls = apps.get_model(modelo)
+    filas = list(modelo_cls.objects.all())
+
+    with _lock:
+        # Si llegó una invalidación durante la carga no se guarda la entrada
+        if _generacion[0] == generacion and _versiones.get(clave, 0) == version:
+            _entradas[clave] = (generacion, version, ahora + _ttl(), filas)
+
+    return filas
+
+
+def _por_id(modelo, pk):
+    """Busca una fila por id; si no está en caché, consulta la BD y recarga"""
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        raise apps.get_model(modelo).DoesNotExist(f"{modelo} con id {pk!r} no existe")
+
+    for fila in _filas(modelo):
+        if fila.pk == pk:
+            return fila
+
+    # Puede haberse creado en otro worker y la notificación aún no llega
+    modelo_cls = apps.get_model(modelo)
+    fila = modelo_cls.objects.get(pk=pk)
+    _invalidar({'schema': connection.schema_name, 'modelo': modelo})
+    return fila
+
+
+def invalidar_catalogos():
+    """Descarta la caché de catálogos de todos los tenants en este proceso"""
+    _invalidar({'todo': True})
+
+
+# ============================================================================
+# CITAS
+# ============================================================================
+
+def horarios():
+    """
+    Todos los horarios ordenados por hora.
+
+    Returns:
+        Lista de instancias de Horario
+    """
+    return _filas('citas.horario')
+
+
+def horario(horario_id):
+    """
+    Horario por id.
+
+    Raises:
+        Horario.DoesNotExist: Si no existe
+    """
+    return _por_id('citas.horario', horario_id)
+
+
+def estado_consulta(nombre, crear=False):
+    """
+    Estado de consulta por nombre (sin distinguir mayúsculas).
+
+    Args:
+        nombre: Nombre del estado ('Pendiente', 'Confirmada', 'no_show', ...)
+        crear: Si es True y no existe, se crea
+
+    Raises:
+        Estadodeconsulta.DoesNotExist: Si no existe y crear es False
+    """
+    nombre_normalizado = nombre.strip().lower()
+    for estado in _filas('citas.estadodeconsulta'):
+        if estado.estado.lower() == nombre_normalizado:
+            return estado
+
+    modelo_cls = apps.get_model('citas.estadodeconsulta')
+    if crear:
+        estado, _ = modelo_cls.objects.get_or_create(estado=nombre)
+        return estado
+    raise modelo_cls.DoesNotExist(f"Estado de consulta '{nombre}' no existe")
+
+
+def estado_consulta_por_id(estado_id):
+    """
+    Estado de consulta por id.
+
+    Raises:
+        Estadodeconsulta.DoesNotExist: Si no existe
+    """
+    return _por_id('citas.estadodeconsulta', estado_id)
+
+
+def tipos_consulta(agendamiento_web=None):
+    """
+    Tipos de consulta (orden del modelo).
+
+    Args:
+        agendamiento_web: Si se indica, filtra por permite_agendamiento_web
+    """
+    tipos = _filas('citas.tipodeconsulta')
+    if agendamiento_web is None:
+        return tipos
+    return [t for t in tipos if t.permite_agendamiento_web == agendamiento_web]
+
+
+def tipo_consulta(tipo_id):
+    """
+    Tipo de consulta por id.
+
+    Raises:
+        Tipodeconsulta.DoesNotExist: Si no existe
+    """
+    return _por_id('citas.tipodeconsulta', tipo_id)
+
+
+# ============================================================================
+# PAGOS
+# ============================================================================
+
+def tipos_pago():
+    """Todos los tipos de pago ordenados por nombre"""
+    return _filas('sistema_pagos.tipopago')
+
+
+def tipo_pago(tipo_id):
+    """
+    Tipo de pago por id.
+
+    Raises:
+        Tipopago.DoesNotExist: Si no existe
+    """
+    return _por_id('sistema_pagos.tipopago', tipo_id)
+
+
+def estado_factura(texto):
+    """
+    Primer estado de factura cuyo nombre contiene el texto
+    (equivalente a filter(estado__icontains=texto).first()).
+
+    Returns:
+        Instancia de Estadodefactura o None
+    """
+    texto = texto.lower()
+    for estado in _filas('sistema_pagos.estadodefactura'):
+        if texto in estado.estado.lower():
+            return estado
+    return None
+
+
+# ============================================================================
+# USUARIOS
+# ============================================================================
+
+def tipo_usuario(rol):
+    """
+    Tipo de usuario por rol (sin distinguir mayúsculas).
+
+    Raises:
+        Tipodeusuario.DoesNotExist: Si no existe
+    """
+    rol_normalizado = rol.strip().lower()
+    for tipo in _filas('usuarios.tipodeusuario'):
+        if tipo.rol.lower() == rol_normalizado:
+            return tipo
+    raise apps.get_model('usuarios.tipodeusuario').DoesNotExist(f"Tipo de usuario '{rol}' no existe")
+
+
+def tipo_usuario_por_id(tipo_id):
+    """
+    Tipo de usuario por id.
+
+    Raises:
+        Tipodeusuario.DoesNotExist: Si no existe
+    """
+    return _por_id('usuarios.tipodeusuario', tipo_id)
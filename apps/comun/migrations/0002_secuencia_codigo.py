@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comun', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaCodigo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('schema_name', models.CharField(help_text='Schema de la clínica', max_length=63)),
+                ('prefijo', models.CharField(max_length=20)),
+                ('periodo', models.CharField(help_text='Período de numeración (ej. año)', max_length=10)),
+                ('ultimo', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Secuencia de código',
+                'verbose_name_plural': 'Secuencias de códigos',
+                'db_table': 'secuencia_codigo',
+                'constraints': [models.UniqueConstraint(fields=('schema_name', 'prefijo', 'periodo'), name='secuencia_codigo_unica')],
+            },
+        ),
+    ]
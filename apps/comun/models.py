@@ -8,7 +8,7 @@ from django.db import models
 # =================================================================
 # MULTITENANCY - MODELOS DE CLÍNICAS
 # =================================================================
-from .models_tenant import Clinica, Dominio  # noqa
+from .models_tenant import Clinica, Dominio, SecuenciaCodigo  # noqa
 
 
 # =================================================================
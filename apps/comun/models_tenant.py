@@ -75,3 +75,26 @@ class Dominio(DomainMixin):
     
     def __str__(self):
         return f"{self.domain} -> {self.tenant.nombre if self.tenant else 'Sin tenant'}"
+
+
+class SecuenciaCodigo(models.Model):
+    """
+    Último número asignado por clínica, prefijo y período para los códigos
+    legibles (PT-, PRES-, SES-, PAG-, ...). Vive en el schema público y se
+    incrementa con UPDATE ... RETURNING (ver apps.comun.secuencias).
+    """
+    schema_name = models.CharField(max_length=63, help_text="Schema de la clínica")
+    prefijo = models.CharField(max_length=20)
+    periodo = models.CharField(max_length=10, help_text="Período de numeración (ej. año)")
+    ultimo = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'secuencia_codigo'
+        verbose_name = "Secuencia de código"
+        verbose_name_plural = "Secuencias de códigos"
+        constraints = [
+            models.UniqueConstraint(fields=['schema_name', 'prefijo', 'periodo'], name='secuencia_codigo_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.schema_name} {self.prefijo}-{self.periodo}: {self.ultimo}"
@@ -3,6 +3,8 @@ Sistema de permisos personalizados para la aplicación.
 """
 from rest_framework import permissions
 
+from apps.comun.principal import obtener_rol, ROLES_STAFF
+
 
 class EsSuperAdministrador(permissions.BasePermission):
     """
@@ -28,13 +30,8 @@ class EsAdministrador(permissions.BasePermission):
             return True
         
         try:
-            from apps.usuarios.models import Usuario
-            usuario = Usuario.objects.select_related('idtipousuario').get(
-                correoelectronico=request.user.username
-            )
-            return usuario.idtipousuario.rol == 'Administrador'
-        except Usuario.DoesNotExist:
-            return False
+            # El request.user es el Django User; el rol se resuelve con el principal (cacheado)
+            return obtener_rol(request) == 'Administrador'
         except Exception:
             return False
 
@@ -50,14 +47,8 @@ class EsOdontologo(permissions.BasePermission):
             return False
         
         try:
-            # El request.user es el Django User, debemos buscar en Usuario por correoelectronico
-            from apps.usuarios.models import Usuario
-            usuario = Usuario.objects.select_related('idtipousuario').get(
-                correoelectronico=request.user.username
-            )
-            return usuario.idtipousuario.rol == 'Odontólogo'
-        except Usuario.DoesNotExist:
-            return False
+            # El request.user es el Django User; el rol se resuelve con el principal (cacheado)
+            return obtener_rol(request) == 'Odontólogo'
         except Exception:
             return False
 
@@ -73,13 +64,8 @@ class EsRecepcionista(permissions.BasePermission):
             return False
         
         try:
-            from apps.usuarios.models import Usuario
-            usuario = Usuario.objects.select_related('idtipousuario').get(
-                correoelectronico=request.user.username
-            )
-            return usuario.idtipousuario.rol == 'Recepcionista'
-        except Usuario.DoesNotExist:
-            return False
+            # El request.user es el Django User; el rol se resuelve con el principal (cacheado)
+            return obtener_rol(request) == 'Recepcionista'
         except Exception:
             return False
 
@@ -98,14 +84,7 @@ class EsStaff(permissions.BasePermission):
             return True
         
         try:
-            from apps.usuarios.models import Usuario
-            usuario = Usuario.objects.select_related('idtipousuario').get(
-                correoelectronico=request.user.username
-            )
-            rol = usuario.idtipousuario.rol
-            return rol in ['Administrador', 'Odontólogo', 'Recepcionista']
-        except Usuario.DoesNotExist:
-            return False
+            return obtener_rol(request) in ROLES_STAFF
         except Exception:
             return False
 
@@ -121,13 +100,8 @@ class EsPaciente(permissions.BasePermission):
             return False
         
         try:
-            from apps.usuarios.models import Usuario
-            usuario = Usuario.objects.select_related('idtipousuario').get(
-                correoelectronico=request.user.username
-            )
-            return usuario.idtipousuario.rol == 'Paciente'
-        except Usuario.DoesNotExist:
-            return False
+            # El request.user es el Django User; el rol se resuelve con el principal (cacheado)
+            return obtener_rol(request) == 'Paciente'
         except Exception:
             return False
 
@@ -169,14 +143,9 @@ class EsPropietarioOStaff(permissions.BasePermission):
             return True
         
         try:
-            from apps.usuarios.models import Usuario
-            usuario = Usuario.objects.select_related('idtipousuario').get(
-                correoelectronico=request.user.username
-            )
-            rol = usuario.idtipousuario.rol
-            if rol in ['Administrador', 'Odontólogo', 'Recepcionista']:
+            if obtener_rol(request) in ROLES_STAFF:
                 return True
-        except (Usuario.DoesNotExist, Exception):
+        except Exception:
             pass
         
         # Verificar propiedad
@@ -0,0 +1,177 @@
+"""
+Resolución del "principal" de la petición: Django User -> Usuario de la clínica.
+
+Permisos, auditoría y muchas vistas necesitan el Usuario, su rol y su fila de
+Paciente/Odontologo/Recepcionista. Antes cada uno hacía su propia consulta por
+correo; aquí se resuelve todo en una sola consulta (select_related sobre las
+relaciones uno a uno) y se memoriza:
+
+1. Por petición: en el propio HttpRequest, así una petición nunca repite la
+   consulta aunque pase por varios permisos y la auditoría.
+2. Entre peticiones: caché en memoria por (schema, correo) con TTL corto
+   (PRINCIPAL_CACHE_TTL). Los cambios en Usuario/Paciente/Odontologo/
+   Recepcionista publican un mensaje 'principal' en el bus de invalidación.
+
+IMPORTANTE: Las instancias del principal se comparten entre peticiones;
+usarlas para filtrar o leer, no para modificarlas y guardarlas.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from apps.comun.bus_invalidacion import registrar_manejador
+
+
+ROLES_STAFF = ('Administrador', 'Odontólogo', 'Recepcionista')
+
+_lock = threading.Lock()
+_entradas = {}  # (schema, correo) -> (expira_en, principal | None)
+
+
+class Principal:
+    """
+    Usuario autenticado de la clínica con su rol y perfil asociado.
+
+    Atributos:
+        usuario: Instancia de Usuario (con idtipousuario cargado)
+        rol: Nombre del rol ('Administrador', 'Odontólogo', ...) o None
+        paciente: Instancia de Paciente o None
+        odontologo: Instancia de Odontologo o None
+        recepcionista: Instancia de Recepcionista o None
+    """
+
+    def __init__(self, usuario, paciente=None, odontologo=None, recepcionista=None):
+        self.usuario = usuario
+        self.rol = usuario.idtipousuario.rol if usuario.idtipousuario_id else None
+        self.paciente = paciente
+        self.odontologo = odontologo
+        self.recepcionista = recepcionista
+
+    @property
+    def codigo(self):
+        return self.usuario.codigo
+
+    @property
+    def es_administrador(self):
+        return self.rol == 'Administrador'
+
+    @property
+    def es_staff(self):
+        return self.rol in ROLES_STAFF
+
+    def __repr__(self):
+        return f"<Principal {self.usuario.correoelectronico} ({self.rol})>"
+
+
+def _ttl():
+    return getattr(settings, 'PRINCIPAL_CACHE_TTL', 30)
+
+
+def _invalidar(mensaje):
+    """Manejador del bus para mensajes de tipo 'principal'"""
+    schema = mensaje.get('schema')
+    with _lock:
+        if mensaje.get('todo') or not schema:
+            _entradas.clear()
+            return
+        for clave in [c for c in _entradas if c[0] == schema]:
+            del _entradas[clave]
+
+
+registrar_manejador('principal', _invalidar)
+
+
+def _cargar(correo):
+    """Consulta el Usuario y su perfil por correo (una sola query)"""
+    from apps.usuarios.models import Usuario
+
+    usuario = (
+        Usuario.objects
+        .select_related('idtipousuario', 'paciente', 'odontologo', 'recepcionista')
+        .filter(correoelectronico=correo)
+        .first()
+    )
+    if usuario is None:
+        return None
+
+    return Principal(
+        usuario,
+        paciente=getattr(usuario, 'paciente', None),
+        odontologo=getattr(usuario, 'odontologo', None),
+        recepcionista=getattr(usuario, 'recepcionista', None),
+    )
+
+
+def _resolver_correo(correo):
+    """Resuelve un correo usando la caché entre peticiones"""
+    clave = (connection.schema_name, correo)
+    ahora = time.monotonic()
+
+    with _lock:
+        entrada = _entradas.get(clave)
+    if entrada is not None and entrada[0] > ahora:
+        return entrada[1]
+
+    principal = _cargar(correo)
+    with _lock:
+        _entradas[clave] = (ahora + _ttl(), principal)
+    return principal
+
+
+def obtener_principal(request):
+    """
+    Obtiene el principal del usuario autenticado en la petición.
+
+    El Usuario se busca por User.username (correo) y, si no existe, por
+    User.email, igual que hacían los permisos y las vistas.
+
+    Args:
+        request: HttpRequest o Request de DRF
+
+    Returns:
+        Principal o None si no está autenticado o no tiene Usuario asociado
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+
+    # Memoizar sobre el HttpRequest subyacente (compartido por DRF y Django)
+    http_request = getattr(request, '_request', request)
+    memo = getattr(http_request, '_principal_memo', None)
+    if memo is not None and memo[0] == user.pk:
+        return memo[1]
+
+    principal = None
+    for correo in dict.fromkeys([user.username, getattr(user, 'email', None)]):
+        if correo:
+            principal = _resolver_correo(correo)
+            if principal is not None:
+                break
+
+    http_request._principal_memo = (user.pk, principal)
+    return principal
+
+
+def obtener_rol(request):
+    """
+    Rol del usuario autenticado.
+
+    Con autenticación JWT el rol viene en los claims del token y no se
+    consulta la base de datos.
+
+    Returns:
+        Nombre del rol o None
+    """
+    auth = getattr(request, 'auth', None)
+    if auth is not None and hasattr(auth, 'payload') and 'rol' in auth.payload:
+        return auth.payload['rol']
+
+    principal = obtener_principal(request)
+    return principal.rol if principal else None
+
+
+def invalidar_principales(schema=None):
+    """Descarta los principales cacheados (de un schema o de todos)"""
+    _invalidar({'schema': schema} if schema else {'todo': True})
@@ -0,0 +1,113 @@
+"""
+Numeración de códigos legibles (PT-202611-0001, PRES-..., SES-..., PAG-...).
+
+Antes cada save() contaba los códigos del año con
+filter(codigo__startswith=...).count(): la consulta crecía con el historial
+y dos altas simultáneas obtenían el mismo número y chocaban con el unique.
+
+Ahora cada (clínica, prefijo, período) tiene una fila en SecuenciaCodigo
+(schema público) y el número sale de UN UPDATE ... RETURNING:
+
+- Es atómico: PostgreSQL bloquea la fila durante el UPDATE, dos peticiones
+  nunca reciben el mismo número.
+- Cuesta lo mismo con 10 o con 100.000 códigos emitidos.
+- reservar(cantidad=n) toma un bloque de n números en la misma operación
+  para las altas masivas.
+
+La primera vez que se usa un (clínica, prefijo, período) la fila se crea a
+partir del mayor número ya emitido (escaneo único, para continuar la
+numeración existente) con INSERT ... ON CONFLICT.
+
+Si la transacción que pidió el número se revierte, el incremento también se
+revierte; el UPDATE bloquea la fila hasta el COMMIT, así que las altas
+dentro de transacciones largas se serializan por prefijo.
+"""
+from django.db import connection
+from django.utils import timezone
+from django_tenants.utils import get_public_schema_name
+
+
+def _tabla():
+    return f'{connection.ops.quote_name(get_public_schema_name())}.secuencia_codigo'
+
+
+def _maximo_emitido(modelo, campo, comienzo):
+    """Mayor sufijo numérico de los códigos de `modelo` que empiezan con `comienzo`"""
+    maximo = 0
+    codigos = modelo.objects.filter(**{f'{campo}__startswith': comienzo}).values_list(campo, flat=True)
+    for codigo in codigos.order_by().iterator():
+        sufijo = codigo.rsplit('-', 1)[-1]
+        if sufijo.isdigit():
+            maximo = max(maximo, int(sufijo))
+    return maximo
+
+
+def reservar(prefijo, periodo, cantidad=1, inicial=None):
+    """
+    Reserva `cantidad` números consecutivos de la secuencia del tenant actual.
+
+    Args:
+        prefijo: Prefijo del código ('PT', 'PRES', ...)
+        periodo: Período de numeración (la numeración reinicia en cada uno)
+        cantidad: Tamaño del bloque
+        inicial: Callable que devuelve el último número ya emitido; solo se
+            llama si la secuencia todavía no existe
+
+    Returns:
+        El primer número del bloque (el bloque es [primero, primero + cantidad))
+    """
+    if cantidad < 1:
+        raise ValueError('La cantidad a reservar debe ser mayor a cero')
+
+    clave = [connection.schema_name, prefijo, str(periodo)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {_tabla()} SET ultimo = ultimo + %s '
+            f'WHERE schema_name = %s AND prefijo = %s AND periodo = %s RETURNING ultimo',
+            [cantidad, *clave]
+        )
+        fila = cursor.fetchone()
+        if fila is None:
+            base = inicial() if inicial else 0
+            cursor.execute(
+                f'INSERT INTO {_tabla()} AS s (schema_name, prefijo, periodo, ultimo) '
+                f'VALUES (%s, %s, %s, %s) '
+                f'ON CONFLICT (schema_name, prefijo, periodo) DO UPDATE SET ultimo = s.ultimo + %s '
+                f'RETURNING ultimo',
+                [*clave, base + cantidad, cantidad]
+            )
+            fila = cursor.fetchone()
+
+    return fila[0] - cantidad + 1
+
+
+def codigos(prefijo, modelo, cantidad=1, campo='codigo', ancho=4):
+    """
+    Genera `cantidad` códigos '{prefijo}-{AAAAMM}-{n}' (numeración anual,
+    el mes solo es informativo) para el modelo indicado.
+
+    Args:
+        prefijo: Prefijo del código
+        modelo: Modelo dueño del campo; se usa para continuar la numeración
+            existente la primera vez
+        cantidad: Códigos a generar (bloque reservado en una operación)
+        campo: Campo del código en el modelo
+        ancho: Dígitos mínimos del número
+
+    Returns:
+        Lista de códigos en orden
+    """
+    fecha = timezone.localtime()
+    primero = reservar(
+        prefijo, fecha.year, cantidad,
+        inicial=lambda: _maximo_emitido(modelo, campo, f'{prefijo}-{fecha.year}'),
+    )
+    return [
+        f'{prefijo}-{fecha.year}{fecha.month:02d}-{numero:0{ancho}d}'
+        for numero in range(primero, primero + cantidad)
+    ]
+
+
+def siguiente_codigo(prefijo, modelo, campo='codigo', ancho=4):
+    """Un solo código (ver codigos())"""
+    return codigos(prefijo, modelo, 1, campo=campo, ancho=ancho)[0]
@@ -0,0 +1,97 @@
+"""
+Signals de la app común.
+Publican en el bus de invalidación (LISTEN/NOTIFY) los cambios de datos que
+los workers mantienen en caché: clínicas, dominios y catálogos por tenant.
+"""
+from django.db import connection
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.comun.models import Clinica, Dominio
+from apps.comun.bus_invalidacion import publicar, registrar_manejador
+from apps.comun.cache_tenants import invalidar_clinica
+
+
+# Tablas de catálogo por tenant que se pueden cachear en memoria
+MODELOS_CATALOGO = [
+    'citas.Horario',
+    'citas.Estadodeconsulta',
+    'citas.Tipodeconsulta',
+    'sistema_pagos.Tipopago',
+    'sistema_pagos.Estadodefactura',
+    'usuarios.Tipodeusuario',
+]
+
+
+def _invalidar_tenant(mensaje):
+    """Manejador del bus para mensajes de tipo 'tenant'"""
+    if mensaje.get('todo'):
+        invalidar_clinica()
+    else:
+        invalidar_clinica(mensaje.get('schema'))
+
+
+registrar_manejador('tenant', _invalidar_tenant)
+
+
+@receiver(post_save, sender=Clinica)
+@receiver(post_delete, sender=Clinica)
+def invalidar_cache_clinica(sender, instance, **kwargs):
+    """Invalida la clínica al crearla, editarla, activarla/desactivarla o eliminarla"""
+    publicar('tenant', schema=instance.schema_name)
+
+
+@receiver(post_save, sender=Dominio)
+@receiver(post_delete, sender=Dominio)
+def invalidar_cache_dominio(sender, instance, **kwargs):
+    """Invalida la clínica asociada cuando cambia uno de sus dominios"""
+    tenant_id = instance.tenant_id
+    if tenant_id is None:
+        return
+
+    schema_name = (
+        Clinica.objects.filter(pk=tenant_id)
+        .values_list('schema_name', flat=True)
+        .first()
+    )
+    if schema_name is None:
+        publicar('tenant', todo=True)
+    else:
+        publicar('tenant', schema=schema_name)
+
+
+def publicar_cambio_catalogo(sender, instance, **kwargs):
+    """Publica la modificación de una fila de catálogo del tenant actual"""
+    publicar(
+        'catalogo',
+        schema=connection.schema_name,
+        modelo=sender._meta.label_lower,
+    )
+
+
+for _modelo in MODELOS_CATALOGO:
+    post_save.connect(publicar_cambio_catalogo, sender=_modelo,
+                      dispatch_uid=f'catalogo_save_{_modelo}')
+    post_delete.connect(publicar_cambio_catalogo, sender=_modelo,
+                        dispatch_uid=f'catalogo_delete_{_modelo}')
+
+
+# Modelos que forman parte del principal (apps/comun/principal.py)
+MODELOS_PRINCIPAL = [
+    'usuarios.Usuario',
+    'usuarios.Paciente',
+    'profesionales.Odontologo',
+    'profesionales.Recepcionista',
+]
+
+
+def publicar_cambio_principal(sender, instance, **kwargs):
+    """Invalida los principales cacheados del tenant actual"""
+    publicar('principal', schema=connection.schema_name)
+
+
+for _modelo in MODELOS_PRINCIPAL:
+    post_save.connect(publicar_cambio_principal, sender=_modelo,
+                      dispatch_uid=f'principal_save_{_modelo}')
+    post_delete.connect(publicar_cambio_principal, sender=_modelo,
+                        dispatch_uid=f'principal_delete_{_modelo}')
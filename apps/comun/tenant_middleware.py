@@ -5,7 +5,8 @@ Compatible con django-tenants para deployment en Render con frontend en Vercel
 from django_tenants.middleware.main import TenantMainMiddleware
 from django.http import Http404
 from django.db import connection
-from apps.comun.models import Clinica
+from apps.comun.cache_tenants import obtener_clinica
+from apps.comun.bus_invalidacion import asegurar_listener
 
 
 class TenantHeaderMiddleware(TenantMainMiddleware):
@@ -15,31 +16,38 @@ class TenantHeaderMiddleware(TenantMainMiddleware):
     
     Flujo:
     1. Lee el header X-Tenant-Subdomain de la petición
-    2. Busca la clínica con ese schema_name
+    2. Busca la clínica con ese schema_name (caché local con TTL, ver cache_tenants)
     3. Establece connection.tenant para esa clínica
     4. Django usa automáticamente el schema correcto
     
     Caso especial: Si no hay header, usa 'public' (tenant por defecto)
+    Las conexiones SSE (Accept: text/event-stream) pueden indicar ?tenant=
     """
     
     def process_request(self, request):
         """
         Procesa la petición y establece el tenant basado en el header X-Tenant-Subdomain
         """
+        # Escuchar invalidaciones de caché de otros workers (una vez por proceso)
+        asegurar_listener()
+
         # Establecer schema público primero (donde están los metadatos de tenants)
         connection.set_schema_to_public()
         
         # Obtener el subdomain desde el header HTTP
         subdomain = request.headers.get('X-Tenant-Subdomain', '').strip().lower()
         
+        # EventSource (agenda en vivo) no permite headers: tenant por query param
+        if not subdomain and 'text/event-stream' in request.headers.get('Accept', ''):
+            subdomain = request.GET.get('tenant', '').strip().lower()
+        
         # Si no hay header, usar tenant público
         if not subdomain:
             subdomain = 'public'
         
-        # Buscar el tenant por schema_name
-        try:
-            tenant = Clinica.objects.get(schema_name=subdomain)
-        except Clinica.DoesNotExist:
+        # Buscar el tenant por schema_name (desde la caché del proceso)
+        tenant = obtener_clinica(subdomain)
+        if tenant is None:
             raise Http404(f"Tenant '{subdomain}' no encontrado")
         
         # Establecer el tenant en la conexión
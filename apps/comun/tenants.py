@@ -0,0 +1,87 @@
+"""
+Utilidades para ejecutar trabajo en todos los schemas de clínicas.
+
+Las tareas periódicas (Celery) y los comandos de mantenimiento corren fuera
+de una petición, así que no hay tenant activo. Aquí se recorren las clínicas
+y se ejecuta una función dentro del schema de cada una.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django_tenants.utils import get_public_schema_name, schema_context
+
+
+logger = logging.getLogger(__name__)
+
+
+def schemas_clinicas(solo_activas=True):
+    """
+    Lista los schemas de las clínicas (sin el schema público).
+
+    Args:
+        solo_activas: Si es True excluye las clínicas desactivadas
+
+    Returns:
+        Lista de schema_name
+    """
+    from apps.comun.models import Clinica
+
+    with schema_context(get_public_schema_name()):
+        clinicas = Clinica.objects.exclude(schema_name=get_public_schema_name())
+        if solo_activas:
+            clinicas = clinicas.filter(activa=True)
+        return list(clinicas.order_by('schema_name').values_list('schema_name', flat=True))
+
+
+def _ejecutar_en_schema(schema_name, funcion, args, kwargs, cerrar_conexion):
+    try:
+        with schema_context(schema_name):
+            return funcion(*args, **kwargs)
+    finally:
+        # Los hilos del pool abren su propia conexión; no dejarla colgada
+        if cerrar_conexion:
+            connection.close()
+
+
+def ejecutar_en_clinicas(funcion, *args, paralelismo=1, solo_activas=True, **kwargs):
+    """
+    Ejecuta una función dentro del schema de cada clínica.
+
+    Un error en una clínica no detiene a las demás; queda registrado como
+    {'error': '...'} en el resultado de esa clínica.
+
+    Args:
+        funcion: Callable a ejecutar (sin argumento de schema; usa connection)
+        *args, **kwargs: Argumentos para la función
+        paralelismo: Número máximo de clínicas procesadas a la vez
+        solo_activas: Si es True solo recorre clínicas activas
+
+    Returns:
+        dict {schema_name: resultado de la función}
+    """
+    schemas = schemas_clinicas(solo_activas=solo_activas)
+    resultados = {}
+
+    if paralelismo <= 1 or len(schemas) <= 1:
+        for schema_name in schemas:
+            try:
+                resultados[schema_name] = _ejecutar_en_schema(schema_name, funcion, args, kwargs, False)
+            except Exception as e:
+                logger.error(f"Error en clínica '{schema_name}': {e}")
+                resultados[schema_name] = {'error': str(e)}
+        return resultados
+
+    with ThreadPoolExecutor(max_workers=paralelismo) as pool:
+        futuros = {
+            schema_name: pool.submit(_ejecutar_en_schema, schema_name, funcion, args, kwargs, True)
+            for schema_name in schemas
+        }
+        for schema_name, futuro in futuros.items():
+            try:
+                resultados[schema_name] = futuro.result()
+            except Exception as e:
+                logger.error(f"Error en clínica '{schema_name}': {e}")
+                resultados[schema_name] = {'error': str(e)}
+
+    return resultados
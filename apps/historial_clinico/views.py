@@ -19,7 +19,7 @@ from .serializers import (
     DocumentoClinicoCrearSerializer
 )
 from apps.comun.permisos import EsStaff, EsOdontologo
-from apps.usuarios.models import Usuario  # ← IMPORTAR Usuario desde usuarios app
+from apps.comun.principal import obtener_principal
 
 
 class HistorialclinicoViewSet(viewsets.ModelViewSet):
@@ -434,9 +434,8 @@ class ConsentimientoInformadoViewSet(viewsets.ModelViewSet):
         from django.utils import timezone
         
         # Validar que el usuario autenticado es un paciente
-        usuario = Usuario.objects.filter(
-            correoelectronico=request.user.username
-        ).first()
+        principal = obtener_principal(request)
+        usuario = principal.usuario if principal else None
         
         # ✅ CORREGIDO: idtipousuario es ForeignKey, usar _id para comparar el ID directamente
         if not usuario or usuario.idtipousuario_id != 4:  # 4 = Paciente
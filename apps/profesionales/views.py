@@ -128,6 +128,10 @@ class OdontologoViewSet(viewsets.ModelViewSet):
                 'mensaje': f'El odontólogo no trabaja los {dia_espanol}'
             })
         
+        # Horarios libres del odontólogo (motor de disponibilidad en caché)
+        from apps.citas.disponibilidad import horarios_libres
+        libres = horarios_libres(fecha, odontologo.pk)
+        
         return Response({
             'disponible': True,
             'fecha': fecha_str,
@@ -137,5 +141,8 @@ class OdontologoViewSet(viewsets.ModelViewSet):
                 'fin': '17:00:00'
             },
             'citas_ocupadas': list(citas),
-            'total_citas': citas.count()
+            'total_citas': citas.count(),
+            'horarios_disponibles': [
+                {'id': h.id, 'hora': h.hora.strftime('%H:%M')} for h in libres
+            ]
         })
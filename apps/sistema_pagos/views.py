@@ -18,6 +18,7 @@ from .serializers import (
     PagoSerializer, PagoCrearSerializer, PagoEnLineaSerializer
 )
 from apps.comun.permisos import EsStaff, EsAdministrador
+from apps.comun import catalogos
 
 
 class TipopagoViewSet(viewsets.ReadOnlyModelViewSet):
@@ -65,9 +66,7 @@ class FacturaViewSet(viewsets.ModelViewSet):
     def pendientes(self, request):
         """Listar facturas pendientes de pago."""
         # Buscar estado "pendiente" 
-        estado_pendiente = Estadodefactura.objects.filter(
-            estado__icontains='pendiente'
-        ).first()
+        estado_pendiente = catalogos.estado_factura('pendiente')
         
         if estado_pendiente:
             facturas = self.queryset.filter(idestadofactura=estado_pendiente)
@@ -125,9 +124,7 @@ class PagoViewSet(viewsets.ModelViewSet):
         
         # Actualizar estado si está completamente pagada
         if total_pagado >= factura.montototal:
-            estado_pagada = Estadodefactura.objects.filter(
-                estado__icontains='pagada'
-            ).first()
+            estado_pagada = catalogos.estado_factura('pagada')
             if estado_pagada:
                 factura.idestadofactura = estado_pagada
                 factura.save()
@@ -166,7 +163,7 @@ class PagoViewSet(viewsets.ModelViewSet):
     def pendientes(self, request):
         """Pagos pendientes (facturas con saldo pendiente)."""
         # Obtener facturas con estado pendiente
-        estado_pendiente = Estadodefactura.objects.filter(estado__icontains='pendiente').first()
+        estado_pendiente = catalogos.estado_factura('pendiente')
         if estado_pendiente:
             facturas_pendientes = Factura.objects.filter(idestadofactura=estado_pendiente)
             pagos = self.queryset.filter(idfactura__in=facturas_pendientes)
@@ -255,7 +252,7 @@ class PagoEnLineaViewSet(viewsets.ReadOnlyModelViewSet):
 from rest_framework.decorators import api_view, permission_classes
 from django.conf import settings
 import stripe
-import uuid
+from apps.comun.secuencias import siguiente_codigo
 from decimal import Decimal
 
 # Configurar API key de Stripe
@@ -296,7 +293,7 @@ def crear_intencion_pago_consulta(request):
         # Obtener tipo de consulta
         from apps.citas.models import Tipodeconsulta
         try:
-            tipo_consulta = Tipodeconsulta.objects.get(id=tipo_consulta_id)
+            tipo_consulta = catalogos.tipo_consulta(tipo_consulta_id)
         except Tipodeconsulta.DoesNotExist:
             return Response({
                 'error': 'Tipo de consulta no encontrado'
@@ -316,7 +313,7 @@ def crear_intencion_pago_consulta(request):
         monto = Decimal(str(monto))
         
         # Generar código único de pago
-        codigo_pago = f"CITA-{uuid.uuid4().hex[:8].upper()}"
+        codigo_pago = siguiente_codigo('CITA', PagoEnLinea, campo='codigo_pago')
         
         # Crear Payment Intent en Stripe
         # Nota: Stripe maneja montos en centavos
@@ -488,7 +485,7 @@ def crear_intencion_pago_presupuesto(request):
     {
         "client_secret": "pi_xxx_secret_xxx",
         "pago_id": 456,
-        "codigo_pago": "PRES-XXXXXXXX",
+        "codigo_pago": "PAGO-PRES-202611-0001",
         "monto": 1500.00,
         "moneda": "BOB",
         "presupuesto": {...}
@@ -531,7 +528,7 @@ def crear_intencion_pago_presupuesto(request):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         # Generar código único de pago
-        codigo_pago = f"PRES-{uuid.uuid4().hex[:8].upper()}"
+        codigo_pago = siguiente_codigo('PAGO-PRES', PagoEnLinea, campo='codigo_pago')
         
         # Crear Payment Intent en Stripe
         intent = stripe.PaymentIntent.create(
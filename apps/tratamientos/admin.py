@@ -7,7 +7,11 @@ class PlanTratamientoAdmin(admin.ModelAdmin):
     list_display = ['codigo', 'paciente', 'odontologo', 'estado', 'fecha_creacion']
     list_filter = ['estado', 'fecha_creacion']
     search_fields = ['codigo', 'paciente__usuario__nombre', 'descripcion']
-    readonly_fields = ['codigo', 'fecha_creacion', 'fecha_aprobacion']
+    readonly_fields = [
+        'codigo', 'fecha_creacion', 'fecha_aprobacion',
+        'total_items', 'items_pendientes', 'items_en_proceso', 'items_completados',
+        'items_cancelados', 'costo_estimado', 'costo_real',
+    ]
 
 
 @admin.register(Presupuesto)
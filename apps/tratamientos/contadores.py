@@ -0,0 +1,143 @@
+"""
+Contadores de procedimientos guardados en PlanTratamiento.
+
+Cada plan guarda total_items, items_<estado>, costo_estimado y costo_real
+(ver CAMPOS_CONTADORES). Los signals de Procedimiento comparan
+(plan, estado, costos) con lo que se cargó de la base y aplican solo la
+diferencia con F(), dentro de la misma transacción que el guardado
+(Procedimiento.save() es atómico). Así los listados, estadisticas y
+progreso_detallado leen el resumen del plan sin contar procedimientos.
+
+Los updates masivos (QuerySet.update / bulk_update sobre estado o costos)
+no disparan signals: deben llamar a recalcular(plan_id) o ejecutar
+reconciliar() después (comando reconciliar_planes).
+"""
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import F
+
+
+COLUMNAS = {
+    'pendiente': 'items_pendientes',
+    'en_proceso': 'items_en_proceso',
+    'completado': 'items_completados',
+    'cancelado': 'items_cancelados',
+}
+
+CAMPOS_CONTADORES = (
+    'total_items', 'items_pendientes', 'items_en_proceso', 'items_completados',
+    'items_cancelados', 'costo_estimado', 'costo_real',
+)
+
+
+def _decimal(valor):
+    # Las vistas a veces asignan el costo como viene en request.data
+    return Decimal(str(valor)) if valor not in (None, '') else Decimal('0')
+
+
+def _aporte(estado_resumen):
+    """{columna: valor} con lo que un procedimiento suma a su plan"""
+    _, estado, costo_estimado, costo_real = estado_resumen
+    aporte = {
+        'total_items': 1,
+        'costo_estimado': _decimal(costo_estimado),
+        'costo_real': _decimal(costo_real),
+    }
+    if estado in COLUMNAS:
+        aporte[COLUMNAS[estado]] = 1
+    return aporte
+
+
+def registrar_transicion(anterior, actual):
+    """
+    Actualiza los contadores de los planes por el cambio de un procedimiento.
+
+    Args:
+        anterior, actual: Procedimiento.estado_resumen()
+            (plan_id, estado, costo_estimado, costo_real) o None
+            (procedimiento nuevo / eliminado)
+
+    Returns:
+        Los ids de los planes modificados
+    """
+    from .models import PlanTratamiento
+
+    if anterior == actual:
+        return []
+
+    cambios = {}
+    if anterior is not None:
+        delta = cambios.setdefault(anterior[0], {})
+        for columna, valor in _aporte(anterior).items():
+            delta[columna] = delta.get(columna, 0) - valor
+    if actual is not None:
+        delta = cambios.setdefault(actual[0], {})
+        for columna, valor in _aporte(actual).items():
+            delta[columna] = delta.get(columna, 0) + valor
+
+    modificados = []
+    for plan_id, delta in cambios.items():
+        delta = {columna: valor for columna, valor in delta.items() if valor}
+        if delta:
+            PlanTratamiento.objects.filter(pk=plan_id).update(
+                **{columna: F(columna) + valor for columna, valor in delta.items()}
+            )
+            modificados.append(plan_id)
+    return modificados
+
+
+def _reales(planes=None):
+    """{plan_id: {campo: valor}} calculados desde los procedimientos"""
+    from .models import Procedimiento, agregados_procedimientos
+
+    procedimientos = Procedimiento.objects.order_by()
+    if planes is not None:
+        procedimientos = procedimientos.filter(plan_tratamiento_id__in=planes)
+
+    reales = {}
+    for fila in procedimientos.values('plan_tratamiento_id').annotate(**agregados_procedimientos()):
+        plan_id = fila.pop('plan_tratamiento_id')
+        fila['costo_estimado'] = fila['costo_estimado'] or Decimal('0')
+        fila['costo_real'] = fila['costo_real'] or Decimal('0')
+        reales[plan_id] = fila
+    return reales
+
+
+def _vacio():
+    return {campo: Decimal('0') if campo.startswith('costo') else 0 for campo in CAMPOS_CONTADORES}
+
+
+def recalcular(plan_id):
+    """Recalcula los contadores de un plan (una consulta agregada)"""
+    from .models import PlanTratamiento
+
+    valores = _reales([plan_id]).get(plan_id) or _vacio()
+    PlanTratamiento.objects.filter(pk=plan_id).update(**valores)
+    return valores
+
+
+def reconciliar():
+    """
+    Recalcula los contadores de todos los planes del schema actual.
+
+    Returns:
+        dict con planes revisados y planes corregidos
+    """
+    from .models import PlanTratamiento
+
+    reales = _reales()
+    corregidos = 0
+    with transaction.atomic():
+        planes = PlanTratamiento.objects.select_for_update().values('pk', *CAMPOS_CONTADORES)
+        for plan in planes:
+            valores = reales.get(plan['pk']) or _vacio()
+            if any(plan[campo] != valor for campo, valor in valores.items()):
+                PlanTratamiento.objects.filter(pk=plan['pk']).update(**valores)
+                corregidos += 1
+
+    return {
+        'schema': connection.schema_name,
+        'planes': len(planes),
+        'corregidos': corregidos,
+    }
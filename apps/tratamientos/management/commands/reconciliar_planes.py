@@ -0,0 +1,40 @@
+"""
+Comando para recalcular los contadores de procedimientos (por estado y
+costos) de los planes de tratamiento.
+Uso: python manage.py reconciliar_planes [--schema clinica1]
+"""
+from django.core.management.base import BaseCommand
+
+from apps.comun.tenants import ejecutar_en_clinicas
+from apps.tratamientos.contadores import reconciliar
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores de procedimientos de los planes de tratamiento'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--schema',
+            type=str,
+            help='Procesar solo esta clínica (schema_name)'
+        )
+
+    def handle(self, *args, **options):
+        from django_tenants.utils import schema_context
+        
+        if options['schema']:
+            with schema_context(options['schema']):
+                por_clinica = {options['schema']: reconciliar()}
+        else:
+            por_clinica = ejecutar_en_clinicas(reconciliar, solo_activas=False)
+        
+        for schema_name, resultado in por_clinica.items():
+            if 'error' in resultado:
+                self.stdout.write(self.style.ERROR(f'❌ {schema_name}: {resultado["error"]}'))
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ {schema_name}: {resultado["planes"]} planes, '
+                f'{resultado["corregidos"]} planes corregidos'
+            ))
+        
+        self.stdout.write(self.style.SUCCESS('✅ Reconciliación de planes terminada'))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tratamientos', '0003_agregar_sesion_tratamiento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sesiontratamiento',
+            name='procedimiento',
+            field=models.ForeignKey(blank=True, db_column='idprocedimiento', help_text='Procedimiento que se realiza en la sesión', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sesiones', to='tratamientos.procedimiento'),
+        ),
+    ]
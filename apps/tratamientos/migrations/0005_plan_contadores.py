@@ -0,0 +1,79 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:07
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def cargar_contadores(apps, schema_editor):
+    """Carga inicial de los contadores desde los procedimientos existentes"""
+    schema_editor.execute(
+        """
+        UPDATE plan_tratamiento p
+        SET total_items = r.total_items,
+            items_pendientes = r.items_pendientes,
+            items_en_proceso = r.items_en_proceso,
+            items_completados = r.items_completados,
+            items_cancelados = r.items_cancelados,
+            costo_estimado = r.costo_estimado,
+            costo_real = r.costo_real
+        FROM (
+            SELECT idplantratamiento,
+                   count(*) AS total_items,
+                   count(*) FILTER (WHERE estado = 'pendiente') AS items_pendientes,
+                   count(*) FILTER (WHERE estado = 'en_proceso') AS items_en_proceso,
+                   count(*) FILTER (WHERE estado = 'completado') AS items_completados,
+                   count(*) FILTER (WHERE estado = 'cancelado') AS items_cancelados,
+                   coalesce(sum(costo_estimado), 0) AS costo_estimado,
+                   coalesce(sum(costo_real), 0) AS costo_real
+            FROM procedimiento
+            GROUP BY idplantratamiento
+        ) r
+        WHERE p.id = r.idplantratamiento
+        """
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tratamientos', '0004_sesion_procedimiento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plantratamiento',
+            name='costo_estimado',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='plantratamiento',
+            name='costo_real',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='plantratamiento',
+            name='items_cancelados',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='plantratamiento',
+            name='items_completados',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='plantratamiento',
+            name='items_en_proceso',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='plantratamiento',
+            name='items_pendientes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='plantratamiento',
+            name='total_items',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(cargar_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-17 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tratamientos', '0005_plan_contadores'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='presupuesto',
+            index=models.Index(fields=['plan_tratamiento', 'estado'], name='presupuesto_plan_estado_idx'),
+        ),
+    ]
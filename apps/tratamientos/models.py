@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 from apps.usuarios.models import Paciente
@@ -6,6 +6,51 @@ from apps.profesionales.models import Odontologo
 from apps.administracion_clinica.models import Servicio
 
 
+def agregados_procedimientos(prefijo=''):
+    """
+    Conteos por estado y sumas de costos de procedimientos.
+
+    Args:
+        prefijo: 'procedimientos__' para anotar PlanTratamiento, '' para
+            agregar directamente sobre Procedimiento
+    """
+    def por_estado(estado):
+        return models.Count(f'{prefijo}id', filter=models.Q(**{f'{prefijo}estado': estado}))
+
+    return {
+        'total_items': models.Count(f'{prefijo}id'),
+        'items_pendientes': por_estado('pendiente'),
+        'items_en_proceso': por_estado('en_proceso'),
+        'items_completados': por_estado('completado'),
+        'items_cancelados': por_estado('cancelado'),
+        'costo_estimado': models.Sum(f'{prefijo}costo_estimado'),
+        'costo_real': models.Sum(f'{prefijo}costo_real'),
+    }
+
+
+class PlanTratamientoQuerySet(models.QuerySet):
+    """
+    QuerySet de planes con los datos que necesita PlanTratamientoSerializer.
+    """
+
+    def con_resumen(self):
+        """
+        Precarga procedimientos y presupuestos con sus relaciones; los conteos
+        y costos ya están en el plan (ver contadores.py). Serializar una
+        lista de planes usa un número fijo de consultas.
+        """
+        procedimientos = Procedimiento.objects.select_related('servicio', 'odontologo__codusuario')
+        presupuestos = Presupuesto.objects.prefetch_related(
+            models.Prefetch('items', queryset=ItemPresupuesto.objects.select_related('servicio'))
+        )
+        return self.select_related(
+            'paciente__codusuario', 'odontologo__codusuario'
+        ).prefetch_related(
+            models.Prefetch('procedimientos', queryset=procedimientos),
+            models.Prefetch('presupuestos', queryset=presupuestos),
+        )
+
+
 class PlanTratamiento(models.Model):
     """
     Plan de tratamiento propuesto por el odontólogo.
@@ -43,6 +88,17 @@ class PlanTratamiento(models.Model):
     fecha_finalizacion = models.DateField(blank=True, null=True)
     duracion_estimada_dias = models.IntegerField(blank=True, null=True, help_text="Duración estimada en días")
 
+    # Resumen de procedimientos, mantenido por los signals de Procedimiento (ver contadores.py)
+    total_items = models.PositiveIntegerField(default=0)
+    items_pendientes = models.PositiveIntegerField(default=0)
+    items_en_proceso = models.PositiveIntegerField(default=0)
+    items_completados = models.PositiveIntegerField(default=0)
+    items_cancelados = models.PositiveIntegerField(default=0)
+    costo_estimado = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0'))
+    costo_real = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0'))
+
+    objects = PlanTratamientoQuerySet.as_manager()
+
     class Meta:
         app_label = 'tratamientos'
         db_table = 'plan_tratamiento'
@@ -54,32 +110,43 @@ class PlanTratamiento(models.Model):
         return f"Plan {self.codigo} - {self.paciente}"
 
     def generar_codigo(self):
-        """Genera código único para el plan"""
-        import datetime
-        fecha = datetime.datetime.now()
-        ultimo = PlanTratamiento.objects.filter(
-            codigo__startswith=f'PT-{fecha.year}'
-        ).count()
-        return f'PT-{fecha.year}{fecha.month:02d}-{ultimo + 1:04d}'
+        """Genera código único para el plan (secuencia atómica por clínica y año)"""
+        from apps.comun.secuencias import siguiente_codigo
+        return siguiente_codigo('PT', PlanTratamiento)
 
     def save(self, *args, **kwargs):
+        from .contadores import CAMPOS_CONTADORES
+
         if not self.codigo:
             self.codigo = self.generar_codigo()
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Los contadores solo cambian con F() (contadores.py); no pisarlos
+            # con los valores que tenía esta instancia al cargarse
+            diferidos = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in CAMPOS_CONTADORES
+                and campo.attname not in diferidos
+            ]
         super().save(*args, **kwargs)
 
+    def resumen_procedimientos(self):
+        """
+        Conteos por estado y costos de los procedimientos (mismas claves que
+        agregados_procedimientos), leídos de los contadores del plan.
+        """
+        from .contadores import CAMPOS_CONTADORES
+        return {campo: getattr(self, campo) for campo in CAMPOS_CONTADORES}
+
     def calcular_costo_total(self):
         """Calcula el costo total sumando todos los procedimientos"""
-        procedimientos = self.procedimientos.all()
-        total = sum(p.costo_estimado or Decimal('0') for p in procedimientos)
-        return total
+        return self.costo_estimado
 
     def obtener_progreso(self):
         """Calcula el progreso del plan (% de procedimientos completados)"""
-        total_procedimientos = self.procedimientos.count()
-        if total_procedimientos == 0:
+        if self.total_items == 0:
             return 0
-        completados = self.procedimientos.filter(estado='completado').count()
-        return round((completados / total_procedimientos) * 100, 2)
+        return round((self.items_completados / self.total_items) * 100, 2)
 
 
 class Presupuesto(models.Model):
@@ -138,18 +205,18 @@ class Presupuesto(models.Model):
         verbose_name = 'Presupuesto'
         verbose_name_plural = 'Presupuestos'
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Presupuestos de un plan por estado (planes_disponibles, estadisticas del plan)
+            models.Index(fields=['plan_tratamiento', 'estado'], name='presupuesto_plan_estado_idx'),
+        ]
 
     def __str__(self):
         return f"Presupuesto {self.codigo} - {self.plan_tratamiento.paciente}"
 
     def generar_codigo(self):
-        """Genera código único para el presupuesto"""
-        import datetime
-        fecha = datetime.datetime.now()
-        ultimo = Presupuesto.objects.filter(
-            codigo__startswith=f'PRES-{fecha.year}'
-        ).count()
-        return f'PRES-{fecha.year}{fecha.month:02d}-{ultimo + 1:04d}'
+        """Genera código único para el presupuesto (secuencia atómica por clínica y año)"""
+        from apps.comun.secuencias import siguiente_codigo
+        return siguiente_codigo('PRES', Presupuesto)
 
     def save(self, *args, **kwargs):
         if not self.codigo:
@@ -158,6 +225,36 @@ class Presupuesto(models.Model):
         self.total = self.subtotal - self.descuento + self.impuesto
         super().save(*args, **kwargs)
 
+    @classmethod
+    def crear_con_items(cls, items, **datos):
+        """
+        Crea el presupuesto y sus items en una transacción.
+
+        Los totales de línea se calculan en una pasada sobre los datos ya
+        validados, los items se insertan con bulk_create y el subtotal del
+        encabezado sale de esos mismos totales (sin volver a leer los items).
+
+        Args:
+            items: Lista de dicts con los campos de ItemPresupuesto
+                (servicio, cantidad, precio_unitario, descuento_item, ...)
+            **datos: Campos del presupuesto (plan_tratamiento, descuento, ...)
+
+        Returns:
+            El Presupuesto creado
+        """
+        filas = [ItemPresupuesto(**item) for item in items]
+        for fila in filas:
+            fila.total = fila.calcular_total()
+
+        with transaction.atomic():
+            presupuesto = cls(subtotal=sum((fila.total for fila in filas), Decimal('0')), **datos)
+            presupuesto.save()
+            for fila in filas:
+                fila.presupuesto = presupuesto
+            ItemPresupuesto.objects.bulk_create(filas, batch_size=500)
+
+        return presupuesto
+
     def calcular_totales(self):
         """Calcula subtotal sumando items"""
         items = self.items.all()
@@ -216,10 +313,13 @@ class ItemPresupuesto(models.Model):
     def __str__(self):
         return f"{self.servicio.nombreservicio} - {self.cantidad}x"
 
+    def calcular_total(self):
+        """Total de la línea: precio por cantidad menos el descuento"""
+        return self.precio_unitario * self.cantidad - self.descuento_item
+
     def save(self, *args, **kwargs):
         # Calcular total del item
-        subtotal_item = self.precio_unitario * self.cantidad
-        self.total = subtotal_item - self.descuento_item
+        self.total = self.calcular_total()
         super().save(*args, **kwargs)
 
 
@@ -290,6 +390,30 @@ class Procedimiento(models.Model):
     def __str__(self):
         return f"{self.servicio.nombreservicio} - {self.estado}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Plan, estado y costos al cargar, para ajustar los contadores del plan al guardar
+        instancia._resumen_original = instancia.estado_resumen()
+        return instancia
+
+    def estado_resumen(self):
+        """
+        (plan_tratamiento_id, estado, costo_estimado, costo_real) o False si
+        hay campos diferidos.
+        """
+        datos = self.__dict__
+        campos = ('plan_tratamiento_id', 'estado', 'costo_estimado', 'costo_real')
+        if not all(campo in datos for campo in campos):
+            return False
+        return tuple(datos[campo] for campo in campos)
+
+    def save(self, *args, **kwargs):
+        # Atómico para que los contadores del plan (signal post_save) se
+        # confirmen junto con el procedimiento
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def marcar_completado(self):
         """Marca el procedimiento como completado"""
         from django.utils import timezone
@@ -323,6 +447,15 @@ class SesionTratamiento(models.Model):
         related_name='sesiones_realizadas',
         db_column='odontologocodigo'
     )
+    procedimiento = models.ForeignKey(
+        Procedimiento,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='sesiones',
+        db_column='idprocedimiento',
+        help_text='Procedimiento que se realiza en la sesión'
+    )
     codigo = models.CharField(max_length=50, unique=True, db_index=True)
     numero_sesion = models.IntegerField(help_text='Número de sesión dentro del plan')
     titulo = models.CharField(max_length=200, help_text='Título descriptivo de la sesión')
@@ -348,13 +481,9 @@ class SesionTratamiento(models.Model):
         return f"Sesión {self.numero_sesion} - {self.plan_tratamiento.codigo}"
 
     def generar_codigo(self):
-        """Genera código único para la sesión"""
-        import datetime
-        fecha = datetime.datetime.now()
-        ultimo = SesionTratamiento.objects.filter(
-            codigo__startswith=f'SES-{fecha.year}'
-        ).count()
-        return f'SES-{fecha.year}{fecha.month:02d}-{ultimo + 1:04d}'
+        """Genera código único para la sesión (secuencia atómica por clínica y año)"""
+        from apps.comun.secuencias import siguiente_codigo
+        return siguiente_codigo('SES', SesionTratamiento)
 
     def save(self, *args, **kwargs):
         if not self.codigo:
@@ -440,13 +569,9 @@ class HistorialPago(models.Model):
         return f"Pago {self.codigo} - Bs. {self.monto}"
 
     def generar_codigo(self):
-        """Genera código único para el pago"""
-        import datetime
-        fecha = datetime.datetime.now()
-        ultimo = HistorialPago.objects.filter(
-            codigo__startswith=f'PAG-{fecha.year}'
-        ).count()
-        return f'PAG-{fecha.year}{fecha.month:02d}-{ultimo + 1:04d}'
+        """Genera código único para el pago (secuencia atómica por clínica y año)"""
+        from apps.comun.secuencias import siguiente_codigo
+        return siguiente_codigo('PAG', HistorialPago)
 
     def save(self, *args, **kwargs):
         if not self.codigo:
@@ -0,0 +1,294 @@
+"""
+Programación de las sesiones de un plan de tratamiento en una sola llamada.
+
+Para cada procedimiento pendiente del plan (sin sesión programada) se busca
+el primer hueco libre:
+
+- La ocupación de cada día es un mapa de bits por minuto: el bit m está en 1
+  si el odontólogo o el paciente tienen algo a esa hora (consultas activas y
+  sesiones programadas/en curso). Se carga con UNA consulta por modelo para
+  todo el horizonte de búsqueda.
+- Los inicios posibles son los horarios del catálogo de la clínica; un
+  inicio sirve si (mapa & máscara de la duración) == 0.
+- Duración: Procedimiento.duracion_minutos, si no Servicio.duracion. Las
+  consultas ocupan Consulta.duracion_estimada o la de su Tipodeconsulta.
+- Entre una sesión y la siguiente se dejan al menos `espaciado_dias` días.
+- Se prueban primero los horarios de la franja preferida del paciente
+  (horario_preferido de su última consulta si no se indica) y, si no hay
+  lugar en todo el horizonte, cualquier horario.
+
+proponer() no escribe nada; programar() bloquea el plan y al odontólogo,
+vuelve a calcular la propuesta dentro de la transacción y crea las sesiones.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from apps.comun import catalogos, secuencias
+
+
+MINUTOS_DIA = 24 * 60
+DURACION_POR_DEFECTO = 30
+
+# Franjas de Consulta.HORARIOS_PREFERIDOS en minutos del día [inicio, fin)
+FRANJAS = {
+    'manana': (8 * 60, 12 * 60),
+    'tarde': (14 * 60, 18 * 60),
+    'noche': (18 * 60, 20 * 60),
+}
+
+DIAS_NO_LABORABLES = (6,)  # domingo
+
+ESTADOS_SESION_ACTIVOS = ('programada', 'en_curso')
+ESTADOS_PROCEDIMIENTO_PENDIENTES = ('pendiente', 'en_proceso')
+
+
+def _configuracion(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+def _minuto(hora):
+    return hora.hour * 60 + hora.minute
+
+
+def _mascara(inicio, duracion):
+    duracion = max(1, min(duracion, MINUTOS_DIA - inicio))
+    return ((1 << duracion) - 1) << inicio
+
+
+# ============================================================================
+# OCUPACIÓN
+# ============================================================================
+
+def _ocupacion(odontologo_id, paciente_id, desde, hasta):
+    """
+    Mapas de bits por minuto de los días [desde, hasta] para el odontólogo y
+    el paciente.
+
+    Returns:
+        dict {fecha: entero}
+    """
+    from apps.citas.disponibilidad import ESTADOS_LIBRES
+    from apps.citas.models import Consulta
+    from .models import SesionTratamiento
+
+    ocupado = {}
+
+    def marcar(fecha, inicio, duracion):
+        ocupado[fecha] = ocupado.get(fecha, 0) | _mascara(inicio, duracion or DURACION_POR_DEFECTO)
+
+    consultas = Consulta.objects.filter(
+        Q(cododontologo_id=odontologo_id) | Q(codpaciente_id=paciente_id),
+        fecha__gte=desde,
+        fecha__lte=hasta,
+    ).exclude(estado__in=ESTADOS_LIBRES).values_list(
+        'fecha', 'hora_consulta', 'idhorario__hora', 'duracion_estimada', 'idtipoconsulta__duracion_estimada'
+    ).order_by()
+    for fecha, hora_consulta, hora_horario, duracion, duracion_tipo in consultas:
+        hora = hora_consulta or hora_horario
+        if hora is not None:
+            marcar(fecha, _minuto(hora), duracion or duracion_tipo)
+
+    inicio = timezone.make_aware(datetime.combine(desde, time.min))
+    fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+    sesiones = SesionTratamiento.objects.filter(
+        Q(odontologo_id=odontologo_id) | Q(plan_tratamiento__paciente_id=paciente_id),
+        estado__in=ESTADOS_SESION_ACTIVOS,
+        fecha_programada__gte=inicio,
+        fecha_programada__lt=fin,
+    ).values_list(
+        'fecha_programada', 'duracion_minutos', 'procedimiento__duracion_minutos', 'procedimiento__servicio__duracion'
+    ).order_by()
+    for fecha_programada, duracion, duracion_procedimiento, duracion_servicio in sesiones:
+        local = timezone.localtime(fecha_programada)
+        marcar(local.date(), _minuto(local), duracion or duracion_procedimiento or duracion_servicio)
+
+    return ocupado
+
+
+def _buscar(ocupado, desde, hasta, duracion, inicios):
+    """Primer (fecha, minuto) libre de [desde, hasta] o None"""
+    ahora = timezone.localtime()
+    dia = desde
+    while dia <= hasta:
+        if dia.weekday() not in DIAS_NO_LABORABLES:
+            mapa = ocupado.get(dia, 0)
+            for inicio in inicios:
+                if dia == ahora.date() and inicio <= _minuto(ahora):
+                    continue
+                if not mapa & _mascara(inicio, duracion):
+                    return dia, inicio
+        dia += timedelta(days=1)
+    return None
+
+
+# ============================================================================
+# PROPUESTA Y RESERVA
+# ============================================================================
+
+def _preferencia_paciente(paciente_id):
+    """horario_preferido de la última consulta del paciente"""
+    from apps.citas.models import Consulta
+
+    return Consulta.objects.filter(codpaciente_id=paciente_id).order_by('-fecha', '-id').values_list(
+        'horario_preferido', flat=True
+    ).first() or 'cualquiera'
+
+
+def _pendientes(plan):
+    """Procedimientos pendientes del plan que aún no tienen sesión activa"""
+    from .models import SesionTratamiento
+
+    return list(
+        plan.procedimientos
+        .filter(estado__in=ESTADOS_PROCEDIMIENTO_PENDIENTES)
+        .annotate(con_sesion=Exists(SesionTratamiento.objects.filter(
+            procedimiento=OuterRef('pk'), estado__in=ESTADOS_SESION_ACTIVOS
+        )))
+        .filter(con_sesion=False)
+        .select_related('servicio')
+        .order_by('fecha_planificada', 'id')
+    )
+
+
+def proponer(plan, desde=None, odontologo_id=None, espaciado_dias=None, horario_preferido=None):
+    """
+    Calcula fecha y hora para cada procedimiento pendiente del plan.
+
+    Args:
+        plan: PlanTratamiento
+        desde: date de la primera sesión posible (por defecto mañana)
+        odontologo_id: Odontólogo que atiende (por defecto el del plan)
+        espaciado_dias: Días mínimos entre sesiones (SESIONES_ESPACIADO_DIAS)
+        horario_preferido: 'manana', 'tarde', 'noche' o 'cualquiera'
+
+    Returns:
+        dict con los parámetros usados, 'sesiones' (propuestas en orden) y
+        'sin_lugar' (procedimientos sin hueco dentro del horizonte)
+
+    Raises:
+        ValueError: Si el plan no admite sesiones o no hay odontólogo
+    """
+    from .models import SesionTratamiento
+
+    if plan.estado in ('completado', 'cancelado'):
+        raise ValueError(f'No se pueden programar sesiones en un plan {plan.get_estado_display().lower()}')
+
+    odontologo_id = odontologo_id or plan.odontologo_id
+    if not odontologo_id:
+        raise ValueError('El plan no tiene odontólogo asignado; indique odontologo_id')
+
+    if espaciado_dias is None:
+        espaciado_dias = _configuracion('SESIONES_ESPACIADO_DIAS', 7)
+    if not horario_preferido:
+        horario_preferido = _preferencia_paciente(plan.paciente_id)
+
+    primera = desde or timezone.localdate() + timedelta(days=1)
+    hasta = primera + timedelta(days=_configuracion('SESIONES_HORIZONTE_DIAS', 180))
+
+    # Respetar el espaciado con la última sesión ya programada del plan
+    ultima = SesionTratamiento.objects.filter(
+        plan_tratamiento=plan, estado__in=ESTADOS_SESION_ACTIVOS
+    ).order_by('-fecha_programada').values_list('fecha_programada', flat=True).first()
+    if ultima is not None:
+        primera = max(primera, timezone.localtime(ultima).date() + timedelta(days=espaciado_dias))
+
+    propuesta = {
+        'plan_id': plan.id,
+        'odontologo_id': odontologo_id,
+        'horario_preferido': horario_preferido,
+        'espaciado_dias': espaciado_dias,
+        'sesiones': [],
+        'sin_lugar': [],
+    }
+
+    pendientes = _pendientes(plan)
+    if not pendientes or primera > hasta:
+        propuesta['sin_lugar'] = [p.id for p in pendientes]
+        return propuesta
+
+    ocupado = _ocupacion(odontologo_id, plan.paciente_id, primera, hasta)
+    todos = sorted({_minuto(h.hora) for h in catalogos.horarios()})
+    franja = FRANJAS.get(horario_preferido)
+    preferidos = [m for m in todos if franja[0] <= m < franja[1]] if franja else todos
+
+    siguiente = primera
+    for procedimiento in pendientes:
+        duracion = procedimiento.duracion_minutos or procedimiento.servicio.duracion or DURACION_POR_DEFECTO
+        inicio_item = max(siguiente, procedimiento.fecha_planificada or siguiente)
+
+        encontrado = _buscar(ocupado, inicio_item, hasta, duracion, preferidos)
+        en_preferido = encontrado is not None
+        if encontrado is None and preferidos is not todos:
+            encontrado = _buscar(ocupado, inicio_item, hasta, duracion, todos)
+        if encontrado is None:
+            propuesta['sin_lugar'].append(procedimiento.id)
+            continue
+
+        dia, inicio = encontrado
+        ocupado[dia] = ocupado.get(dia, 0) | _mascara(inicio, duracion)
+        siguiente = dia + timedelta(days=espaciado_dias)
+
+        propuesta['sesiones'].append({
+            'procedimiento_id': procedimiento.id,
+            'titulo': procedimiento.servicio.nombre,
+            'descripcion': procedimiento.descripcion,
+            'fecha_programada': timezone.make_aware(datetime.combine(dia, time(inicio // 60, inicio % 60))),
+            'duracion_minutos': duracion,
+            'en_horario_preferido': en_preferido,
+        })
+
+    return propuesta
+
+
+def programar(plan, **opciones):
+    """
+    Crea las sesiones propuestas por proponer() en una transacción.
+
+    El plan y el odontólogo se bloquean (SELECT ... FOR UPDATE) antes de
+    calcular, así dos programaciones simultáneas no toman el mismo hueco.
+
+    Returns:
+        La propuesta con el id y el código de cada sesión creada
+    """
+    from apps.profesionales.models import Odontologo
+    from .models import PlanTratamiento, Procedimiento, SesionTratamiento
+
+    odontologo_id = opciones.get('odontologo_id') or plan.odontologo_id
+
+    with transaction.atomic():
+        plan = PlanTratamiento.objects.select_for_update().get(pk=plan.pk)
+        list(Odontologo.objects.select_for_update().filter(pk=odontologo_id).values_list('pk', flat=True))
+
+        propuesta = proponer(plan, **opciones)
+
+        # Un solo bloque de códigos para todas las sesiones
+        cantidad = len(propuesta['sesiones'])
+        codigos = secuencias.codigos('SES', SesionTratamiento, cantidad) if cantidad else []
+
+        procedimientos = []
+        for item, codigo in zip(propuesta['sesiones'], codigos):
+            sesion = SesionTratamiento(
+                codigo=codigo,
+                plan_tratamiento=plan,
+                odontologo_id=propuesta['odontologo_id'],
+                procedimiento_id=item['procedimiento_id'],
+                titulo=item['titulo'][:200],
+                descripcion=item['descripcion'],
+                fecha_programada=item['fecha_programada'],
+                estado='programada',
+            )
+            sesion.save()
+            item['sesion_id'] = sesion.id
+            item['codigo'] = sesion.codigo
+            procedimientos.append(Procedimiento(
+                id=item['procedimiento_id'],
+                fecha_planificada=timezone.localtime(item['fecha_programada']).date(),
+            ))
+
+        Procedimiento.objects.bulk_update(procedimientos, ['fecha_planificada'])
+
+    return propuesta
@@ -0,0 +1,59 @@
+"""
+Progreso por procedimiento a partir de sesiones ya cargadas en memoria.
+
+Las vistas precargan las sesiones con prefetch_sesiones() (UNA consulta
+para todo el plan o el procedimiento) y estas funciones agrupan y resumen
+sin volver a la base, así el costo no depende de cuántos procedimientos o
+sesiones tenga el plan.
+
+La línea de tiempo de cada procedimiento es compacta: una lista de filas en
+el orden de COLUMNAS_SESION.
+"""
+from django.db.models import Prefetch
+
+
+COLUMNAS_SESION = ['id', 'numero', 'estado', 'fecha_programada', 'fecha_inicio', 'fecha_fin']
+
+
+def prefetch_sesiones(ruta='sesiones'):
+    """Prefetch de las sesiones con solo los campos de la línea de tiempo, en orden cronológico"""
+    from .models import SesionTratamiento
+
+    sesiones = SesionTratamiento.objects.only(
+        'id', 'plan_tratamiento', 'procedimiento', 'numero_sesion', 'estado',
+        'fecha_programada', 'fecha_inicio', 'fecha_fin',
+    ).order_by('fecha_programada', 'id')
+    return Prefetch(ruta, queryset=sesiones)
+
+
+def agrupar_por_procedimiento(sesiones):
+    """{procedimiento_id: [sesiones]} conservando el orden"""
+    grupos = {}
+    for sesion in sesiones:
+        grupos.setdefault(sesion.procedimiento_id, []).append(sesion)
+    return grupos
+
+
+def linea_de_tiempo(sesiones):
+    return [
+        [s.id, s.numero_sesion, s.estado, s.fecha_programada, s.fecha_inicio, s.fecha_fin]
+        for s in sesiones
+    ]
+
+
+def resumen(sesiones):
+    """
+    Conteos, porcentaje y próxima/última sesión de una lista de sesiones
+    ordenada por fecha_programada.
+    """
+    completadas = [s for s in sesiones if s.estado == 'completada']
+    totales = len(sesiones)
+    con_inicio = [s for s in completadas if s.fecha_inicio is not None]
+    proxima = next((s for s in sesiones if s.estado == 'programada'), None)
+    return {
+        'sesiones_completadas': len(completadas),
+        'sesiones_totales': totales,
+        'progreso': round(len(completadas) / totales * 100, 2) if totales else 0,
+        'ultima_sesion': max(con_inicio, key=lambda s: s.fecha_inicio) if con_inicio else None,
+        'proxima_sesion': proxima,
+    }
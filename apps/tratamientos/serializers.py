@@ -88,6 +88,12 @@ class ItemPresupuestoCrearSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({
                 'precio_unitario': 'Debe ser mayor o igual a 0'
             })
+        # El total de la línea no puede quedar negativo (se inserta sin save())
+        importe = data.get('precio_unitario', Decimal('0')) * data.get('cantidad', 1)
+        if data.get('descuento_item', Decimal('0')) > importe:
+            raise serializers.ValidationError({
+                'descuento_item': 'No puede ser mayor al precio por la cantidad'
+            })
         return data
 
 
@@ -139,23 +145,8 @@ class PresupuestoCrearSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         
-        # Calcular subtotal desde los items
-        subtotal = Decimal('0')
-        for item_data in items_data:
-            cantidad = item_data.get('cantidad', 1)
-            precio = item_data.get('precio_unitario', Decimal('0'))
-            descuento = item_data.get('descuento_item', Decimal('0'))
-            subtotal += (precio * cantidad) - descuento
-        
-        # Crear presupuesto
-        validated_data['subtotal'] = subtotal
-        presupuesto = Presupuesto.objects.create(**validated_data)
-        
-        # Crear items
-        for item_data in items_data:
-            ItemPresupuesto.objects.create(presupuesto=presupuesto, **item_data)
-        
-        return presupuesto
+        # Presupuesto e items en una transacción, items con bulk_create
+        return Presupuesto.crear_con_items(items_data, **validated_data)
     
     def to_representation(self, instance):
         """Incluir el id en la respuesta de creación."""
@@ -187,7 +178,7 @@ class PlanTratamientoSerializer(serializers.ModelSerializer):
     odontologo_detalle = serializers.SerializerMethodField()
     
     # ✅ NUEVO: Alias de procedimientos para compatibilidad con frontend
-    items = serializers.SerializerMethodField()
+    # ('items' se agrega en to_representation copiando 'procedimientos')
     
     # ✅ NUEVO: Estadísticas completas
     estadisticas = serializers.SerializerMethodField()
@@ -212,7 +203,7 @@ class PlanTratamientoSerializer(serializers.ModelSerializer):
             'duracion_estimada_dias',
             'costo_total', 'subtotal_calculado', 'descuento',
             'progreso', 'cantidad_items', 'items_activos', 'items_completados',
-            'procedimientos', 'items', 'presupuestos', 'estadisticas',
+            'procedimientos', 'presupuestos', 'estadisticas',
             'es_borrador', 'puede_editarse', 'es_aprobado'
         ]
         read_only_fields = ['codigo', 'fecha_creacion', 'fecha_aprobacion']
@@ -227,19 +218,40 @@ class PlanTratamientoSerializer(serializers.ModelSerializer):
             return f"{obj.odontologo.codusuario.nombre} {obj.odontologo.codusuario.apellido}"
         return None
 
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        # Alias de procedimientos para el frontend (sin volver a serializarlos)
+        representation['items'] = representation['procedimientos']
+        return representation
+
+    def _resumen(self, obj):
+        """
+        Conteos y costos del plan, leídos de sus contadores (ver
+        tratamientos/contadores.py) una sola vez por plan.
+        """
+        if not hasattr(self, '_resumenes'):
+            self._resumenes = {}
+        if obj.pk not in self._resumenes:
+            self._resumenes[obj.pk] = obj.resumen_procedimientos()
+        return self._resumenes[obj.pk]
+
     def get_costo_total(self, obj):
-        return obj.calcular_costo_total()
+        return self._resumen(obj)['costo_estimado'] or Decimal('0')
 
     def get_progreso(self, obj):
-        return obj.obtener_progreso()
+        resumen = self._resumen(obj)
+        if resumen['total_items'] == 0:
+            return 0
+        return round((resumen['items_completados'] / resumen['total_items']) * 100, 2)
 
     def get_cantidad_items(self, obj):
         """Total de procedimientos en el plan"""
-        return obj.procedimientos.count()
+        return self._resumen(obj)['total_items']
 
     def get_items_activos(self, obj):
         """Procedimientos activos (no cancelados)"""
-        return obj.procedimientos.exclude(estado='cancelado').count()
+        resumen = self._resumen(obj)
+        return resumen['total_items'] - resumen['items_cancelados']
     
     # ✅ NUEVOS MÉTODOS AGREGADOS
     
@@ -266,28 +278,16 @@ class PlanTratamientoSerializer(serializers.ModelSerializer):
             }
         return None
     
-    def get_items(self, obj):
-        """
-        Alias de procedimientos para compatibilidad con frontend.
-        Devuelve los mismos datos que procedimientos pero con el nombre 'items'.
-        """
-        return ProcedimientoSerializer(obj.procedimientos.all(), many=True).data
-    
     def get_estadisticas(self, obj):
         """Devuelve estadísticas calculadas del plan"""
-        total_items = obj.procedimientos.count()
-        items_activos = obj.procedimientos.filter(estado='en_proceso').count()
-        items_completados = obj.procedimientos.filter(estado='completado').count()
-        items_cancelados = obj.procedimientos.filter(estado='cancelado').count()
-        items_pendientes = obj.procedimientos.filter(estado='pendiente').count()
-        
+        resumen = self._resumen(obj)
         return {
-            'total_items': total_items,
-            'items_pendientes': items_pendientes,
-            'items_activos': items_activos,
-            'items_cancelados': items_cancelados,
-            'items_completados': items_completados,
-            'progreso_porcentaje': obj.obtener_progreso()
+            'total_items': resumen['total_items'],
+            'items_pendientes': resumen['items_pendientes'],
+            'items_activos': resumen['items_en_proceso'],
+            'items_cancelados': resumen['items_cancelados'],
+            'items_completados': resumen['items_completados'],
+            'progreso_porcentaje': self.get_progreso(obj)
         }
     
     def get_es_borrador(self, obj):
@@ -304,11 +304,11 @@ class PlanTratamientoSerializer(serializers.ModelSerializer):
     
     def get_items_completados(self, obj):
         """Total de procedimientos completados"""
-        return obj.procedimientos.filter(estado='completado').count()
+        return self._resumen(obj)['items_completados']
     
     def get_subtotal_calculado(self, obj):
         """Subtotal (mismo que costo_total por ahora)"""
-        return obj.calcular_costo_total()
+        return self.get_costo_total(obj)
 
 
 class PlanTratamientoCrearSerializer(serializers.ModelSerializer):
@@ -450,7 +450,7 @@ class SesionTratamientoSerializer(serializers.ModelSerializer):
     class Meta:
         model = SesionTratamiento
         fields = [
-            'id', 'codigo', 'plan_tratamiento', 'plan_codigo', 'plan_descripcion',
+            'id', 'codigo', 'plan_tratamiento', 'plan_codigo', 'plan_descripcion', 'procedimiento',
             'odontologo', 'odontologo_nombre', 'paciente_nombre',
             'numero_sesion', 'titulo', 'descripcion', 'estado', 'estado_display',
             'fecha_programada', 'fecha_inicio', 'fecha_fin', 'duracion_minutos', 'duracion_formateada',
@@ -485,7 +485,7 @@ class SesionTratamientoCrearSerializer(serializers.ModelSerializer):
     class Meta:
         model = SesionTratamiento
         fields = [
-            'plan_tratamiento', 'odontologo', 'titulo', 'descripcion',
+            'plan_tratamiento', 'procedimiento', 'odontologo', 'titulo', 'descripcion',
             'fecha_programada', 'observaciones', 'recomendaciones',
             'proxima_sesion_programada'
         ]
@@ -502,3 +502,13 @@ class SesionTratamientoCrearSerializer(serializers.ModelSerializer):
         if value < timezone.now():
             raise serializers.ValidationError('La fecha programada debe ser futura')
         return value
+    
+    def validate(self, data):
+        """Validar que el procedimiento pertenezca al plan"""
+        procedimiento = data.get('procedimiento')
+        plan = data.get('plan_tratamiento') or getattr(self.instance, 'plan_tratamiento', None)
+        if procedimiento and plan and procedimiento.plan_tratamiento_id != plan.id:
+            raise serializers.ValidationError({
+                'procedimiento': 'El procedimiento no pertenece al plan de tratamiento'
+            })
+        return data
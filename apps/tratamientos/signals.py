@@ -1,21 +1,51 @@
 # Signals para el módulo de tratamientos
-from django.db.models.signals import post_save
+# Contadores de procedimientos del plan: ver contadores.py
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from .models import Procedimiento, PlanTratamiento
+from . import contadores
+
+
+def _sincronizar_plan_en_cache(instance, planes):
+    """Refresca los contadores del plan cacheado en la instancia si cambiaron"""
+    if Procedimiento.plan_tratamiento.is_cached(instance) and instance.plan_tratamiento_id in planes:
+        instance.plan_tratamiento.refresh_from_db(fields=contadores.CAMPOS_CONTADORES)
 
 
 @receiver(post_save, sender=Procedimiento)
 def actualizar_estado_plan(sender, instance, created, **kwargs):
     """
-    Actualiza automáticamente el estado del plan cuando todos
-    los procedimientos están completados
+    Ajusta los contadores del plan y actualiza automáticamente el estado
+    del plan cuando todos los procedimientos están completados
     """
+    anterior = None if created else getattr(instance, '_resumen_original', False)
+    actual = instance.estado_resumen()
+
+    if anterior is False or actual is False:
+        # Campos diferidos: recalcular el plan (una consulta agregada)
+        planes = [instance.plan_tratamiento_id]
+        contadores.recalcular(instance.plan_tratamiento_id)
+    else:
+        planes = contadores.registrar_transicion(anterior, actual)
+    instance._resumen_original = actual
+    _sincronizar_plan_en_cache(instance, planes)
+
     if instance.estado == 'completado':
         plan = instance.plan_tratamiento
-        
-        # Si no hay procedimientos pendientes o en proceso, marcar plan como completado
-        if not plan.procedimientos.exclude(estado='completado').exists():
+
+        # Si no hay procedimientos pendientes, en proceso o cancelados, marcar plan como completado
+        if plan.estado != 'completado' and plan.items_completados == plan.total_items:
             from django.utils import timezone
             plan.estado = 'completado'
             plan.fecha_finalizacion = timezone.now().date()
             plan.save()
+
+
+@receiver(post_delete, sender=Procedimiento)
+def descontar_procedimiento(sender, instance, **kwargs):
+    """Resta el procedimiento eliminado de los contadores de su plan"""
+    anterior = getattr(instance, '_resumen_original', instance.estado_resumen())
+    if anterior is False:
+        contadores.recalcular(instance.plan_tratamiento_id)
+    elif anterior is not None:
+        contadores.registrar_transicion(anterior, None)
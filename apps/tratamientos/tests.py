@@ -0,0 +1,167 @@
+"""
+Tests del módulo de tratamientos.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_tenants.test.cases import TenantTestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.administracion_clinica.models import Servicio
+from apps.profesionales.models import Odontologo
+from apps.usuarios.models import Paciente, Tipodeusuario, Usuario
+
+from . import contadores
+from .models import ItemPresupuesto, PlanTratamiento, Presupuesto, Procedimiento, SesionTratamiento
+from .views import PlanTratamientoViewSet, PresupuestoViewSet
+
+
+class ListadoPlanesConsultasTest(TenantTestCase):
+    """
+    El listado de planes debe usar un número fijo de consultas sin importar
+    cuántos planes, procedimientos o presupuestos haya (PlanTratamiento.objects.con_resumen()).
+    """
+
+    # COUNT de la paginación, planes anotados y prefetch de procedimientos,
+    # presupuestos e items de presupuesto
+    CONSULTAS_LISTADO = 5
+
+    def setUp(self):
+        super().setUp()
+        self.factory = APIRequestFactory()
+        self.usuario_django = User.objects.create_user('recepcion@test.com', 'recepcion@test.com', 'clave-segura-123')
+
+        rol_paciente = Tipodeusuario.objects.create(rol='Paciente')
+        rol_odontologo = Tipodeusuario.objects.create(rol='Odontólogo')
+        self.paciente = Paciente.objects.create(codusuario=Usuario.objects.create(
+            nombre='Ana', apellido='Pérez', correoelectronico='ana@test.com', idtipousuario=rol_paciente
+        ))
+        self.odontologo = Odontologo.objects.create(codusuario=Usuario.objects.create(
+            nombre='Luis', apellido='Rojas', correoelectronico='luis@test.com', idtipousuario=rol_odontologo
+        ))
+        self.servicio = Servicio.objects.create(nombre='Limpieza', costobase=Decimal('100.00'))
+
+    def crear_planes(self, cantidad, procedimientos_por_plan=3):
+        for _ in range(cantidad):
+            plan = PlanTratamiento.objects.create(
+                paciente=self.paciente, odontologo=self.odontologo, descripcion='Plan de prueba'
+            )
+            for numero, estado in zip(range(procedimientos_por_plan), ['pendiente', 'completado', 'cancelado'] * 10):
+                Procedimiento.objects.create(
+                    plan_tratamiento=plan, servicio=self.servicio, odontologo=self.odontologo,
+                    descripcion=f'Procedimiento {numero}', estado=estado, costo_estimado=Decimal('50.00')
+                )
+            presupuesto = Presupuesto.objects.create(plan_tratamiento=plan)
+            ItemPresupuesto.objects.create(
+                presupuesto=presupuesto, servicio=self.servicio, precio_unitario=Decimal('50.00')
+            )
+
+    def listar(self):
+        request = self.factory.get('/api/v1/tratamientos/planes-tratamiento/')
+        force_authenticate(request, user=self.usuario_django)
+        with CaptureQueriesContext(connection) as consultas:
+            response = PlanTratamientoViewSet.as_view({'get': 'list'})(request)
+            response.render()
+        return response, len(consultas)
+
+    def test_consultas_constantes(self):
+        self.crear_planes(2)
+        response, pocas = self.listar()
+        self.assertEqual(response.status_code, 200)
+
+        self.crear_planes(10, procedimientos_por_plan=6)
+        response, muchas = self.listar()
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(pocas, muchas)
+        self.assertEqual(muchas, self.CONSULTAS_LISTADO)
+
+    def test_resumen_anotado(self):
+        self.crear_planes(1, procedimientos_por_plan=3)
+        response, _ = self.listar()
+        plan = response.data['results'][0]
+
+        self.assertEqual(plan['cantidad_items'], 3)
+        self.assertEqual(plan['items_activos'], 2)
+        self.assertEqual(plan['items_completados'], 1)
+        self.assertEqual(plan['estadisticas']['items_cancelados'], 1)
+        self.assertEqual(plan['estadisticas']['items_pendientes'], 1)
+        self.assertEqual(plan['costo_total'], Decimal('150.00'))
+        self.assertEqual(plan['progreso'], round(100 / 3, 2))
+        self.assertEqual(plan['items'], plan['procedimientos'])
+
+        # Leído directamente, el plan tiene los mismos contadores
+        sin_anotar = PlanTratamiento.objects.get(pk=plan['id'])
+        self.assertEqual(sin_anotar.calcular_costo_total(), Decimal('150.00'))
+        self.assertEqual(sin_anotar.obtener_progreso(), plan['progreso'])
+
+    def test_contadores_transiciones(self):
+        self.crear_planes(1, procedimientos_por_plan=3)
+        plan = PlanTratamiento.objects.get()
+        plan.procedimientos.get(estado='cancelado').delete()
+
+        pendiente = plan.procedimientos.get(estado='pendiente')
+        pendiente.estado = 'completado'
+        pendiente.costo_real = '40.00'
+        pendiente.save()
+
+        plan.refresh_from_db()
+        self.assertEqual(plan.total_items, 2)
+        self.assertEqual(plan.items_completados, 2)
+        self.assertEqual(plan.items_cancelados, 0)
+        self.assertEqual(plan.costo_estimado, Decimal('100.00'))
+        self.assertEqual(plan.costo_real, Decimal('40.00'))
+        # Sin procedimientos pendientes el signal cierra el plan
+        self.assertEqual(plan.estado, 'completado')
+        self.assertEqual(contadores.reconciliar()['corregidos'], 0)
+
+    def test_progreso_detallado_consultas(self):
+        self.crear_planes(1, procedimientos_por_plan=30)
+        plan = PlanTratamiento.objects.get()
+        for numero, procedimiento in enumerate(plan.procedimientos.all()):
+            for estado in ('completada', 'programada'):
+                SesionTratamiento.objects.create(
+                    plan_tratamiento=plan, odontologo=self.odontologo, procedimiento=procedimiento,
+                    titulo=f'Sesión {numero}', estado=estado,
+                    fecha_programada=timezone.now() + timedelta(days=numero),
+                )
+
+        request = self.factory.get(f'/api/v1/tratamientos/planes-tratamiento/{plan.id}/progreso-detallado/')
+        force_authenticate(request, user=self.usuario_django)
+        with CaptureQueriesContext(connection) as consultas:
+            response = PlanTratamientoViewSet.as_view({'get': 'progreso_detallado'})(request, pk=plan.id)
+
+        self.assertEqual(response.status_code, 200)
+        # Plan, procedimientos y sesiones precargados
+        self.assertEqual(len(consultas), 3)
+        self.assertEqual(response.data['sesiones_totales'], 60)
+        item = response.data['items'][0]
+        self.assertEqual((item['sesiones_completadas'], item['sesiones_totales'], item['progreso']), (1, 2, 50.0))
+        self.assertEqual([fila[2] for fila in item['linea_tiempo']], ['completada', 'programada'])
+
+    def test_presupuesto_desde_plan(self):
+        self.crear_planes(1, procedimientos_por_plan=30)
+        plan = PlanTratamiento.objects.get()
+        admin = User.objects.create_superuser('admin@test.com', 'admin@test.com', 'clave-segura-123')
+
+        request = self.factory.post(
+            '/api/v1/tratamientos/presupuestos/desde-plan/',
+            {'plan_tratamiento': plan.id, 'descuento': '100.00'}, format='json'
+        )
+        force_authenticate(request, user=admin)
+        with CaptureQueriesContext(connection) as consultas:
+            response = PresupuestoViewSet.as_view({'post': 'desde_plan'})(request)
+
+        self.assertEqual(response.status_code, 201, response.data)
+        presupuesto = Presupuesto.objects.get(pk=response.data['id'])
+        # 30 procedimientos, 10 cancelados: 20 items de 50.00
+        self.assertEqual(presupuesto.items.count(), 20)
+        self.assertEqual(presupuesto.subtotal, Decimal('1000.00'))
+        self.assertEqual(presupuesto.total, Decimal('900.00'))
+        # Los items se insertan en un solo INSERT
+        inserts = [c for c in consultas.captured_queries if c['sql'].startswith('INSERT INTO "item_presupuesto"')]
+        self.assertEqual(len(inserts), 1)
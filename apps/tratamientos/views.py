@@ -4,7 +4,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
-from django.db.models import Q, Count, Sum
+from django.db.models import Q, Count, Sum, Prefetch, Exists, OuterRef
 
 from .models import PlanTratamiento, Presupuesto, ItemPresupuesto, Procedimiento, HistorialPago, SesionTratamiento
 from .serializers import (
@@ -23,6 +23,8 @@ from .serializers import (
     SesionTratamientoCrearSerializer,
 )
 from apps.comun.permisos import EsOdontologo, EsStaff
+from . import progreso as progreso_sesiones
+from apps.comun.principal import obtener_principal
 
 
 class PlanTratamientoViewSet(viewsets.ModelViewSet):
@@ -44,6 +46,15 @@ class PlanTratamientoViewSet(viewsets.ModelViewSet):
         Mapea estado_plan -> estado y convierte valores a minúsculas.
         """
         queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            # Conteos, costos y relaciones precargados para el serializer
+            queryset = queryset.con_resumen()
+        elif self.action == 'progreso_detallado':
+            # Procedimientos y sesiones del plan en dos consultas (ver progreso.py)
+            queryset = queryset.prefetch_related(
+                Prefetch('procedimientos', queryset=Procedimiento.objects.select_related('servicio')),
+                progreso_sesiones.prefetch_sesiones(),
+            )
         
         # Obtener parámetros del frontend
         estado_plan = self.request.query_params.get('estado_plan')
@@ -76,6 +87,8 @@ class PlanTratamientoViewSet(viewsets.ModelViewSet):
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [EsOdontologo()]
+        if self.action == 'programar_sesiones':
+            return [EsStaff()]
         return [IsAuthenticated()]
 
     @action(detail=False, methods=['get'], url_path='por-paciente')
@@ -89,7 +102,7 @@ class PlanTratamientoViewSet(viewsets.ModelViewSet):
             )
         
         # Corregido: filtrar por el campo 'paciente' (FK a Paciente)
-        planes = self.queryset.filter(paciente=paciente_id)
+        planes = self.queryset.con_resumen().filter(paciente=paciente_id)
         serializer = self.get_serializer(planes, many=True)
         return Response(serializer.data)
 
@@ -103,7 +116,7 @@ class PlanTratamientoViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        planes = self.queryset.filter(estado=estado)
+        planes = self.queryset.con_resumen().filter(estado=estado)
         serializer = self.get_serializer(planes, many=True)
         return Response(serializer.data)
 
@@ -169,9 +182,6 @@ class PlanTratamientoViewSet(viewsets.ModelViewSet):
         """
         from apps.administracion_clinica.models import Servicio
         
-        from apps.usuarios.models import Usuario
-        from rest_framework.authtoken.models import Token
-        
         plan = self.get_object()
         data = request.data
         
@@ -186,34 +196,27 @@ class PlanTratamientoViewSet(viewsets.ModelViewSet):
             )
         
         # VALIDACIÓN 2: Usuario debe tener permisos (admin u odontólogo)
-        # Obtener el Usuario customizado desde el token
-        try:
-            # request.user es el User de Django, necesitamos obtener nuestro Usuario
-            token_key = request.auth.key if request.auth else None
-            if not token_key:
-                return Response(
-                    {'detail': 'No autenticado'},
-                    status=status.HTTP_401_UNAUTHORIZED
-                )
-            
-            token = Token.objects.select_related('user').get(key=token_key)
-            # Obtener el Usuario customizado por email
-            usuario = Usuario.objects.select_related('idtipousuario').get(
-                correoelectronico=token.user.username
+        # request.user ya viene del token; el principal resuelve nuestro Usuario
+        if not request.auth:
+            return Response(
+                {'detail': 'No autenticado'},
+                status=status.HTTP_401_UNAUTHORIZED
             )
-            
-            # Tipo 1 = Administrador, Tipo 2 = Odontólogo
-            if usuario.idtipousuario.id not in [1, 2]:
-                return Response(
-                    {'detail': 'No tiene permisos para modificar este plan de tratamiento'},
-                    status=status.HTTP_403_FORBIDDEN
-                )
-        except (Token.DoesNotExist, Usuario.DoesNotExist):
+        
+        principal = obtener_principal(request)
+        if principal is None:
             return Response(
                 {'detail': 'Usuario no válido'},
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
+        # Tipo 1 = Administrador, Tipo 2 = Odontólogo
+        if principal.usuario.idtipousuario_id not in [1, 2]:
+            return Response(
+                {'detail': 'No tiene permisos para modificar este plan de tratamiento'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
         # VALIDACIÓN 3: idservicio es obligatorio
         if not data.get('idservicio'):
             return Response(
@@ -327,7 +330,8 @@ class PlanTratamientoViewSet(viewsets.ModelViewSet):
             }
             return piezas.get(int(numero), f"Pieza #{numero}")
         
-        # Calcular totales actualizados
+        # Calcular totales actualizados (contadores ajustados al guardar el procedimiento)
+        plan.refresh_from_db(fields=['costo_estimado'])
         total_plan = plan.calcular_costo_total()
         
         # Respuesta en formato esperado por frontend
@@ -376,15 +380,14 @@ class PlanTratamientoViewSet(viewsets.ModelViewSet):
         """Obtener estadísticas del plan de tratamiento"""
         plan = self.get_object()
         
+        # Conteos y costos de procedimientos: contadores del plan
         estadisticas = {
-            'total_procedimientos': plan.procedimientos.count(),
-            'procedimientos_completados': plan.procedimientos.filter(estado='completado').count(),
-            'procedimientos_pendientes': plan.procedimientos.filter(estado='pendiente').count(),
-            'procedimientos_en_proceso': plan.procedimientos.filter(estado='en_proceso').count(),
+            'total_procedimientos': plan.total_items,
+            'procedimientos_completados': plan.items_completados,
+            'procedimientos_pendientes': plan.items_pendientes,
+            'procedimientos_en_proceso': plan.items_en_proceso,
             'costo_total_estimado': plan.calcular_costo_total(),
-            'costo_total_real': plan.procedimientos.filter(
-                costo_real__isnull=False
-            ).aggregate(total=Sum('costo_real'))['total'] or 0,
+            'costo_total_real': plan.costo_real,
             'progreso_porcentaje': plan.obtener_progreso(),
             'total_presupuestos': plan.presupuestos.count(),
             'presupuestos_aprobados': plan.presupuestos.filter(estado='aprobado').count(),
@@ -399,39 +402,39 @@ class PlanTratamientoViewSet(viewsets.ModelViewSet):
         GET /api/v1/tratamientos/planes-tratamiento/{id}/progreso-detallado/
         """
         plan = self.get_object()
-        items = plan.procedimientos.all()
+        
+        # Sesiones precargadas, agrupadas en memoria por procedimiento
+        todas_sesiones = list(plan.sesiones.all())
+        por_procedimiento = progreso_sesiones.agrupar_por_procedimiento(todas_sesiones)
         
         items_data = []
-        for item in items:
-            sesiones = SesionTratamiento.objects.filter(procedimiento=item)
-            sesiones_completadas = sesiones.filter(estado='completada').count()
-            sesiones_totales = sesiones.count()
-            progreso = (sesiones_completadas / sesiones_totales * 100) if sesiones_totales > 0 else 0
+        for item in plan.procedimientos.all():
+            sesiones = por_procedimiento.get(item.id, [])
+            resumen = progreso_sesiones.resumen(sesiones)
             
             items_data.append({
                 'id': item.id,
-                'nombre': item.servicio.nombre if hasattr(item, 'servicio') and item.servicio else 'Sin nombre',
-                'progreso': round(progreso, 2),
+                'nombre': item.servicio.nombre if item.servicio else 'Sin nombre',
+                'progreso': resumen['progreso'],
                 'estado': item.estado,
-                'sesiones_completadas': sesiones_completadas,
-                'sesiones_totales': sesiones_totales
+                'sesiones_completadas': resumen['sesiones_completadas'],
+                'sesiones_totales': resumen['sesiones_totales'],
+                'linea_tiempo': progreso_sesiones.linea_de_tiempo(sesiones),
             })
         
-        # Calcular totales
-        total_items = items.count()
-        items_completados = items.filter(estado='completado').count()
-        items_en_proceso = items.filter(estado='en_proceso').count()
-        items_pendientes = items.filter(estado='pendiente').count()
+        # Totales: contadores del plan
+        total_items = plan.total_items
+        items_completados = plan.items_completados
+        items_en_proceso = plan.items_en_proceso
+        items_pendientes = plan.items_pendientes
         
-        # Sesiones totales
-        todas_sesiones = SesionTratamiento.objects.filter(plan_tratamiento=plan)
-        sesiones_totales = todas_sesiones.count()
-        sesiones_realizadas = todas_sesiones.filter(estado='completada').count()
+        # Sesiones totales (incluye las que no están ligadas a un procedimiento)
+        sesiones_totales = len(todas_sesiones)
+        sesiones_realizadas = sum(1 for sesion in todas_sesiones if sesion.estado == 'completada')
         
         porcentaje_global = (items_completados / total_items * 100) if total_items > 0 else 0
         
-        costo_ejecutado = items.filter(costo_real__isnull=False).aggregate(
-            total=Sum('costo_real'))['total'] or 0
+        costo_ejecutado = plan.costo_real
         
         return Response({
             'plan_id': plan.id,
@@ -445,9 +448,88 @@ class PlanTratamientoViewSet(viewsets.ModelViewSet):
             'sesiones_realizadas': sesiones_realizadas,
             'costo_total': float(plan.calcular_costo_total()),
             'costo_ejecutado': float(costo_ejecutado),
+            'columnas_sesion': progreso_sesiones.COLUMNAS_SESION,
             'items': items_data
         })
 
+    @action(detail=True, methods=['post'], url_path='programar-sesiones')
+    def programar_sesiones(self, request, pk=None):
+        """
+        Proponer o agendar de una vez todas las sesiones pendientes del plan
+        POST /api/v1/tratamientos/planes-tratamiento/{id}/programar-sesiones/
+        
+        Body (todo opcional):
+            desde: 'YYYY-MM-DD' primera fecha posible (por defecto mañana)
+            odontologo_id: odontólogo que atiende (por defecto el del plan)
+            dias_entre_sesiones: espaciado mínimo en días
+            horario_preferido: manana | tarde | noche | cualquiera
+            confirmar: true para crear las sesiones (si no, solo propone)
+        """
+        from django.utils.dateparse import parse_date
+        from .programacion import FRANJAS, programar, proponer
+        
+        plan = self.get_object()
+        
+        opciones = {}
+        desde = request.data.get('desde')
+        if desde:
+            try:
+                opciones['desde'] = parse_date(str(desde))
+            except ValueError:
+                opciones['desde'] = None
+            if opciones['desde'] is None:
+                return Response(
+                    {'error': 'Formato de fecha inválido. Use YYYY-MM-DD'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if opciones['desde'] < timezone.localdate():
+                return Response(
+                    {'error': 'La fecha inicial debe ser hoy o futura'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        try:
+            if request.data.get('odontologo_id'):
+                opciones['odontologo_id'] = int(request.data['odontologo_id'])
+            if request.data.get('dias_entre_sesiones') not in (None, ''):
+                opciones['espaciado_dias'] = int(request.data['dias_entre_sesiones'])
+                if opciones['espaciado_dias'] < 0:
+                    raise ValueError
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'odontologo_id y dias_entre_sesiones deben ser enteros positivos'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if 'odontologo_id' in opciones:
+            from apps.profesionales.models import Odontologo
+            if not Odontologo.objects.filter(pk=opciones['odontologo_id']).exists():
+                return Response(
+                    {'error': 'El odontólogo especificado no existe'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        horario_preferido = request.data.get('horario_preferido')
+        if horario_preferido:
+            if horario_preferido not in FRANJAS and horario_preferido != 'cualquiera':
+                return Response(
+                    {'error': 'horario_preferido inválido'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            opciones['horario_preferido'] = horario_preferido
+        
+        confirmar = str(request.data.get('confirmar', '')).lower() in ('1', 'true', 'si', 'sí')
+        
+        try:
+            propuesta = programar(plan, **opciones) if confirmar else proponer(plan, **opciones)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(
+            {**propuesta, 'confirmado': confirmar},
+            status=status.HTTP_201_CREATED if confirmar and propuesta['sesiones'] else status.HTTP_200_OK
+        )
+
 
 class PresupuestoViewSet(viewsets.ModelViewSet):
     """
@@ -507,10 +589,84 @@ class PresupuestoViewSet(viewsets.ModelViewSet):
         - Create/Update/Delete: Staff (Administrador, Odontólogo, Recepcionista)
         - Read: Cualquier usuario autenticado
         """
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'desde_plan']:
             return [EsStaff()]
         return [IsAuthenticated()]
 
+    @action(detail=False, methods=['post'], url_path='desde-plan')
+    def desde_plan(self, request):
+        """
+        Generar un presupuesto con un item por cada procedimiento no
+        cancelado del plan (precio: costo estimado o costo base del servicio).
+        POST /api/v1/tratamientos/presupuestos/desde-plan/
+
+        Body:
+        {
+          "plan_tratamiento": 12,        // OBLIGATORIO
+          "descuento": 0,                // opcional
+          "impuesto": 0,                 // opcional
+          "notas": "...",                // opcional
+          "fecha_vencimiento": "2026-12-31"  // opcional
+        }
+        """
+        plan_id = request.data.get('plan_tratamiento')
+        if not plan_id:
+            return Response(
+                {'error': 'Se requiere plan_tratamiento'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            plan = PlanTratamiento.objects.get(pk=plan_id)
+        except (PlanTratamiento.DoesNotExist, ValueError, TypeError):
+            return Response(
+                {'error': 'Plan de tratamiento no encontrado'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        if plan.estado in ('completado', 'cancelado'):
+            return Response(
+                {'error': f'No se puede presupuestar un plan {plan.get_estado_display().lower()}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        procedimientos = plan.procedimientos.exclude(estado='cancelado').select_related('servicio')
+        items = [
+            {
+                'servicio': procedimiento.servicio,
+                'descripcion': procedimiento.descripcion,
+                'cantidad': 1,
+                'precio_unitario': (
+                    procedimiento.costo_estimado
+                    if procedimiento.costo_estimado is not None
+                    else procedimiento.servicio.costobase
+                ),
+                'numero_diente': procedimiento.numero_diente,
+            }
+            for procedimiento in procedimientos
+        ]
+        if not items:
+            return Response(
+                {'error': 'El plan no tiene procedimientos para presupuestar'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Mismas validaciones del encabezado que la creación normal
+        encabezado = PresupuestoCrearSerializer(data=request.data, partial=True)
+        if not encabezado.is_valid():
+            return Response(encabezado.errors, status=status.HTTP_400_BAD_REQUEST)
+        datos = {
+            campo: encabezado.validated_data[campo]
+            for campo in ('descuento', 'impuesto', 'notas', 'fecha_vencimiento')
+            if campo in encabezado.validated_data
+        }
+        
+        presupuesto = Presupuesto.crear_con_items(items, plan_tratamiento=plan, **datos)
+        return Response(
+            PresupuestoSerializer(presupuesto).data,
+            status=status.HTTP_201_CREATED
+        )
+
     @action(detail=True, methods=['post'], url_path='aprobar')
     def aprobar(self, request, pk=None):
         """
@@ -615,27 +771,22 @@ class PresupuestoViewSet(viewsets.ModelViewSet):
         
         # Obtener el ID del paciente desde el usuario autenticado
         try:
-            from apps.usuarios.models import Usuario, Paciente
-            
-            # El Token está ligado al Django User (request.user)
-            # Necesitamos obtener el Usuario de nuestra app usando el correo
-            try:
-                usuario = Usuario.objects.get(correoelectronico=request.user.username)
-            except Usuario.DoesNotExist:
+            # El Token está ligado al Django User (request.user); el principal
+            # resuelve (y cachea) el Usuario de nuestra app y su Paciente
+            principal = obtener_principal(request)
+            if principal is None:
                 return Response(
                     {'error': 'No se encontró el usuario en el sistema'},
                     status=status.HTTP_404_NOT_FOUND
                 )
             
             # El modelo Paciente usa codusuario como primary key (OneToOne con Usuario)
-            try:
-                paciente = Paciente.objects.get(codusuario=usuario.codigo)
-                paciente_id = paciente.codusuario_id  # Este es el usuario.codigo
-            except Paciente.DoesNotExist:
+            if principal.paciente is None:
                 return Response(
                     {'error': 'No se encontró información de paciente para este usuario'},
                     status=status.HTTP_404_NOT_FOUND
                 )
+            paciente_id = principal.paciente.codusuario_id  # Este es el usuario.codigo
         except Exception as e:
             return Response(
                 {'error': f'Error al obtener información del paciente: {str(e)}'},
@@ -677,28 +828,33 @@ class PresupuestoViewSet(viewsets.ModelViewSet):
         
         Query params:
         - paciente_id (opcional): Filtrar por paciente específico
+        - sin_presupuesto (opcional): 'true' para excluir planes que ya
+          tienen un presupuesto pendiente o aprobado
+        - page: Página (tamaño fijo PAGE_SIZE de REST_FRAMEWORK)
         
-        Respuesta:
-        [
-          {
-            "id": 1,
-            "codigo": "PLAN-202411-0001",
-            "paciente": {...},
-            "descripcion": "...",
-            "estado": "aprobado",
-            "costo_total": "1500.00",
-            "cantidad_items": 3
-          }
-        ]
+        Respuesta (paginada):
+        {
+          "count": 12,
+          "next": "...",
+          "previous": null,
+          "results": [
+            {
+              "id": 1,
+              "codigo": "PT-202411-0001",
+              "paciente": {...},
+              "descripcion": "...",
+              "estado": "aprobado",
+              "costo_total": "1500.00",
+              "cantidad_items": 3
+            }
+          ]
+        }
         """
-        # Filtrar planes disponibles (aprobados o borradores)
-        planes = PlanTratamiento.objects.filter(
-            estado__in=['aprobado', 'borrador']
-        ).select_related(
-            'paciente__codusuario',  # Corregido: ForeignKey correcta
-            'odontologo__codusuario'
-        ).prefetch_related(
-            'procedimientos'  # Cargar procedimientos para filtrar en Python
+        # Filtrar planes disponibles (aprobados o borradores) con al menos un
+        # procedimiento; la base resuelve el EXISTS, no se cargan los planes descartados
+        planes = PlanTratamiento.objects.con_resumen().filter(
+            Exists(Procedimiento.objects.filter(plan_tratamiento=OuterRef('pk'))),
+            estado__in=['aprobado', 'borrador'],
         )
         
         # Filtrar por paciente si se especifica
@@ -709,14 +865,19 @@ class PresupuestoViewSet(viewsets.ModelViewSet):
             except (ValueError, TypeError):
                 pass  # Ignorar valores inválidos
         
-        # Filtrar planes que tengan al menos un procedimiento (hacer en Python para evitar errores SQL)
-        planes_con_procedimientos = [
-            plan for plan in planes 
-            if plan.procedimientos.count() > 0
-        ]
+        # Excluir planes ya presupuestados (índice presupuesto_plan_estado_idx)
+        if request.query_params.get('sin_presupuesto', '').lower() in ('true', '1'):
+            planes = planes.exclude(Exists(Presupuesto.objects.filter(
+                plan_tratamiento=OuterRef('pk'), estado__in=['pendiente', 'aprobado']
+            )))
         
-        # Serializar usando el serializer existente
-        serializer = PlanTratamientoSerializer(planes_con_procedimientos, many=True)
+        # Paginar resultados
+        page = self.paginate_queryset(planes)
+        if page is not None:
+            serializer = PlanTratamientoSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
+        serializer = PlanTratamientoSerializer(planes, many=True)
         return Response(serializer.data)
 
 
@@ -728,6 +889,13 @@ class ProcedimientoViewSet(viewsets.ModelViewSet):
     queryset = Procedimiento.objects.all()
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'progreso':
+            # Sesiones del procedimiento en una sola consulta (ver progreso.py)
+            queryset = queryset.select_related('servicio').prefetch_related(progreso_sesiones.prefetch_sesiones())
+        return queryset
+
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return ProcedimientoCrearSerializer
@@ -766,15 +934,10 @@ class ProcedimientoViewSet(viewsets.ModelViewSet):
         if request.data.get('duracion_minutos'):
             procedimiento.duracion_minutos = request.data['duracion_minutos']
         
+        # El signal actualizar_estado_plan ajusta los contadores del plan y
+        # lo marca completado si era el último procedimiento
         procedimiento.save()
         
-        # Verificar si todos los procedimientos del plan están completados
-        plan = procedimiento.plan_tratamiento
-        if plan.procedimientos.exclude(estado='completado').count() == 0:
-            plan.estado = 'completado'
-            plan.fecha_finalizacion = timezone.now().date()
-            plan.save()
-        
         return Response(
             ProcedimientoSerializer(procedimiento).data,
             status=status.HTTP_200_OK
@@ -820,25 +983,23 @@ class ProcedimientoViewSet(viewsets.ModelViewSet):
         """
         procedimiento = self.get_object()
         
-        # Obtener sesiones relacionadas
-        sesiones = SesionTratamiento.objects.filter(procedimiento=procedimiento)
-        sesiones_completadas = sesiones.filter(estado='completada').count()
-        sesiones_totales = sesiones.count()
-        
-        porcentaje = (sesiones_completadas / sesiones_totales * 100) if sesiones_totales > 0 else 0
-        
-        ultima_sesion = sesiones.filter(estado='completada').order_by('-fecha_inicio').first()
-        proxima_sesion = sesiones.filter(estado='programada').order_by('fecha_programada').first()
+        # Sesiones precargadas en orden cronológico
+        sesiones = list(procedimiento.sesiones.all())
+        resumen = progreso_sesiones.resumen(sesiones)
+        ultima_sesion = resumen['ultima_sesion']
+        proxima_sesion = resumen['proxima_sesion']
         
         return Response({
             'item_id': procedimiento.id,
-            'nombre_item': procedimiento.servicio.nombre if hasattr(procedimiento, 'servicio') and procedimiento.servicio else 'Sin nombre',
-            'sesiones_completadas': sesiones_completadas,
-            'sesiones_totales': sesiones_totales,
-            'porcentaje_completado': round(porcentaje, 2),
+            'nombre_item': procedimiento.servicio.nombre if procedimiento.servicio else 'Sin nombre',
+            'sesiones_completadas': resumen['sesiones_completadas'],
+            'sesiones_totales': resumen['sesiones_totales'],
+            'porcentaje_completado': resumen['progreso'],
             'estado_actual': procedimiento.estado,
             'ultima_sesion_fecha': ultima_sesion.fecha_inicio if ultima_sesion else None,
-            'proxima_sesion_fecha': proxima_sesion.fecha_programada if proxima_sesion else None
+            'proxima_sesion_fecha': proxima_sesion.fecha_programada if proxima_sesion else None,
+            'columnas_sesion': progreso_sesiones.COLUMNAS_SESION,
+            'linea_tiempo': progreso_sesiones.linea_de_tiempo(sesiones),
         })
 
     @action(detail=True, methods=['post'], url_path='completar')
@@ -963,13 +1124,10 @@ class HistorialPagoViewSet(viewsets.ModelViewSet):
         Obtener pagos del paciente autenticado.
         Solo disponible para pacientes.
         """
-        from apps.usuarios.models import Paciente, Usuario
-        
-        # Patrón de puente dual: User → Usuario → Paciente
-        try:
-            usuario = Usuario.objects.get(correoelectronico=request.user.email)
-            paciente = Paciente.objects.get(codusuario=usuario)
-        except (Usuario.DoesNotExist, Paciente.DoesNotExist):
+        # Patrón de puente dual: User → Usuario → Paciente (vía principal)
+        principal = obtener_principal(request)
+        paciente = principal.paciente if principal else None
+        if paciente is None:
             return Response(
                 {'error': 'Este endpoint solo está disponible para pacientes'},
                 status=status.HTTP_403_FORBIDDEN
@@ -3,6 +3,7 @@ Serializers para la app de usuarios.
 """
 from rest_framework import serializers
 from .models import Tipodeusuario, Usuario, Paciente
+from apps.comun import catalogos
 
 
 class TipodeusuarioSerializer(serializers.ModelSerializer):
@@ -102,7 +103,7 @@ class PacienteCrearSerializer(serializers.Serializer):
         }
         
         # Obtener tipo de usuario "Paciente"
-        tipo_paciente = Tipodeusuario.objects.get(rol='Paciente')
+        tipo_paciente = catalogos.tipo_usuario('Paciente')
         validated_data['idtipousuario'] = tipo_paciente
         
         # Crear usuario
@@ -18,6 +18,8 @@ from .serializers import (
     UsuarioActualizarNotificacionesSerializer
 )
 from apps.comun.permisos import EsStaff, EsAdministrador, EsPropietarioOStaff
+from apps.comun import catalogos
+from apps.comun.principal import obtener_principal
 
 
 class TipodeusuarioViewSet(viewsets.ReadOnlyModelViewSet):
@@ -75,16 +77,13 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         Obtener información del usuario autenticado.
         """
         # Obtener el Usuario personalizado a partir del User de Django por correo
-        try:
-            usuario = Usuario.objects.select_related('idtipousuario').get(
-                correoelectronico=request.user.email
-            )
-            serializer = UsuarioDetalleSerializer(usuario)
-            return Response(serializer.data)
-        except Usuario.DoesNotExist:
+        principal = obtener_principal(request)
+        if principal is None:
             return Response({
                 'error': 'Usuario no encontrado en el sistema'
             }, status=status.HTTP_404_NOT_FOUND)
+        serializer = UsuarioDetalleSerializer(principal.usuario)
+        return Response(serializer.data)
     
     @action(detail=False, methods=['get'], url_path='count')
     def count(self, request):
@@ -129,7 +128,7 @@ class UsuarioViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            tipo_usuario = Tipodeusuario.objects.get(id=tipo_usuario_id)
+            tipo_usuario = catalogos.tipo_usuario_por_id(tipo_usuario_id)
         except Tipodeusuario.DoesNotExist:
             return Response(
                 {'error': 'Tipo de usuario no encontrado'},
@@ -219,7 +218,7 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         
         # Validar que el tipo de usuario existe
         try:
-            tipo_usuario = Tipodeusuario.objects.get(id=tipo_usuario_id)
+            tipo_usuario = catalogos.tipo_usuario_por_id(tipo_usuario_id)
         except Tipodeusuario.DoesNotExist:
             return Response(
                 {'error': 'Tipo de usuario no encontrado'},
@@ -401,22 +400,20 @@ class PacienteViewSet(viewsets.ModelViewSet):
         """
         Obtener perfil del paciente autenticado.
         """
-        try:
-            # Obtener Usuario a partir del User autenticado
-            usuario = Usuario.objects.get(correoelectronico=request.user.email)
-            paciente = Paciente.objects.get(codusuario=usuario)
-            serializer = self.get_serializer(paciente)
-            return Response(serializer.data)
-        except Usuario.DoesNotExist:
+        # Obtener Usuario y Paciente a partir del User autenticado
+        principal = obtener_principal(request)
+        if principal is None:
             return Response(
                 {'error': 'Usuario no encontrado'},
                 status=status.HTTP_404_NOT_FOUND
             )
-        except Paciente.DoesNotExist:
+        if principal.paciente is None:
             return Response(
                 {'error': 'El usuario no es un paciente'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        serializer = self.get_serializer(principal.paciente)
+        return Response(serializer.data)
     
     @action(detail=True, methods=['get'])
     def historial(self, request, pk=None):
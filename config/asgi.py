@@ -5,6 +5,15 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+La agenda en vivo (/api/v1/citas/en-vivo/, Server-Sent Events) necesita este
+punto de entrada, por ejemplo:
+
+    uvicorn config.asgi:application --host 0.0.0.0 --port 8000 --workers 4
+    gunicorn config.asgi:application -k uvicorn.workers.UvicornWorker  (render.yaml)
+
+Los eventos se reparten entre workers con PostgreSQL LISTEN/NOTIFY
+(apps/comun/bus_invalidacion.py), sin servicios adicionales.
 """
 
 import os
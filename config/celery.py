@@ -27,6 +27,13 @@ app.conf.beat_schedule = {
             'description': 'Enviar recordatorios de citas para el día siguiente',
         }
     },
+    'despachar-recordatorios': {
+        'task': 'apps.citas.tasks.despachar_recordatorios',
+        'schedule': crontab(minute='*/10'),  # Cada 10 minutos
+        'options': {
+            'description': 'Reintentar recordatorios pendientes de la bandeja de salida',
+        }
+    },
     'verificar-citas-vencidas': {
         'task': 'apps.citas.tasks.marcar_citas_vencidas',
         'schedule': crontab(hour=0, minute=30),  # Ejecutar a las 12:30 AM
@@ -41,6 +48,20 @@ app.conf.beat_schedule = {
             'description': 'Eliminar tokens de autenticación expirados',
         }
     },
+    'mantener-particiones-bitacora': {
+        'task': 'apps.auditoria.tasks.mantener_particiones_bitacora',
+        'schedule': crontab(hour=2, minute=0),  # Ejecutar a las 2:00 AM
+        'options': {
+            'description': 'Crear particiones futuras de la bitácora y archivar las vencidas',
+        }
+    },
+    'conciliar-resumen-bitacora': {
+        'task': 'apps.auditoria.tasks.conciliar_resumen_bitacora',
+        'schedule': crontab(hour=1, minute=30),  # Ejecutar a la 1:30 AM
+        'options': {
+            'description': 'Recalcular los conteos diarios de la bitácora del día anterior',
+        }
+    },
 }
 
 # Configuración de zona horaria
@@ -3,6 +3,7 @@ Django settings for config project.
 """
 
 import os
+from datetime import timedelta
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -205,6 +206,59 @@ DATABASE_ROUTERS = [
     'django_tenants.routers.TenantSyncRouter',
 ]
 
+# Caché de resolución de tenants (por proceso, en segundos)
+TENANT_CACHE_TTL = int(os.environ.get('TENANT_CACHE_TTL', 60))
+TENANT_CACHE_NEGATIVE_TTL = int(os.environ.get('TENANT_CACHE_NEGATIVE_TTL', 10))
+
+# Bus de invalidación de cachés entre workers (PostgreSQL LISTEN/NOTIFY)
+CACHE_INVALIDATION_BUS_ENABLED = os.environ.get('CACHE_INVALIDATION_BUS_ENABLED', 'True') == 'True'
+CACHE_INVALIDATION_CHANNEL = os.environ.get('CACHE_INVALIDATION_CHANNEL', 'clinica_cache')
+
+# Caché de catálogos por tenant (TTL de respaldo en segundos, ver apps/comun/catalogos.py)
+CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL', 300))
+
+# Caché del principal (User -> Usuario/rol/perfil) por tenant, en segundos
+PRINCIPAL_CACHE_TTL = int(os.environ.get('PRINCIPAL_CACHE_TTL', 30))
+
+# Caché de autenticación por token (token -> usuario + bloqueo), en segundos
+TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', 60))
+
+# Vida de los tokens de acceso (expiración deslizante, ver autenticacion.TokenAcceso)
+TOKEN_EXPIRACION_DIAS = int(os.environ.get('TOKEN_EXPIRACION_DIAS', 30))
+
+# Motor de disponibilidad de citas (mapas de bits por odontólogo y semana)
+DISPONIBILIDAD_CACHE_TTL = int(os.environ.get('DISPONIBILIDAD_CACHE_TTL', 300))
+DISPONIBILIDAD_MAX_DIAS = int(os.environ.get('DISPONIBILIDAD_MAX_DIAS', 93))
+AGENDA_MAX_DIAS = int(os.environ.get('AGENDA_MAX_DIAS', 31))
+# Máximo de segundos que la agenda puede mostrar nombres de paciente/odontólogo viejos (ETag)
+AGENDA_ETAG_VIGENCIA = int(os.environ.get('AGENDA_ETAG_VIGENCIA', 300))
+
+# Agenda en vivo por SSE (ver apps/citas/en_vivo.py, requiere ASGI)
+AGENDA_EN_VIVO_HEARTBEAT = int(os.environ.get('AGENDA_EN_VIVO_HEARTBEAT', 15))
+AGENDA_EN_VIVO_COLA_MAX = int(os.environ.get('AGENDA_EN_VIVO_COLA_MAX', 200))
+# Vida del ticket de un solo uso para conectarse (POST /citas/en-vivo/ticket/)
+AGENDA_EN_VIVO_TICKET_TTL = int(os.environ.get('AGENDA_EN_VIVO_TICKET_TTL', 30))
+
+# Programación de sesiones de planes de tratamiento (ver apps/tratamientos/programacion.py)
+SESIONES_ESPACIADO_DIAS = int(os.environ.get('SESIONES_ESPACIADO_DIAS', 7))
+SESIONES_HORIZONTE_DIAS = int(os.environ.get('SESIONES_HORIZONTE_DIAS', 180))
+
+# Clínicas procesadas en paralelo por las tareas periódicas multi-tenant
+TENANT_TASK_PARALLELISM = int(os.environ.get('TENANT_TASK_PARALLELISM', 4))
+
+# Escritor asíncrono de la bitácora de auditoría (ver apps/auditoria/escritor.py)
+AUDIT_ASYNC_ENABLED = os.environ.get('AUDIT_ASYNC_ENABLED', 'True') == 'True'
+AUDIT_QUEUE_MAX = int(os.environ.get('AUDIT_QUEUE_MAX', 10000))
+AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 200))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 2.0))
+AUDIT_SPILL_DIR = os.environ.get('AUDIT_SPILL_DIR', os.path.join(BASE_DIR, 'logs', 'auditoria_pendiente'))
+
+# Bitácora particionada por mes: retención y archivo (ver apps/auditoria/particiones.py)
+AUDIT_RETENTION_MONTHS = int(os.environ.get('AUDIT_RETENTION_MONTHS', 12))
+AUDIT_PARTITIONS_AHEAD = int(os.environ.get('AUDIT_PARTITIONS_AHEAD', 2))
+AUDIT_ARCHIVE_DIR = os.environ.get('AUDIT_ARCHIVE_DIR', os.path.join(BASE_DIR, 'archivo_auditoria'))
+AUDIT_ARCHIVE_BUCKET = os.environ.get('AUDIT_ARCHIVE_BUCKET')  # Si está vacío se usa AUDIT_ARCHIVE_DIR
+
 # ------------------------------------
 # Middleware
 # ------------------------------------
@@ -280,9 +334,14 @@ if not DATABASE_URL:
     db_port = os.environ.get('DB_PORT', '5432')
     DATABASE_URL = f'postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}'
 
+# Conexiones persistentes: la app corre bajo ASGI (render.yaml) y cada petición
+# ejecuta su código sync en un hilo propio; con CONN_MAX_AGE > 0 la conexión de
+# ese hilo queda abierta y huérfana. Solo conviene > 0 bajo WSGI (runserver).
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 0))
+
 # Parsear DATABASE_URL
 DATABASES = {
-    'default': dj_database_url.parse(DATABASE_URL, conn_max_age=600)
+    'default': dj_database_url.parse(DATABASE_URL, conn_max_age=DB_CONN_MAX_AGE)
 }
 
 # Asegurar que use el backend de django-tenants
@@ -337,7 +396,7 @@ ALLOWED_UPLOAD_MIMETYPES = [
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.IsAuthenticated"],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "apps.autenticacion.authentication.AutenticacionTokenCacheada",
         "rest_framework.authentication.SessionAuthentication",
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
@@ -353,6 +412,28 @@ REST_FRAMEWORK = {
     }
 }
 
+# ------------------------------------
+# JWT (modo opcional, ver apps/autenticacion/tokens_jwt.py)
+# ------------------------------------
+# Si está activo, el login también entrega tokens JWT (access/refresh) y las
+# peticiones con "Authorization: Bearer <jwt>" se autentican sin consultar la BD.
+AUTH_JWT_ENABLED = os.environ.get('AUTH_JWT_ENABLED', 'False') == 'True'
+
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=int(os.environ.get('JWT_ACCESS_MINUTES', 15))),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=int(os.environ.get('JWT_REFRESH_DAYS', 7))),
+    'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_USER_CLASS': 'apps.autenticacion.tokens_jwt.UsuarioToken',
+}
+
+# Cada cuántos segundos se recarga desde la BD la deny-list de JWT en memoria
+JWT_DENYLIST_REFRESH = int(os.environ.get('JWT_DENYLIST_REFRESH', 300))
+
+if AUTH_JWT_ENABLED:
+    REST_FRAMEWORK["DEFAULT_AUTHENTICATION_CLASSES"].insert(
+        0, "apps.autenticacion.tokens_jwt.AutenticacionJWTTenant"
+    )
+
 # ------------------------------------
 # Otros
 # ------------------------------------
@@ -455,7 +536,13 @@ y NO puedes dar diagnósticos médicos, solo orientar y ayudar con el agendamien
 # Configuración de notificaciones por email
 DEFAULT_REMINDER_HOURS = 24
 MAX_NOTIFICATION_RETRIES = 3
-NOTIFICATION_RETRY_DELAY = 30
+NOTIFICATION_RETRY_DELAY = 30  # Segundos; se duplica en cada reintento
+
+# Bandeja de salida de recordatorios (ver apps/citas/recordatorios.py)
+RECORDATORIOS_HILOS_EMAIL = int(os.environ.get('RECORDATORIOS_HILOS_EMAIL', 4))
+RECORDATORIOS_HILOS_PUSH = int(os.environ.get('RECORDATORIOS_HILOS_PUSH', 8))
+RECORDATORIOS_LOTE_CONEXION = 50  # Emails por conexión SMTP
+RECORDATORIOS_CONCESION = 600  # Segundos antes de recuperar un lote 'enviando'
 
 # Información de la clínica para emails
 CLINIC_INFO = {
@@ -9,7 +9,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 django.setup()
 
 from django.contrib.auth.models import User
-from rest_framework.authtoken.models import Token
+from apps.autenticacion.models import TokenAcceso
 from apps.comun.models import Clinica
 from apps.usuarios.models import Usuario, Tipodeusuario
 from apps.profesionales.models import Odontologo
@@ -73,7 +73,7 @@ def crear_usuarios():
             'idtipousuario': tipo_admin
         }
     )
-    Token.objects.get_or_create(user=admin_django)
+    TokenAcceso.crear_para(admin_django)
     usuarios_creados.append({
         'email': 'admin@clinica1.com',
         'password': 'admin123',
@@ -111,7 +111,7 @@ def crear_usuarios():
             'experienciaprofesional': '10 años en ortodoncia'
         }
     )
-    Token.objects.get_or_create(user=odon_django)
+    TokenAcceso.crear_para(odon_django)
     usuarios_creados.append({
         'email': 'dr.perez@clinica1.com',
         'password': 'odontologo123',
@@ -140,7 +140,7 @@ def crear_usuarios():
             'idtipousuario': tipo_paciente
         }
     )
-    Token.objects.get_or_create(user=pac_django)
+    TokenAcceso.crear_para(pac_django)
     usuarios_creados.append({
         'email': 'ana.lopez@email.com',
         'password': 'paciente123',
@@ -22,7 +22,7 @@ django.setup()
 
 from django.contrib.auth.models import User
 from django.db import transaction
-from rest_framework.authtoken.models import Token
+from apps.autenticacion.models import TokenAcceso
 
 # Importar modelos
 from apps.usuarios.models import Tipodeusuario, Usuario, Paciente
@@ -117,7 +117,7 @@ def destroy_all_data():
         Tipodeusuario.objects.all().delete()
         
         print("Eliminando: Tokens y Usuarios Django...")
-        Token.objects.all().delete()
+        TokenAcceso.objects.all().delete()
         # Eliminar TODOS los usuarios Django (incluyendo superusuarios)
         User.objects.all().delete()
     
@@ -280,7 +280,7 @@ def create_users(base_data):
         telefono='70000000',
         idtipousuario=base_data['tipos_usuario']['admin']
     )
-    Token.objects.create(user=admin_django)
+    TokenAcceso.crear_para(admin_django)
     usuarios['admin'] = {'django': admin_django, 'usuario': admin_usuario}
     
     # 2. ODONTÓLOGOS
@@ -323,7 +323,7 @@ def create_users(base_data):
             nromatricula=data['matricula'],
             experienciaprofesional=data['experiencia']
         )
-        Token.objects.create(user=django_user)
+        TokenAcceso.crear_para(django_user)
         usuarios[f'odontologo_{idx}'] = {
             'django': django_user,
             'usuario': usuario,
@@ -349,7 +349,7 @@ def create_users(base_data):
         codusuario=recep_usuario,
         habilidadessoftware='Microsoft Office, Software de gestión clínica'
     )
-    Token.objects.create(user=recep_django)
+    TokenAcceso.crear_para(recep_django)
     usuarios['recepcionista'] = {
         'django': recep_django,
         'usuario': recep_usuario,
@@ -409,7 +409,7 @@ def create_users(base_data):
             fechanacimiento=data['fecha_nac'],
             direccion=data['direccion']
         )
-        Token.objects.create(user=django_user)
+        TokenAcceso.crear_para(django_user)
         usuarios[f'paciente_{idx}'] = {
             'django': django_user,
             'usuario': usuario,
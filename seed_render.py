@@ -27,7 +27,7 @@ django.setup()
 
 from django.contrib.auth.models import User
 from django.db import transaction, connection
-from rest_framework.authtoken.models import Token
+from apps.autenticacion.models import TokenAcceso
 
 # Importar modelos SHARED (multi-tenancy)
 from apps.comun.models_tenant import Clinica, Dominio
@@ -280,7 +280,7 @@ def poblar_datos_clinica(clinica):
             'idtipousuario': tipo_admin
         }
     )
-    Token.objects.get_or_create(user=admin_django)
+    TokenAcceso.crear_para(admin_django)
     
     # ODONTÓLOGOS
     odontologos = []
@@ -329,7 +329,7 @@ def poblar_datos_clinica(clinica):
                 'experienciaprofesional': data['experiencia']
             }
         )
-        Token.objects.get_or_create(user=django_user)
+        TokenAcceso.crear_para(django_user)
         odontologos.append(odontologo)
     
     # RECEPCIONISTA
@@ -350,7 +350,7 @@ def poblar_datos_clinica(clinica):
         codusuario=recep_usuario,
         habilidadessoftware='Microsoft Office, Software de gestión clínica'
     )
-    Token.objects.create(user=recep_django)
+    TokenAcceso.crear_para(recep_django)
     
     # PACIENTES
     pacientes = []
@@ -404,7 +404,7 @@ def poblar_datos_clinica(clinica):
             fechanacimiento=data['fecha_nac'],
             direccion=data['direccion']
         )
-        Token.objects.create(user=django_user)
+        TokenAcceso.crear_para(django_user)
         pacientes.append(paciente)
     
     print(f"  ✓ 1 administrador")